@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Benchmarks the analysis phase, from feed files to a list of packages, using the
+vendored feed files. macOS tools and network requests are replaced with stand-ins
+so this runs on any platform.
+
+Each stage runs in its own process and reports the best wall time of a number of
+repeats, the peak RSS of the process, and the peak traced allocations and blocks
+still allocated after a single run.
+
+Usage:
+    python3 benchmarks/bench_analysis.py
+    python3 benchmarks/bench_analysis.py --output results.json
+    python3 benchmarks/bench_analysis.py --baseline benchmarks/baseline.json
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from collections import OrderedDict
+
+import stubs
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+class Context(object):
+    """Configures 'loopslib' to run against the vendored feed files in a temporary folder."""
+    def __init__(self, tmp_dir):
+        stubs.install()
+        sys.path.insert(0, stubs.SRC_DIR)
+
+        # pylint: disable=import-error
+        from loopslib import applications, compare, config, curl_requests, feed, http_client
+        from loopslib import option_packs, package, plist, process_source, remote_plist
+        # pylint: enable=import-error
+
+        stubs.install_network(http_client)
+
+        self.applications = applications
+        self.compare = compare
+        self.config = config
+        self.curl_requests = curl_requests
+        self.feed = feed
+        self.option_packs = option_packs
+        self.package = package
+        self.plist = plist
+        self.process_source = process_source
+        self.remote_plist = remote_plist
+
+        self.tmp_dir = tmp_dir
+        self.feeds = sorted(os.path.join(stubs.FEEDS_DIR, _f) for _f in os.listdir(stubs.FEEDS_DIR)
+                            if _f.endswith('.plist'))
+        self.latest = [_f for _, _f in sorted(stubs.LATEST_FEEDS.items())]
+
+        _apps = os.path.join(tmp_dir, 'Applications')
+        _receipts = os.path.join(tmp_dir, 'receipts')
+        os.makedirs(_receipts)
+        stubs.make_applications(_apps)
+
+        config.APPLICATIONS_PATH = _apps
+        config.CACHE_PATH = os.path.join(tmp_dir, 'cache')
+        config.DESTINATION_PATH = os.path.join(tmp_dir, 'appleloops')
+        config.RECEIPTS_PATH = _receipts
+        config.PLIST_CACHE = False
+        config.MANDATORY = True
+        config.OPTIONAL = True
+        config.SILENT = True
+
+    def reset(self):
+        """Discards anything cached in memory between repeats."""
+        self.feed.FEEDS.clear()
+        self.curl_requests.HEADER_CACHE.clear()
+        self.package.RECEIPTS.refresh()
+
+
+def stage_read_plist(ctx):
+    """Parses every vendored feed file."""
+    for _feed in ctx.feeds:
+        ctx.plist.readPlist(_feed)
+
+
+def stage_packages_reader(ctx):
+    """Streams the packages and option packs content from every vendored feed file."""
+    for _feed in ctx.feeds:
+        for _ in ctx.plist.PackagesReader(_feed, capture=['Content']):
+            pass
+
+
+def setup_read_plist_cached(ctx):
+    """Warms the parsed property list cache."""
+    ctx.config.PLIST_CACHE = True
+    stage_read_plist(ctx)
+
+
+def stage_applications(ctx):
+    """Builds the packages for each installed app."""
+    for _app in sorted(stubs.APP_INFO):
+        ctx.applications.Application(_app)._get_packages()
+
+
+def stage_remote_plist(ctx):
+    """Downloads and builds the packages for the latest feed of each app."""
+    for _feed in ctx.latest:
+        ctx.remote_plist.RemotePlist(obj=_feed)
+
+
+def setup_option_packs(ctx):
+    """Parses the feed files for the option packs stage."""
+    ctx.roots = [(ctx.plist.readPlist(_feed), os.path.basename(_feed)) for _feed in ctx.feeds]
+
+
+def stage_option_packs(ctx):
+    """Works out the option packs in every vendored feed file."""
+    for _root, _release in ctx.roots:
+        ctx.option_packs.OptionPack(source=_root, release=_release)
+
+
+def setup_deploying(ctx):
+    """Analyses install state as a deployment run would."""
+    ctx.config.DEPLOY_PKGS = True
+
+
+def stage_processed_source_plists(ctx):
+    """Processes the latest feed of each app as '-p allpkgs' would."""
+    ctx.process_source.ProcessedSource(plists=list(ctx.latest))
+
+
+def stage_processed_source_apps(ctx):
+    """Processes the installed apps as '-a allpkgs' would."""
+    _apps = [ctx.applications.Application(_app) for _app in sorted(stubs.APP_INFO)]
+    ctx.process_source.ProcessedSource(apps=_apps)
+
+
+def stage_compare(ctx):
+    """Compares the oldest and newest GarageBand feed files, 'downloading' both as
+    '--compare' does when given file names."""
+    _gb = [os.path.basename(_f) for _f in ctx.feeds if os.path.basename(_f).startswith('garageband')]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            ctx.compare.differences(file_a=_gb[-1], file_b=_gb[0])
+        except SystemExit:
+            pass
+
+
+# Stage name: (setup, run)
+STAGES = OrderedDict([
+    ('plist.readPlist', (None, stage_read_plist)),
+    ('plist.readPlist (cached)', (setup_read_plist_cached, stage_read_plist)),
+    ('plist.PackagesReader', (None, stage_packages_reader)),
+    ('Application._get_packages', (None, stage_applications)),
+    ('RemotePlist', (None, stage_remote_plist)),
+    ('OptionPack', (setup_option_packs, stage_option_packs)),
+    ('ProcessedSource (plists)', (None, stage_processed_source_plists)),
+    ('ProcessedSource (apps, deploying)', (setup_deploying, stage_processed_source_apps)),
+    ('compare.differences', (None, stage_compare)),
+])
+
+
+def peak_rss_kb():
+    """Returns the peak resident set size of this process in KB."""
+    result = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # macOS reports bytes, Linux reports KB.
+    if sys.platform == 'darwin':
+        result = result // 1024
+
+    return result
+
+
+def run_stage(name, repeat):
+    """Runs a single stage in this process and returns its measurements."""
+    result = dict()
+    _setup, _run = STAGES[name]
+    _tmp_dir = tempfile.mkdtemp(prefix='appleloops-bench-')
+
+    try:
+        os.chdir(_tmp_dir)
+        ctx = Context(tmp_dir=_tmp_dir)
+
+        if _setup:
+            _setup(ctx)
+
+        _times = list()
+
+        for _ in range(repeat):
+            ctx.reset()
+            gc.collect()
+
+            _start = time.perf_counter()
+            _run(ctx)
+            _times.append(time.perf_counter() - _start)
+
+        result['peak_rss_kb'] = peak_rss_kb()
+
+        # Allocations are traced in a separate run as tracing slows everything down.
+        ctx.reset()
+        gc.collect()
+        _blocks = sys.getallocatedblocks()
+        tracemalloc.start()
+        _run(ctx)
+        _, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        gc.collect()
+
+        result['wall_s'] = round(min(_times), 6)
+        result['alloc_peak_kb'] = round(_peak / 1024.0, 1)
+        result['alloc_blocks'] = sys.getallocatedblocks() - _blocks
+    finally:
+        os.chdir(stubs.BASE_DIR)
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+    return result
+
+
+def compare_baseline(results, baseline, threshold):
+    """Returns a list of messages for each stage slower, or allocating more, than the
+    baseline by more than 'threshold' (a fraction)."""
+    result = list()
+
+    for _name, _base in baseline.get('stages', dict()).items():
+        _current = results['stages'].get(_name)
+
+        if not _current:
+            continue
+
+        for _key in ['wall_s', 'alloc_peak_kb']:
+            if _base.get(_key) and _current[_key] > _base[_key] * (1 + threshold):
+                result.append('{}: {} {} exceeds baseline {} by more than {:.0%}'.format(
+                    _name, _key, _current[_key], _base[_key], threshold))
+
+    return result
+
+
+def main():
+    """Runs each stage in a new process and reports the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stage', help=argparse.SUPPRESS)
+    parser.add_argument('--repeat', type=int, default=5, help='repeats per stage, best time is reported')
+    parser.add_argument('--output', help='write the results as JSON to this path')
+    parser.add_argument('--baseline', nargs='?', const=BASELINE,
+                        help='compare against a stored baseline (default {})'.format(os.path.relpath(BASELINE)))
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed regression against the baseline as a fraction (default 0.25)')
+    args = parser.parse_args()
+
+    if args.stage:
+        print(json.dumps(run_stage(args.stage, repeat=args.repeat)))
+        return 0
+
+    results = {'python': platform.python_version(),
+               'platform': platform.platform(),
+               'stages': OrderedDict()}
+
+    print('{:<36} {:>10} {:>12} {:>14} {:>12}'.format('stage', 'wall (ms)', 'rss (KB)', 'alloc (KB)', 'blocks'))
+
+    for _name in STAGES:
+        _out = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                        '--stage', _name, '--repeat', str(args.repeat)])
+        _stage = json.loads(_out.decode('utf-8').strip().splitlines()[-1])
+        results['stages'][_name] = _stage
+
+        print('{:<36} {:>10.1f} {:>12} {:>14} {:>12}'.format(_name, _stage['wall_s'] * 1000, _stage['peak_rss_kb'],
+                                                          _stage['alloc_peak_kb'], _stage['alloc_blocks']))
+
+    if args.output:
+        with open(args.output, 'w') as _f:
+            json.dump(results, _f, indent=2)
+
+    _status = 0
+
+    if args.baseline:
+        with open(args.baseline) as _f:
+            _regressions = compare_baseline(results, json.load(_f), threshold=args.threshold)
+
+        for _msg in _regressions:
+            print('REGRESSION {}'.format(_msg))
+
+        _status = 1 if _regressions else 0
+
+    return _status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Benchmarks downloading a large package with the native HTTP backend, as a single stream
+and in segments, from a local Range capable HTTP stand-in. Each connection to the stand-in
+is limited to '--rate' bytes a second, like a single stream from Apple or a caching server.
+
+Also checks an interrupted segmented download: the stand-in drops every connection part way
+through the first attempt, then the download is restarted and must only fetch the blocks
+the segment map has as missing.
+
+Usage:
+    python3 benchmarks/bench_download.py
+    python3 benchmarks/bench_download.py --size 268435456 --rate 33554432 --segments 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import stubs
+
+# Bytes sent by the stand-in for each write.
+CHUNK_SIZE = 65536
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves the server's 'payload' at any path, honouring single 'Range' requests."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+    def _range(self):
+        """Returns the first and last byte requested."""
+        result = (0, len(self.server.payload) - 1)
+        _match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range') or '')
+
+        if _match:
+            result = (int(_match.group(1)), int(_match.group(2) or result[1]))
+
+        return result
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        """Sends the headers of the payload."""
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.server.payload)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Sends the requested range of the payload, at no more than 'rate' bytes a second,
+        dropping the connection after 'drop_after' bytes if set."""
+        _start, _end = self._range()
+        _partial = 'Range' in self.headers
+
+        self.send_response(206 if _partial else 200)
+        self.send_header('Content-Length', str(_end - _start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+
+        if _partial:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(_start, _end, len(self.server.payload)))
+
+        self.end_headers()
+
+        _began = time.perf_counter()
+        _sent = 0
+
+        while _start + _sent <= _end:
+            if self.server.drop_after is not None and _sent >= self.server.drop_after:
+                self.close_connection = True
+                return
+
+            _chunk = self.server.payload[_start + _sent:min(_start + _sent + CHUNK_SIZE, _end + 1)]
+            self.wfile.write(_chunk)
+            _sent += len(_chunk)
+
+            with self.server.lock:
+                self.server.bytes_sent += len(_chunk)
+
+            _ahead = _sent / float(self.server.rate) - (time.perf_counter() - _began)
+
+            if _ahead > 0:
+                time.sleep(_ahead)
+
+
+def start_server(payload, rate):
+    """Starts the stand-in on a free local port, returning the server."""
+    result = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    result.daemon_threads = True
+    result.payload = payload
+    result.rate = rate
+    result.drop_after = None
+    result.bytes_sent = 0
+    result.lock = threading.Lock()
+
+    _thread = threading.Thread(target=result.serve_forever)
+    _thread.daemon = True
+    _thread.start()
+
+    return result
+
+
+def download(http_client, config, url, output, segments):
+    """Downloads the URL, returning the wall time."""
+    result = None
+
+    config.DOWNLOAD_SEGMENTS = segments
+    http_client.POOL.close()
+    http_client.curl_requests.HEADER_CACHE.clear()
+
+    _start = time.perf_counter()
+    http_client.new_request(silent_override=True).get(url=url, output=output)
+    result = time.perf_counter() - _start
+
+    return result
+
+
+def main():
+    """Runs each download and reports the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=134217728, help='bytes in the package (default 128MB)')
+    parser.add_argument('--rate', type=int, default=33554432,
+                        help='bytes a second each connection is limited to (default 32MB)')
+    parser.add_argument('--segments', type=int, default=4, help='segments to download in (default 4)')
+    parser.add_argument('--output', help='write the results as JSON to this path')
+    args = parser.parse_args()
+
+    sys.path.insert(0, stubs.SRC_DIR)
+
+    # pylint: disable=import-error
+    from loopslib import config, curl_requests, http_client
+    # pylint: enable=import-error
+
+    _payload = os.urandom(args.size)
+    _digest = hashlib.sha256(_payload).hexdigest()
+    _server = start_server(_payload, rate=args.rate)
+    _url = 'http://127.0.0.1:{}/lp10_ms3_content_2016/MAContent10_AssetPack_bench.pkg'.format(_server.server_port)
+    _tmp_dir = tempfile.mkdtemp(prefix='appleloops-bench-')
+
+    config.CACHE_PATH = os.path.join(_tmp_dir, 'cache')
+    config.SEGMENT_THRESHOLD = 1
+    config.SILENT = True
+
+    results = {'python': platform.python_version(),
+               'platform': platform.platform(),
+               'size': args.size,
+               'rate': args.rate,
+               'downloads': dict()}
+    _status = 0
+
+    try:
+        for _segments in [1, args.segments]:
+            _output = os.path.join(_tmp_dir, '{}'.format(_segments), os.path.basename(_url))
+            _wall = download(http_client, config, _url, _output, segments=_segments)
+
+            with open(_output, 'rb') as _f:
+                _ok = hashlib.sha256(_f.read()).hexdigest() == _digest
+
+            results['downloads']['{} segments'.format(_segments)] = {'wall_s': round(_wall, 6),
+                                                                    'mb_per_s': round(args.size / _wall / 1048576, 1),
+                                                                    'matches': _ok}
+            _status = _status or (0 if _ok else 1)
+
+            print('{} segments: {:.2f}s ({:.1f} MB/s), {}'.format(_segments, _wall, args.size / _wall / 1048576,
+                                                                 'matches' if _ok else 'DOES NOT MATCH'))
+
+        # Interrupt a segmented download part way, then restart it.
+        _output = os.path.join(_tmp_dir, 'restart', os.path.basename(_url))
+        _server.drop_after = args.size // args.segments // 2
+        config.CURL_RETRIES = '0'
+
+        try:
+            download(http_client, config, _url, _output, segments=args.segments)
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+        _map = curl_requests.SegmentMap(_output, args.size)
+        _map.open()
+        _missing = args.size - _map.done_bytes
+        _map.close()
+
+        _server.drop_after = None
+        _server.bytes_sent = 0
+        download(http_client, config, _url, _output, segments=args.segments)
+
+        with open(_output, 'rb') as _f:
+            _ok = hashlib.sha256(_f.read()).hexdigest() == _digest and not os.path.exists(_map.sidecar(_output))
+
+        _ok = _ok and _server.bytes_sent == _missing
+        results['restart'] = {'missing_bytes': _missing, 'refetched_bytes': _server.bytes_sent, 'matches': _ok}
+        _status = _status or (0 if _ok else 1)
+
+        print('restart: {} of {} bytes missing after interruption, {} fetched on restart, {}'.format(
+            _missing, args.size, _server.bytes_sent, 'matches' if _ok else 'DOES NOT MATCH'))
+    finally:
+        _server.shutdown()
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as _f:
+            json.dump(results, _f, indent=2)
+
+    return _status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Checks the native HTTP backend against a local HTTP stand-in: retrying a transient
+status, following a redirect, decompressing a gzipped package, resuming a dropped single
+stream download with a Range request, going through a proxy, and failing straight away
+when the connection is refused. Reports the wall time of each check.
+
+Usage:
+    python3 benchmarks/bench_http.py
+    python3 benchmarks/bench_http.py --size 16777216
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import stubs
+
+# Bytes sent by the stand-in for each write.
+CHUNK_SIZE = 65536
+
+# Host name only the stand-in knows, so a request for it must have gone through the proxy.
+PROXIED_HOST = 'appleloops.invalid'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves the server's 'payload' with a different behaviour for each path:
+        '/file.pkg'      honours single 'Range' requests
+        '/retry.pkg'     responds '503' to the first 'failures' GET requests
+        '/redirect.pkg'  redirects to '/file.pkg'
+        '/gzip.pkg'      sends the payload gzipped
+        '/resume.pkg'    drops the first 'drops' GET requests half way through
+    Every request is recorded in the server's 'requests'."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+    def _range(self):
+        """Returns the first and last byte requested."""
+        result = (0, len(self.server.payload) - 1)
+        _match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range') or '')
+
+        if _match:
+            result = (int(_match.group(1)), int(_match.group(2) or result[1]))
+
+        return result
+
+    def _respond(self, send_body):
+        """Sends the response for the requested path."""
+        _path = urlparse(self.path).path
+
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path, dict(self.headers)))
+
+        if _path == '/redirect.pkg':
+            self.send_response(302)
+            self.send_header('Location', '/file.pkg')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif _path == '/retry.pkg' and send_body and self.server.failures:
+            self.server.failures -= 1
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif _path == '/gzip.pkg':
+            _body = gzip.compress(self.server.payload)
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(_body)))
+            self.send_header('Content-Encoding', 'gzip')
+            self.end_headers()
+
+            if send_body:
+                self.wfile.write(_body)
+        else:
+            _start, _end = self._range()
+            _partial = 'Range' in self.headers
+            _drop = None
+
+            if _path == '/resume.pkg' and send_body and self.server.drops:
+                self.server.drops -= 1
+                _drop = len(self.server.payload) // 2
+
+            self.send_response(206 if _partial else 200)
+            self.send_header('Content-Length', str(_end - _start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+
+            if _partial:
+                self.send_header('Content-Range', 'bytes {}-{}/{}'.format(_start, _end, len(self.server.payload)))
+
+            self.end_headers()
+
+            if send_body:
+                _sent = 0
+
+                while _start + _sent <= _end:
+                    if _drop is not None and _sent >= _drop:
+                        self.close_connection = True
+                        return
+
+                    _chunk = self.server.payload[_start + _sent:min(_start + _sent + CHUNK_SIZE, _end + 1)]
+                    self.wfile.write(_chunk)
+                    _sent += len(_chunk)
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        """Sends the headers for the requested path."""
+        self._respond(send_body=False)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Sends the response for the requested path."""
+        self._respond(send_body=True)
+
+
+def start_server(payload):
+    """Starts the stand-in on a free local port, returning the server."""
+    result = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    result.daemon_threads = True
+    result.payload = payload
+    result.failures = 0
+    result.drops = 0
+    result.requests = list()
+    result.lock = threading.Lock()
+
+    _thread = threading.Thread(target=result.serve_forever)
+    _thread.daemon = True
+    _thread.start()
+
+    return result
+
+
+def free_port():
+    """Returns a local port nothing is listening on."""
+    result = None
+
+    with socket.socket() as _s:
+        _s.bind(('127.0.0.1', 0))
+        result = _s.getsockname()[1]
+
+    return result
+
+
+def download(http_client, url, output):
+    """Downloads the URL with a fresh connection pool and header cache, returning the
+    wall time and the error raised, if any."""
+    result = None
+    _error = None
+
+    http_client.POOL.close()
+    http_client.curl_requests.HEADER_CACHE.clear()
+
+    _start = time.perf_counter()
+
+    try:
+        http_client.HTTPClient(silent_override=True).get(url=url, output=output)
+    except Exception as _e:  # pylint: disable=broad-except
+        _error = _e
+
+    result = (time.perf_counter() - _start, _error)
+
+    return result
+
+
+def matches(output, digest):
+    """Returns 'True' if the file exists and has the digest."""
+    result = False
+
+    if os.path.exists(output):
+        with open(output, 'rb') as _f:
+            result = hashlib.sha256(_f.read()).hexdigest() == digest
+
+    return result
+
+
+# pylint: disable=too-many-locals
+# pylint: disable=too-many-statements
+def main():
+    """Runs each check and reports the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=4194304, help='bytes in the package (default 4MB)')
+    parser.add_argument('--output', help='write the results as JSON to this path')
+    args = parser.parse_args()
+
+    sys.path.insert(0, stubs.SRC_DIR)
+
+    # pylint: disable=import-error
+    from loopslib import config, http_client
+    # pylint: enable=import-error
+
+    _payload = os.urandom(args.size)
+    _digest = hashlib.sha256(_payload).hexdigest()
+    _server = start_server(_payload)
+    _base = 'http://127.0.0.1:{}'.format(_server.server_port)
+    _tmp_dir = tempfile.mkdtemp(prefix='appleloops-bench-')
+
+    config.CACHE_PATH = os.path.join(_tmp_dir, 'cache')
+    config.DOWNLOAD_SEGMENTS = 1
+    config.CURL_RETRIES = '5'
+    config.SILENT = True
+
+    results = {'python': platform.python_version(),
+               'platform': platform.platform(),
+               'size': args.size,
+               'checks': dict()}
+    _status = 0
+
+    def check(name, url, test):
+        """Downloads the URL, then records whether 'test' passes for the GET requests the
+        stand-in received, the wall time, and the error raised."""
+        _output = os.path.join(_tmp_dir, name, os.path.basename(urlparse(url).path))
+        _server.requests = list()
+        _wall, _error = download(http_client, url, _output)
+        _gets = [(_path, _headers) for _method, _path, _headers in _server.requests if _method == 'GET']
+        _ok = bool(test(_output, _gets, _wall, _error))
+
+        results['checks'][name] = {'wall_s': round(_wall, 6), 'requests': len(_server.requests),
+                                   'error': '{}'.format(_error) if _error else None, 'passes': _ok}
+        print('{}: {:.2f}s, {} requests, {}'.format(name, _wall, len(_server.requests),
+                                                   'passes' if _ok else 'FAILS ({})'.format(_error)))
+
+        return 0 if _ok else 1
+
+    try:
+        _server.failures = 2
+        _status |= check('retry', _base + '/retry.pkg',
+                         lambda _output, _gets, _wall, _error: matches(_output, _digest) and len(_gets) == 3)
+
+        _status |= check('redirect', _base + '/redirect.pkg',
+                         lambda _output, _gets, _wall, _error: (matches(_output, _digest) and
+                                                                [_p for _p, _h in _gets] == ['/redirect.pkg',
+                                                                                             '/file.pkg']))
+
+        _status |= check('gzip', _base + '/gzip.pkg',
+                         lambda _output, _gets, _wall, _error: (matches(_output, _digest) and
+                                                                _gets[0][1].get('Accept-Encoding') == 'gzip'))
+
+        _server.drops = 1
+        _status |= check('resume', _base + '/resume.pkg',
+                         lambda _output, _gets, _wall, _error: (matches(_output, _digest) and len(_gets) == 2 and
+                                                                _gets[1][1].get('Range') == 'bytes={}-'.format(
+                                                                    args.size // 2)))
+
+        config.PROXY = _base
+        _status |= check('proxy', 'http://{}/file.pkg'.format(PROXIED_HOST),
+                         lambda _output, _gets, _wall, _error: (matches(_output, _digest) and
+                                                                all(_p.startswith('http://{}/'.format(PROXIED_HOST))
+                                                                    for _m, _p, _h in _server.requests)))
+        config.PROXY = None
+
+        # Nothing to retry, so this fails well within the first one second backoff.
+        _status |= check('refused', 'http://127.0.0.1:{}/file.pkg'.format(free_port()),
+                         lambda _output, _gets, _wall, _error: isinstance(_error, http_client.TransferError) and
+                         _wall < 1)
+    finally:
+        _server.shutdown()
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as _f:
+            json.dump(results, _f, indent=2)
+
+    return _status
+# pylint: enable=too-many-statements
+# pylint: enable=too-many-locals
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Benchmarks deploying packages with one 'installer' call per package against batches of
+packages installed with one call each. The stand-in 'installer' takes '--startup' seconds
+for each call, plus '--per-package' seconds for each package, and writes a receipt for each
+package it installs.
+
+Also checks a failed batch: the stand-in only installs half of each batch then fails, and
+the rest of each batch must be installed separately.
+
+Usage:
+    python3 benchmarks/bench_install.py
+    python3 benchmarks/bench_install.py --packages 100 --batch 25 --startup 1
+"""
+import argparse
+import json
+import os
+import platform
+import plistlib
+import shutil
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timezone
+from xml.etree import ElementTree
+
+import stubs
+
+
+class Installer(object):
+    """Stand-in for 'installer' that records a receipt for each package it installs."""
+    def __init__(self, receipts_path, startup, per_package):
+        self.receipts_path = receipts_path
+        self.startup = startup
+        self.per_package = per_package
+        self.fail_batches = False
+        self.calls = 0
+
+    def package_ids(self, file_path):
+        """Returns the package IDs in a distribution, or of a stand-in package."""
+        result = None
+
+        if file_path.endswith('.dist'):
+            result = [_ref.get('id') for _ref in ElementTree.parse(file_path).getroot().findall('pkg-ref')]
+        else:
+            with open(file_path, 'r') as _f:
+                result = [_f.read()]
+
+        return result
+
+    def __call__(self, cmd):
+        _file_path = cmd[cmd.index('-pkg') + 1]
+        _ids = self.package_ids(_file_path)
+        _failed = self.fail_batches and len(_ids) > 1
+
+        if _failed:
+            _ids = _ids[:len(_ids) // 2]
+
+        self.calls += 1
+        time.sleep(self.startup + self.per_package * len(_ids))
+
+        for _id in _ids:
+            with open(os.path.join(self.receipts_path, '{}.plist'.format(_id)), 'wb') as _f:
+                plistlib.dump({'PackageIdentifier': _id,
+                               'PackageVersion': '1.0.0',
+                               'InstallDate': datetime.now(timezone.utc).replace(tzinfo=None)}, _f)
+
+        return stubs.FakeProcess(stdout=b'installer: The install was successful.', returncode=1 if _failed else 0)
+
+
+def main():
+    """Runs each deployment and reports the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--packages', type=int, default=40, help='packages to deploy (default 40)')
+    parser.add_argument('--batch', type=int, default=10, help='packages in each batch (default 10)')
+    parser.add_argument('--startup', type=float, default=0.25,
+                        help='seconds each installer call takes to start (default 0.25)')
+    parser.add_argument('--per-package', type=float, default=0.02,
+                        help='seconds each package takes to install (default 0.02)')
+    parser.add_argument('--output', help='write the results as JSON to this path')
+    args = parser.parse_args()
+
+    stubs.install()
+    sys.path.insert(0, stubs.SRC_DIR)
+
+    # pylint: disable=import-error
+    from loopslib import config, deployment, package
+    # pylint: enable=import-error
+
+    _tmp_dir = tempfile.mkdtemp(prefix='appleloops-bench-')
+    _receipts = os.path.join(_tmp_dir, 'receipts')
+    _installer = Installer(_receipts, startup=args.startup, per_package=args.per_package)
+    stubs.INSTALLER = _installer
+
+    # Packages are deployed from a 'DMG', so they're left in place between runs.
+    config.CACHE_PATH = os.path.join(_tmp_dir, 'cache')
+    config.DEPLOY_PKGS = True
+    config.DESTINATION_PATH = config.DEFAULT_DEST
+    config.DMG_VOLUME_MOUNTPATH = os.path.join(_tmp_dir, 'volume')
+    config.HTTP_DMG = True
+    config.RECEIPTS_PATH = _receipts
+    config.SILENT = True
+
+    _pkgs = [package.LoopPackage(DownloadName='Bench{:04d}.pkg'.format(_i),
+                                 PackageID='com.apple.pkg.Bench{:04d}'.format(_i),
+                                 PackageVersion='1.0.0',
+                                 DownloadSize=1024,
+                                 InstalledSize=4096) for _i in range(args.packages)]
+
+    for _pkg in _pkgs:
+        os.makedirs(os.path.dirname(_pkg.DownloadPath), exist_ok=True)
+
+        with open(_pkg.DownloadPath, 'w') as _f:
+            _f.write(_pkg.PackageID)
+
+    results = {'python': platform.python_version(),
+               'platform': platform.platform(),
+               'packages': args.packages,
+               'startup': args.startup,
+               'per_package': args.per_package,
+               'deployments': dict()}
+    _status = 0
+
+    try:
+        for _name, _batch, _fail in [('separately', 1, False),
+                                     ('batches of {}'.format(args.batch), args.batch, False),
+                                     ('failed batches of {}'.format(args.batch), args.batch, True)]:
+            shutil.rmtree(_receipts, ignore_errors=True)
+            os.makedirs(_receipts)
+            package.RECEIPTS.refresh()
+            _installer.fail_batches = _fail
+            _installer.calls = 0
+
+            _start = time.perf_counter()
+            deployment.LoopDeployment(batch=_batch).process_all(_pkgs)
+            _wall = time.perf_counter() - _start
+
+            _installed = len(os.listdir(_receipts))
+            _ok = _installed == args.packages
+            _status = _status or (0 if _ok else 1)
+
+            results['deployments'][_name] = {'wall_s': round(_wall, 6),
+                                             'installer_calls': _installer.calls,
+                                             'installed': _installed}
+
+            print('{}: {:.2f}s, {} installer calls, {} of {} installed'.format(
+                _name, _wall, _installer.calls, _installed, args.packages))
+    finally:
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as _f:
+            json.dump(results, _f, indent=2)
+
+    return _status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
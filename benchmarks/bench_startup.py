@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Benchmarks appleloops startup, from starting Python to the end of a short command
+such as '--help'. macOS tools and network requests are replaced with stand-ins so this
+runs on any platform.
+
+Reports the best wall time of a number of runs, the macOS tools each command ran, and
+the slowest imports from Python's '-X importtime' output. Runs the 'src' folder unless
+built zipapps are given with '--app', to compare builds.
+
+Usage:
+    python3 benchmarks/bench_startup.py
+    python3 benchmarks/bench_startup.py --top 20 --output startup.json
+    python3 benchmarks/bench_startup.py --app appleloops.compressed --app appleloops.precompiled
+    python3 benchmarks/bench_startup.py -- --supported-plists
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import stubs
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Commands timed when none are given.
+COMMANDS = [['--help'],
+            ['--compare', 'garageband1016.plist', 'garageband1020.plist'],
+            ['--apps', 'garageband', '-m', '-o', '--deployment', '--dry-run']]
+
+# Runs appleloops (the 'src' folder or a zipapp) with the stand-ins installed, then writes
+# the commands run through 'subprocess.Popen' to the file in 'APPLELOOPS_BENCH_CALLS' on exit.
+# Stand-in apps are in 'APPLELOOPS_BENCH_DIR'.
+CHILD = '''
+import atexit, json, os, runpy, sys
+sys.path.insert(0, {bench_dir!r})
+import stubs
+stubs.install()
+stubs.install_on_import(path=os.environ['APPLELOOPS_BENCH_DIR'])
+
+def _dump():
+    with open(os.environ['APPLELOOPS_BENCH_CALLS'], 'w') as _f:
+        json.dump(stubs.CALLS, _f)
+
+atexit.register(_dump)
+sys.argv = [sys.argv[1]] + sys.argv[2:]
+runpy.run_path(sys.argv[0], run_name='__main__')
+'''.format(bench_dir=BENCH_DIR)
+
+
+def parse_importtime(stderr):
+    """Returns a list of (module, self us, cumulative us) from '-X importtime' output."""
+    result = list()
+
+    for _line in stderr.splitlines():
+        if not _line.startswith('import time:') or 'self [us]' in _line:
+            continue
+
+        _self, _cumulative, _module = _line.replace('import time:', '').split('|')
+        result.append((_module.rstrip(), int(_self), int(_cumulative)))
+
+    return result
+
+
+def run_command(app, args, env, cwd):
+    """Runs appleloops once, returning the wall time, imports, and commands it ran."""
+    result = None
+
+    _start = time.perf_counter()
+    _proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, app] + args, env=env, cwd=cwd,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    _wall = time.perf_counter() - _start
+
+    with open(env['APPLELOOPS_BENCH_CALLS']) as _f:
+        _calls = json.load(_f)
+
+    result = {'wall_s': _wall,
+              'exit_code': _proc.returncode,
+              'imports': parse_importtime(_proc.stderr),
+              'calls': _calls}
+
+    return result
+
+
+def measure(app, args, repeat, top):
+    """Returns the measurements for the best of 'repeat' runs of a command."""
+    result = None
+
+    # Runs in a folder without feed files, so files given to '--compare' are 'downloaded'.
+    _tmp_dir = tempfile.mkdtemp(prefix='appleloops-bench-')
+    _env = dict(os.environ,
+                APPLELOOPS_BENCH_CALLS=os.path.join(_tmp_dir, 'calls.json'),
+                APPLELOOPS_BENCH_DIR=_tmp_dir)
+
+    try:
+        stubs.make_applications(os.path.join(_tmp_dir, 'Applications'))
+        os.makedirs(os.path.join(_tmp_dir, 'receipts'))
+
+        _runs = [run_command(app, args, env=_env, cwd=_tmp_dir) for _ in range(repeat)]
+    finally:
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+    _best = min(_runs, key=lambda _run: _run['wall_s'])
+    _loopslib = [_imp for _imp in _best['imports'] if _imp[0].strip().startswith('loopslib')]
+
+    result = {'wall_s': round(_best['wall_s'], 6),
+              'exit_code': _best['exit_code'],
+              'modules_imported': len(_best['imports']),
+              'loopslib_modules_imported': len(_loopslib),
+              'import_self_us': sum(_imp[1] for _imp in _best['imports']),
+              'loopslib_import_self_us': sum(_imp[1] for _imp in _loopslib),
+              'subprocess_calls': [' '.join(_call) for _call in _best['calls']],
+              'slowest_imports': [{'module': _mod.strip(), 'self_us': _self, 'cumulative_us': _cumulative}
+                                  for _mod, _self, _cumulative in sorted(_best['imports'],
+                                                                         key=lambda _imp: _imp[1],
+                                                                         reverse=True)[:top]]}
+
+    return result
+
+
+def main():
+    """Times each command and reports the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='runs per command, best time is reported')
+    parser.add_argument('--top', type=int, default=10, help='number of slowest imports to report')
+    parser.add_argument('--output', help='write the results as JSON to this path')
+    parser.add_argument('--app', action='append', help='zipapp to run instead of \'src\', can be repeated')
+    parser.add_argument('command', nargs='*', help='appleloops arguments to time, after \'--\'')
+    args = parser.parse_args()
+
+    _apps = [os.path.abspath(_app) for _app in args.app] if args.app else [stubs.SRC_DIR]
+    _commands = [args.command] if args.command else COMMANDS
+    results = {'python': platform.python_version(),
+               'platform': platform.platform(),
+               'commands': dict()}
+
+    for _app, _command in [(_app, _command) for _app in _apps for _command in _commands]:
+        _name = ' '.join([os.path.relpath(_app)] + _command)
+        _result = measure(_app, _command, repeat=args.repeat, top=args.top)
+        results['commands'][_name] = _result
+
+        print('{}: {:.1f} ms, exit code {}'.format(_name, _result['wall_s'] * 1000, _result['exit_code']))
+        print('  {} modules imported in {:.1f} ms, {} from loopslib in {:.1f} ms'.format(
+            _result['modules_imported'], _result['import_self_us'] / 1000.0,
+            _result['loopslib_modules_imported'], _result['loopslib_import_self_us'] / 1000.0))
+        print('  subprocess calls: {}'.format(', '.join(_result['subprocess_calls']) or 'none'))
+
+        for _imp in _result['slowest_imports']:
+            print('  {:>9.1f} ms self {:>9.1f} ms cumulative  {}'.format(
+                _imp['self_us'] / 1000.0, _imp['cumulative_us'] / 1000.0, _imp['module']))
+
+    if args.output:
+        with open(args.output, 'w') as _f:
+            json.dump(results, _f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Stand-ins for the macOS tools and network requests appleloops uses, so the
+benchmarks run on any platform against the vendored feed files."""
+import importlib.abc
+import importlib.machinery
+import os
+import plistlib
+import shutil
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(BASE_DIR, 'src')
+FEEDS_DIR = os.path.join(BASE_DIR, 'lp10_ms3_content_2016')
+
+# Feed files used as the 'latest' release of each app.
+LATEST_FEEDS = {'garageband': 'garageband1020.plist',
+                'logicpro': 'logicpro1050.plist',
+                'mainstage': 'mainstage324.plist'}
+
+# Info.plist values for the stand-in app bundles.
+APP_INFO = {'garageband': ('GarageBand.app', 'GarageBand', '10.3.5'),
+            'logicpro': ('Logic Pro X.app', 'Logic Pro X', '10.5.1'),
+            'mainstage': ('MainStage 3.app', 'MainStage 3', '3.4.4')}
+
+OS_VERSION = b'10.15.7\n'
+OS_BUILD = b'19H2\n'
+FREE_SPACE = 1024 ** 4
+
+_REAL_POPEN = subprocess.Popen
+
+# Commands run through the stand-in 'subprocess.Popen', for checking what was called.
+CALLS = list()
+
+# Function called with the command instead of returning the canned 'installer' output, to
+# stand in for installing packages. Must return a 'FakeProcess'.
+INSTALLER = None
+
+
+class FakeProcess(object):
+    """Stand-in for a finished 'subprocess.Popen' process."""
+    def __init__(self, stdout=b'', stderr=b'', returncode=0):
+        self._stdout = stdout
+        self._stderr = stderr
+        self.returncode = returncode
+
+    def communicate(self, *args, **kwargs):
+        """Returns the canned output."""
+        return self._stdout, self._stderr
+
+
+def fake_popen(cmd, *args, **kwargs):
+    """Returns canned output for the macOS tools, passing anything else to the real 'Popen'."""
+    result = None
+    _tool = os.path.basename(cmd[0]) if isinstance(cmd, (list, tuple)) else None
+
+    if _tool:
+        CALLS.append(list(cmd))
+
+    if _tool == 'sw_vers' and len(cmd) == 1:
+        result = FakeProcess(stdout=b'ProductName:\tMac OS X\nProductVersion:\t' + OS_VERSION +
+                             b'BuildVersion:\t' + OS_BUILD)
+    elif _tool == 'sw_vers':
+        result = FakeProcess(stdout=OS_BUILD if cmd[-1] == '-buildVersion' else OS_VERSION)
+    elif _tool == 'pkgutil':
+        result = FakeProcess(stderr="No receipt for '{}' found at '/'.".format(cmd[-1]).encode('utf-8'), returncode=1)
+    elif _tool == 'diskutil':
+        result = FakeProcess(stdout=plistlib.dumps({'FreeSpace': FREE_SPACE, 'APFSContainerFree': FREE_SPACE}))
+    elif _tool == 'installer' and INSTALLER:
+        result = INSTALLER(cmd)
+    elif _tool == 'installer':
+        result = FakeProcess(stdout=b'installer: The install was successful.')
+    elif _tool == 'hdiutil':
+        result = FakeProcess(stdout=plistlib.dumps({'images': [], 'system-entities': []}))
+    else:
+        result = _REAL_POPEN(cmd, *args, **kwargs)
+
+    return result
+
+
+class FakeRequest(object):
+    """Stand-in for 'http_client.new_request' that 'downloads' files from the vendored
+    feed files folder."""
+    def __init__(self, url=None, silent_override=False):
+        self._url = url
+        self._silent_override = silent_override
+
+        self.headers = {'Status': 'HTTP/1.1 200 OK'}
+        self.status = 200
+        self.curl_error = None
+
+    def get(self, url, output=None, counter_msg=None, resume=True):
+        """Copies the vendored file matching the URL to 'output'."""
+        _source = os.path.join(FEEDS_DIR, os.path.basename(url))
+
+        if output and os.path.exists(_source):
+            _dir = os.path.dirname(output)
+
+            if _dir and not os.path.exists(_dir):
+                os.makedirs(_dir)
+
+            shutil.copyfile(_source, output)
+
+
+def make_applications(path):
+    """Creates stand-in app bundles containing the latest feed files in 'path'."""
+    for _app, (_bundle, _name, _version) in APP_INFO.items():
+        _contents = os.path.join(path, _bundle, 'Contents')
+        _resources = os.path.join(_contents, 'Resources')
+
+        if not os.path.exists(_resources):
+            os.makedirs(_resources)
+
+        with open(os.path.join(_contents, 'Info.plist'), 'wb') as _f:
+            plistlib.dump({'CFBundleName': _name,
+                           'CFBundleIdentifier': 'com.apple.{}'.format(_app),
+                           'CFBundleShortVersionString': _version,
+                           'LSMinimumSystemVersion': '10.14'}, _f)
+
+        shutil.copyfile(os.path.join(FEEDS_DIR, LATEST_FEEDS[_app]), os.path.join(_resources, LATEST_FEEDS[_app]))
+
+
+def install():
+    """Replaces 'subprocess.Popen' with the stand-in. Must be called before importing 'loopslib'."""
+    subprocess.Popen = fake_popen
+
+
+def install_network(http_client):
+    """Replaces network requests in 'loopslib' with the stand-in."""
+    http_client.new_request = FakeRequest
+
+
+def install_paths(config, path):
+    """Points 'loopslib' at the stand-in apps and an empty receipts folder in 'path'."""
+    config.APPLICATIONS_PATH = os.path.join(path, 'Applications')
+    config.RECEIPTS_PATH = os.path.join(path, 'receipts')
+
+
+class PatchFinder(importlib.abc.MetaPathFinder):
+    """Calls a function with a 'loopslib' module as soon as it is imported, for when
+    'loopslib' imports modules lazily."""
+    def __init__(self, patches):
+        self._patches = patches
+
+    def find_spec(self, fullname, path, target=None):
+        """Finds the module as usual, but with the patch applied after import."""
+        result = None
+        _patch = self._patches.get(fullname)
+
+        if _patch:
+            result = importlib.machinery.PathFinder.find_spec(fullname, path)
+
+        if result:
+            _exec_module = result.loader.exec_module
+
+            def exec_module(module):
+                _exec_module(module)
+                _patch(module)
+
+            result.loader.exec_module = exec_module
+
+        return result
+
+
+def install_on_import(path=None):
+    """Replaces network requests in 'loopslib' with the stand-in when it is imported, and
+    if 'path' is given, points 'loopslib' at the stand-in apps in it."""
+    _patches = {'loopslib.http_client': install_network}
+
+    if path:
+        _patches['loopslib.config'] = lambda config: install_paths(config, path)
+
+    sys.meta_path.insert(0, PatchFinder(_patches))
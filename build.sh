@@ -10,13 +10,24 @@ if [ ${LOCAL_PYTHON} == '' ]; then
     exit 1
 fi
 
+# To build with pre-compiled modules stored uncompressed, for faster startup, add '--precompiled'
+# before any other option. Modules are compiled for '/usr/local/bin/python3', any other python
+# version falls back to compiling the modules each time it runs.
+# For example: ./build.sh --precompiled
+ZIPAPP_CMD="/usr/local/bin/python3 -m zipapp src --compress"
+
+if [[ ${1} == '--precompiled' ]]; then
+    ZIPAPP_CMD="/usr/local/bin/python3 support_utils/build_zipapp.py src"
+    shift
+fi
+
 # To provide your own python path, just add '--python=/path/to/python' after './build'
 # For example: ./build.sh --python="/usr/bin/env python3.7"
 # or           ./build.sh --python="/usr/local/munki/python"
 if [[ ! -z ${1} ]]; then
-    DIST_CMD=$(echo /usr/local/bin/python3 -m zipapp src --compress --output ${BUILD_OUT} ${1})
+    DIST_CMD=$(echo ${ZIPAPP_CMD} --output ${BUILD_OUT} ${1})
 else
-    DIST_CMD=$(echo /usr/local/bin/python3 -m zipapp src --compress --output ${BUILD_OUT} --python=\"/usr/local/bin/python3\")
+    DIST_CMD=$(echo ${ZIPAPP_CMD} --output ${BUILD_OUT} --python=\"/usr/local/bin/python3\")
 fi
 
 # Clean up
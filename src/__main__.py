@@ -19,6 +19,7 @@ Tested on Python 2.7.10 (as shipped in macOS X) and Python 3.7.0
 """
 # pylint: disable=multiple-statements
 import sys; sys.dont_write_bytecode = True  # NOQA
+import atexit
 import logging
 import logging.handlers
 import os
@@ -27,23 +28,23 @@ from datetime import datetime
 from pprint import pprint  # NOQA
 
 try:
-    from loopslib import applications
+    import Queue as queue  # Python 2 package
+except ImportError:
+    import queue  # Python 3 package
+
+# Only the modules needed to parse arguments are imported here, the rest are
+# imported by 'loopslib' the first time they're used, so '--help' and friends
+# don't pay for importing the download and deployment modules.
+try:
+    import loopslib
     from loopslib import arguments
     from loopslib import config
-    from loopslib import diskusage
-    from loopslib import deployment
-    from loopslib import dmg
     from loopslib import misc
-    from loopslib import process_source
 except ModuleNotFoundError:
-    from .loopslib import applications
+    from . import loopslib
     from .loopslib import arguments
     from .loopslib import config
-    from .loopslib import diskusage
-    from .loopslib import deployment
-    from .loopslib import dmg
     from .loopslib import misc
-    from .loopslib import process_source
 
 
 # pylint: disable=invalid-name
@@ -56,12 +57,30 @@ def config_logging(log_level=None):
     fmt = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     fmt = logging.Formatter(fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
     fh.setFormatter(fmt)
-    log.addHandler(fh)
 
     if os.path.isfile(config.LOG_FILE_PATH):
         fh.doRollover()
 
+    # Records are queued, then formatted and written to the log file on the listener's thread.
+    qh = misc.DroppingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+    listener = logging.handlers.QueueListener(qh.queue, fh, respect_handler_level=True)
+    log.addHandler(qh)
+    listener.start()
+    atexit.register(stop_logging, log=log, handler=qh, listener=listener, file_handler=fh)
+
     return logging.getLogger(__name__)
+
+
+def stop_logging(log, handler, listener, file_handler):
+    """Writes any queued log records, then logs to the log file directly, noting any records
+    dropped because the queue was full."""
+    listener.stop()
+    log.removeHandler(handler)
+    log.addHandler(file_handler)
+
+    if handler.dropped:
+        log.warning('Dropped log records when the log queue was full: {}'.format(
+            ', '.join('{} {}'.format(_count, _level) for _level, _count in sorted(handler.dropped.items()))))
 # pylint: enable=invalid-name
 
 
@@ -79,16 +98,13 @@ def main():
     # Logging
     config_logging(log_level=args.log_level)
 
-    # Disk
-    disk = diskusage.DiskStats()
-
     # Open log file
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     logging.info('------------------ Log opened on {} ------------------'.format(now))
 
     # Create sparse image if building DMG
     if args.build_dmg:
-        sparse = dmg.BuildDMG(filename=config.DMG_FILE)
+        sparse = loopslib.dmg.BuildDMG(filename=config.DMG_FILE)
         sparse.make_sparseimage()
 
     # Debug log stats
@@ -104,13 +120,13 @@ def main():
 
     # Mount a HTTP DMG if exists (deployment only)
     if config.HTTP_DMG:
-        sparse = dmg.BuildDMG()
+        sparse = loopslib.dmg.BuildDMG()
         sparse.mount(dmg=config.HTTP_DMG_PATH, read_only=True)  # Force read only so no delete!
 
     if config.APPS_TO_PROCESS:
-        garageband = applications.Application('garageband') if 'garageband' in config.APPS_TO_PROCESS else None
-        logicpro = applications.Application('logicpro') if 'logicpro' in config.APPS_TO_PROCESS else None
-        mainstage = applications.Application('mainstage') if 'mainstage' in config.APPS_TO_PROCESS else None
+        garageband = loopslib.applications.Application('garageband') if 'garageband' in config.APPS_TO_PROCESS else None
+        logicpro = loopslib.applications.Application('logicpro') if 'logicpro' in config.APPS_TO_PROCESS else None
+        mainstage = loopslib.applications.Application('mainstage') if 'mainstage' in config.APPS_TO_PROCESS else None
 
         apps_as_source = [garageband, logicpro, mainstage]
     elif config.PLISTS_TO_PROCESS:
@@ -118,16 +134,21 @@ def main():
 
     # Processed apps go into single instance of 'ProcessedApplications'.
     if apps_as_source:
-        packages = process_source.ProcessedSource(apps=apps_as_source)
+        packages = loopslib.process_source.ProcessedSource(apps=apps_as_source)
     elif plists_as_source:
-        packages = process_source.ProcessedSource(plists=plists_as_source)
+        packages = loopslib.process_source.ProcessedSource(plists=plists_as_source)
 
     if not config.SILENT:
         print('{}\n'.format(packages.stats_message))
 
     # Process packages
     if packages.all:
+        loopslib.report.REPORT.start(packages)
+
         if config.DEPLOY_PKGS or config.FORCED_DEPLOYMENT:
+            # Disk
+            disk = loopslib.diskusage.DiskStats()
+
             if not disk.has_space(space_requested=packages.total_size_req):
                 _msg = ('Insufficient space to download and install packages. Free up more space to continue. '
                         'Download and install size is {}.'.format(packages.total_size_req_hr))
@@ -146,15 +167,10 @@ def main():
                 print(_msg)
                 sys.exit(1)
 
-        package = deployment.LoopDeployment()
+        package = loopslib.deployment.LoopDeployment(jobs=config.DOWNLOAD_JOBS)
 
         # Do the stuff.
-        _l = len(packages.all)
-        for pkg in packages.all:
-            _i = packages.all.index(pkg) + 1
-            _i = '{i:0{width}d}'.format(width=len(str(_l)), i=_i)
-            _ctr_msg = '{} of {}'.format(_i, _l)
-            package.process(pkg, counter_msg=_ctr_msg)
+        package.process_all(packages.all)
 
         # Tidy up any temp items, only if this is not a download!
         if args.deployment or args.force_deployment:
@@ -168,6 +184,13 @@ def main():
     if args.build_dmg:
         sparse.convert_sparseimage(sparseimage=config.DESTINATION_PATH)
 
+    loopslib.curl_requests.HEADER_CACHE.log_stats()
+    loopslib.timing.TIMINGS.log_summary()
+    loopslib.report.REPORT.close()
+
+    if config.TIMING_REPORT:
+        loopslib.timing.TIMINGS.write_report()
+
     # The last thing logged.
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     logging.info('------------------ Log closed on {} ------------------'.format(now))
@@ -4,18 +4,60 @@ import sys; sys.dont_write_bytecode = True  # NOQA
 import logging
 # pylint: enable=multiple-statements
 
-from . import applications
-from . import arguments
-from . import compare
-from . import config
-from . import curl_requests
-from . import deployment
-from . import diskusage
-from . import dmg
-from . import misc
-from . import package
-from . import plist
-from . import supported
-from . import version
+# Modules are imported the first time they're used, as 'loopslib.<module>', so
+# startup only pays for the modules a run actually needs.
+MODULES = ['applications',
+           'arguments',
+           'arguments_config',
+           'bad_wolf',
+           'compare',
+           'config',
+           'curl_errors',
+           'curl_requests',
+           'deployment',
+           'diskusage',
+           'dmg',
+           'feed',
+           'http_client',
+           'installer',
+           'interrogate',
+           'journal',
+           'misc',
+           'option_packs',
+           'package',
+           'package_store',
+           'plist',
+           'process_source',
+           'remote_plist',
+           'report',
+           'sources',
+           'supported',
+           'timing',
+           'verify',
+           'version']
 
 logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+
+def __getattr__(name):
+    """Imports a module in 'MODULES' the first time it's used."""
+    result = None
+
+    if name in MODULES:
+        # Not 'importlib.import_module', imports through it don't show in 'python -X importtime'.
+        _module = '{}.{}'.format(__name__, name)
+        __import__(_module)
+        result = sys.modules[_module]
+    else:
+        raise AttributeError('module {} has no attribute {}'.format(__name__, name))
+
+    return result
+
+
+def __dir__():
+    """Lists the lazily imported modules along with the module attributes."""
+    result = None
+
+    result = sorted(set(globals()).union(MODULES))
+
+    return result
@@ -10,19 +10,15 @@ from glob import glob
 
 # pylint: disable=relative-import
 try:
-    import bad_wolf
     import config
-    import curl_requests
-    import option_packs
-    import package
+    import feed
+    import http_client
     import plist
     import supported
 except ImportError:
-    from . import bad_wolf
     from . import config
-    from . import curl_requests
-    from . import option_packs
-    from . import package
+    from . import feed
+    from . import http_client
     from . import plist
     from . import supported
 # pylint: enable=relative-import
@@ -48,6 +44,9 @@ class Application(object):
         # Empty attr for option packs.
         self.option_packs = None
 
+        # Parsed feed file, only parsed when packages are needed.
+        self._feed = None
+
         if self.is_installed:
             self._resource_file_path = os.path.join(self._file_path, config.RESOURCES_PATH)
             self._app_info = self._get_app_info()
@@ -141,7 +140,7 @@ class Application(object):
                         _url = '{}/{}/{}'.format(config.AUDIOCONTENT_URL, config.LP10_MS3_CONTENT, _file)
                         _failover_url = '{}/{}/{}'.format(config.AUDIOCONTENT_FAILOVER_URL, config.LP10_MS3_CONTENT, _file)
                         _tmp_file = os.path.join(_tmp_dir, _file)
-                        _req = curl_requests.CURL(url=_url)
+                        _req = http_client.new_request(url=_url)
 
                         # NOTE 2019-11-04: Seems that using the 'resume' capability in cURL does not
                         # work here now for some reason, so don't resume.
@@ -170,47 +169,23 @@ class Application(object):
 
         return result
 
+    @property
+    def feed(self):
+        """Returns the parsed feed file for the app. The feed is only parsed the first
+        time it is needed, and is shared with any other source using the same file."""
+        if self._feed is None and self.plist_file_path:
+            self._feed = feed.load(self.plist_file_path)
+            self.option_packs = self._feed.option_packs
+
+        return self._feed
+
     def _get_packages(self):
         """Returns a set of all packages (as object instances). Also patches any 'issues'
         that resolve known issues with Apple's audiocontentdownload mirrored files."""
         result = None
 
-        if self.plist_file_path:
-            _basename = os.path.basename(self.plist_file_path)
-
-            _bad_wolf_fixes = bad_wolf.BAD_WOLF_PKGS.get(_basename, None)
-            _bwd = None
-
-            _root = plist.readPlist(self.plist_file_path)
-
-            if _root:
-                result = set()
-
-                # Apply 'Bad Wolf' pathches
-                for _pkg in _root['Packages']:
-                    _new_pkg = _root['Packages'][_pkg].copy()  # Work on copy
-
-                    # Create a new key called 'PackageName' that
-                    # contains the value '_pkg' for use with content packs.
-                    _new_pkg['PackageName'] = _pkg
-
-                    if _bad_wolf_fixes:
-                        _bwd = _bad_wolf_fixes.get(_pkg, None)  # A dictionary from '_bad_wolf_fixes'
-
-                    # Merge new/existing keys from matching '_bwd'
-                    if _bwd:
-                        _new_pkg.update(_bwd)
-
-                    _pkg_obj = package.LoopPackage(**_new_pkg)
-
-                    # pylint: disable=no-member
-                    # Only add/process packages that are _not_ 'BadWolfIgnore = True'
-                    if not _pkg_obj.BadWolfIgnore:
-                        result.add(_pkg_obj)
-                    # pylint: enable=no-member
-
-                # Now process option packs
-                self.option_packs = option_packs.OptionPack(source=_root, release=_basename).option_packs
+        if self.feed:
+            result = self.feed.packages
 
         return result
 
@@ -219,7 +194,7 @@ class Application(object):
         """Returns the mandatory packages as objects in a set."""
         result = None
 
-        result = set([_pkg for _pkg in self._get_packages() if _pkg.IsMandatory])
+        result = set(self.feed.mandatory_pkgs)
 
         return result
 
@@ -228,7 +203,7 @@ class Application(object):
         """Returns the optional packages as objects in a set."""
         result = None
 
-        result = set([_pkg for _pkg in self._get_packages() if not _pkg.IsMandatory])
+        result = set(self.feed.optional_pkgs)
 
         return result
 # pylint: enable=too-many-instance-attributes
@@ -15,13 +15,11 @@ from operator import attrgetter
 # pylint: disable=relative-import
 try:
     import arguments_config
-    import compare
     import config
     import misc
     import supported
 except ImportError:
     from . import arguments_config
-    from . import compare
     from . import config
     from . import misc
     from . import supported
@@ -264,6 +262,55 @@ class LoopsArguments(object):
                 LOG.info(_msg)
                 sys.exit(1)
 
+        if result.jobs < 1:
+            _arg = '-j/--jobs'
+            _msg = '{} {}: must be at least 1'.format(_err_msg, _arg)
+            print(_msg)
+            LOG.info(_msg)
+            sys.exit(1)
+
+        if result.lookahead is not None and result.lookahead < 1:
+            _arg = '--lookahead'
+            _msg = '{} {}: must be at least 1'.format(_err_msg, _arg)
+            print(_msg)
+            LOG.info(_msg)
+            sys.exit(1)
+
+        if result.batch_install < 1:
+            _arg = '--batch-install'
+            _msg = '{} {}: must be at least 1'.format(_err_msg, _arg)
+            print(_msg)
+            LOG.info(_msg)
+            sys.exit(1)
+
+        if result.installer_timeout is not None and result.installer_timeout < 1:
+            _arg = '--installer-timeout'
+            _msg = '{} {}: must be at least 1'.format(_err_msg, _arg)
+            print(_msg)
+            LOG.info(_msg)
+            sys.exit(1)
+
+        if result.segments < 1:
+            _arg = '--segments'
+            _msg = '{} {}: must be at least 1'.format(_err_msg, _arg)
+            print(_msg)
+            LOG.info(_msg)
+            sys.exit(1)
+
+        if result.segment_threshold is not None and result.segment_threshold < 1:
+            _arg = '--segment-threshold'
+            _msg = '{} {}: must be at least 1'.format(_err_msg, _arg)
+            print(_msg)
+            LOG.info(_msg)
+            sys.exit(1)
+
+        if result.pkg_store_size is not None and result.pkg_store_size < 1:
+            _arg = '--pkg-store-size'
+            _msg = '{} {}: must be at least 1'.format(_err_msg, _arg)
+            print(_msg)
+            LOG.info(_msg)
+            sys.exit(1)
+
         if result.cache_server:
             _arg = '--cache-server'
             _cs = result.cache_server[0]
@@ -304,8 +351,48 @@ class LoopsArguments(object):
             supported.show_supported_plists()
 
         if result.compare:
+            # Imported here as comparing is the only thing that needs the HTTP client
+            # while parsing arguments.
+            # pylint: disable=relative-import
+            try:
+                import compare
+            except ImportError:
+                from . import compare
+            # pylint: enable=relative-import
+
             compare.differences(file_a=result.compare[0], file_b=result.compare[1])
 
+        if result.verify or result.create_manifest:
+            _arg = '--verify' if result.verify else '--create-manifest'
+            _folder = result.verify[0] if result.verify else result.create_manifest[0]
+
+            if not result.manifest:
+                _msg = '{} {}: not allowed without argument --manifest'.format(_err_msg, _arg)
+                print(_msg)
+                LOG.info(_msg)
+                sys.exit(1)
+
+            if not os.path.isdir(_folder):
+                _msg = '{} {}: the specified folder {} does not exist.'.format(_err_msg, _arg, _folder)
+                print(_msg)
+                LOG.info(_msg)
+                sys.exit(1)
+
+            # Imported here as only checking packages needs it while parsing arguments.
+            # pylint: disable=relative-import
+            try:
+                import verify
+            except ImportError:
+                from . import verify
+            # pylint: enable=relative-import
+
+            config.SILENT = result.silent
+
+            if result.verify:
+                verify.verify_folder(folder=_folder, manifest=verify.Manifest(manifest_path=result.manifest[0]))
+            else:
+                verify.create_manifest(folder=_folder, manifest=verify.Manifest(manifest_path=result.manifest[0]))
+
         # Set "globals" here rather than in '__main__.py'
         if not result.plists:
             config.APPS_TO_PROCESS = result.apps if result.apps else misc.find_installed_apps()
@@ -320,22 +407,36 @@ class LoopsArguments(object):
         config.ALLOW_INSECURE_CURL = result.insecure
         config.ALLOW_UNSECURE_PKGS = result.unsecure
         config.APFS_DMG = result.apfs_dmg
+        config.BATCH_INSTALL = result.batch_install
         config.CACHING_SERVER = result.cache_server[0].rstrip('/') if result.cache_server else None
         config.DEBUG = getattr(logging, result.log_level, None)
         config.DEPLOY_PKGS = result.deployment
         config.FORCED_DEPLOYMENT = result.force_deployment
         config.DMG_DEPLOY_FILE = config.DMG_DEPLOY_FILE if config.DMG_DEPLOY_FILE else None
         config.DMG_FILE = result.build_dmg[0] if result.build_dmg else None
+        config.DOWNLOAD_JOBS = result.jobs
+        config.HTTP_BACKEND = result.http_backend
+        config.DOWNLOAD_LOOKAHEAD = result.lookahead if result.lookahead else config.DOWNLOAD_LOOKAHEAD
+        config.DOWNLOAD_SEGMENTS = result.segments
+        config.SEGMENT_THRESHOLD = result.segment_threshold if result.segment_threshold else config.SEGMENT_THRESHOLD
+        config.PARSE_PROCESSES = result.parse_processes
         config.DRY_RUN = result.dry_run
         config.CURL_HTTP1 = False if result.http2 else True
         config.LOCAL_HTTP_SERVER = result.pkg_server[0].rstrip('/') if result.pkg_server else None
+        config.JOURNAL = os.path.abspath(result.journal or config.JOURNAL_FILE) if result.journal is not None else None
+        config.PKG_STORE = result.pkg_store[0] if result.pkg_store else None
+        config.PKG_STORE_SIZE = result.pkg_store_size if result.pkg_store_size else config.PKG_STORE_SIZE
+        config.MANIFEST = result.manifest[0] if result.manifest else None
         config.MANDATORY = result.mandatory
         config.OPTIONAL = result.optional
         config.QUIET = result.quiet
         config.SILENT = result.silent
         config.INST_SLEEP = str(result.sleep) if result.sleep else None
+        config.INSTALLER_TIMEOUT = result.installer_timeout if result.installer_timeout else config.INSTALLER_TIMEOUT
         config.CURL_RETRIES = result.retries
         config.TARGET = result.install_target[0] if result.install_target else config.TARGET
+        config.REPORT = os.path.abspath(result.report[0]) if result.report else None
+        config.TIMING_REPORT = os.path.abspath(result.timing_report[0]) if result.timing_report else None
 
         # Handle result.download/result.force_download
         if result.download or result.force_download:
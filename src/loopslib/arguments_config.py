@@ -22,6 +22,14 @@ CL_ARGUMENTS = {
                         'metavar': '<app>',
                         'help': 'specify the application to process loops for',
                         'required': False}},
+    'batch_install': {'args': ['--batch-install'],
+                      'kwargs': {'type': int,
+                                 'dest': 'batch_install',
+                                 'metavar': '<packages>',
+                                 'default': 1,
+                                 'help': ('specify the number of packages to install with each installer call when '
+                                          'deploying, 1 installs each package separately - default is 1'),
+                                 'required': False}},
     'cache_server': {'args': ['-c', '--cache-server'],
                      'kwargs': {'type': str,
                                 'nargs': 1,
@@ -37,13 +45,28 @@ CL_ARGUMENTS = {
     'http2': {'args': ['--http2'],
               'kwargs': {'action': 'store_true',
                          'dest': 'http2',
-                         'help': 'forces cURL to use http2',
+                         'help': 'forces cURL to use http2 (uses the curl HTTP backend)',
                          'required': False}},
+    'http_backend': {'args': ['--http-backend'],
+                     'kwargs': {'type': str,
+                                'dest': 'http_backend',
+                                'metavar': '<backend>',
+                                'choices': ['native', 'curl'],
+                                'default': 'native',
+                                'help': 'specify the HTTP backend to use, native (default) or curl',
+                                'required': False}},
     'insecure': {'args': ['-i', '--allow-insecure'],
                  'kwargs': {'action': 'store_true',
                             'dest': 'insecure',
                             'help': 'ignore invalid certificates when downloading',
                             'required': False}},
+    'installer_timeout': {'args': ['--installer-timeout'],
+                          'kwargs': {'type': int,
+                                     'dest': 'installer_timeout',
+                                     'metavar': '<seconds>',
+                                     'help': ('specify the seconds an install can go without progress in the install '
+                                              'log before it is killed and tried again - default is 900'),
+                                     'required': False}},
     'install_target': {'args': ['--target'],
                        'kwargs': {'type': str,
                                   'nargs': 1,
@@ -51,6 +74,22 @@ CL_ARGUMENTS = {
                                   'metavar': '<target>',
                                   'help': 'installs packages to the specified target',
                                   'required': False}},
+    'jobs': {'args': ['-j', '--jobs'],
+             'kwargs': {'type': int,
+                        'dest': 'jobs',
+                        'metavar': '<jobs>',
+                        'default': 1,
+                        'help': 'specify the number of packages to download concurrently - default is 1',
+                        'required': False}},
+    'journal': {'args': ['--journal'],
+                'kwargs': {'type': str,
+                           'nargs': '?',
+                           'const': '',
+                           'dest': 'journal',
+                           'metavar': '<path>',
+                           'help': ('record progress in a journal file so an interrupted run resumes where it '
+                                    'stopped - default is appleloops-journal.jsonl in the working directory'),
+                           'required': False}},
     'log': {'args': ['-l', '--log-level'],
             'kwargs': {'type': str,
                        'dest': 'log_level',
@@ -59,16 +98,36 @@ CL_ARGUMENTS = {
                        'choices': ['DEBUG', 'INFO'],
                        'default': 'INFO',
                        'required': False}},
+    'lookahead': {'args': ['--lookahead'],
+                  'kwargs': {'type': int,
+                             'dest': 'lookahead',
+                             'metavar': '<bytes>',
+                             'help': ('specify the maximum bytes of packages to download ahead of installing '
+                                      'when deploying - default is 2147483648'),
+                             'required': False}},
     'mandatory': {'args': ['-m', '--mandatory'],
                   'kwargs': {'action': 'store_true',
                              'dest': 'mandatory',
                              'help': 'processes the mandatory packages',
                              'required': False}},
+    'manifest': {'args': ['--manifest'],
+                 'kwargs': {'type': str,
+                            'nargs': 1,
+                            'dest': 'manifest',
+                            'metavar': '<path>',
+                            'help': ('specify a manifest of package hashes to check downloads against, or to '
+                                     'create with --create-manifest'),
+                            'required': False}},
     'optional': {'args': ['-o', '--optional'],
                  'kwargs': {'action': 'store_true',
                             'dest': 'optional',
                             'help': 'processes the optional packages',
                             'required': False}},
+    'parse_processes': {'args': ['--parse-processes'],
+                        'kwargs': {'action': 'store_true',
+                                   'dest': 'parse_processes',
+                                   'help': 'parse property lists in separate processes, faster when processing several apps',
+                                   'required': False}},
     'pkg_server': {'args': ['--pkg-server'],
                    'kwargs': {'type': str,
                               'nargs': 1,
@@ -76,6 +135,29 @@ CL_ARGUMENTS = {
                               'metavar': 'https://example.org/packages_path/',
                               'help': 'specify a local http/https mirror, or hosted dmg file',
                               'required': False}},
+    'pkg_store': {'args': ['--pkg-store'],
+                  'kwargs': {'type': str,
+                             'nargs': 1,
+                             'dest': 'pkg_store',
+                             'metavar': '<path>',
+                             'help': ('specify a folder to keep downloaded packages in, packages already in it '
+                                      'are linked to the destination instead of downloaded'),
+                             'required': False}},
+    'pkg_store_size': {'args': ['--pkg-store-size'],
+                       'kwargs': {'type': int,
+                                  'dest': 'pkg_store_size',
+                                  'metavar': '<bytes>',
+                                  'help': ('specify the maximum bytes of packages to keep in the package store '
+                                           '- default is 53687091200'),
+                                  'required': False}},
+    'report': {'args': ['--report'],
+               'kwargs': {'type': str,
+                          'nargs': 1,
+                          'dest': 'report',
+                          'metavar': '<path>',
+                          'help': ('write a report of each package processed to the specified file, as JSON lines '
+                                   'written as the run goes'),
+                          'required': False}},
     'retries': {'args': ['-r', '--retries'],
                 'kwargs': {'type': str,
                            'dest': 'retries',
@@ -83,12 +165,35 @@ CL_ARGUMENTS = {
                            'default': '5',
                            'help': 'specify the maximum number of times to retry downloading files - default is 5',
                            'required': False}},
+    'segment_threshold': {'args': ['--segment-threshold'],
+                          'kwargs': {'type': int,
+                                     'dest': 'segment_threshold',
+                                     'metavar': '<bytes>',
+                                     'help': ('specify the size a package must be to be downloaded in segments '
+                                              '- default is 268435456'),
+                                     'required': False}},
+    'segments': {'args': ['--segments'],
+                 'kwargs': {'type': int,
+                            'dest': 'segments',
+                            'metavar': '<segments>',
+                            'default': 4,
+                            'help': ('specify the number of concurrent range requests to download large packages '
+                                     'in, 1 turns this off - default is 4'),
+                            'required': False}},
     'sleep': {'args': ['--sleep'],
               'kwargs': {'type': str,
                          'dest': 'sleep',
                          'metavar': '<sleep>',
-                         'help': 'specify the number of seconds to pause between installation and download',
+                         'help': ('specify the most seconds to wait after each install for the install log to go '
+                                  'quiet'),
                          'required': False}},
+    'timing_report': {'args': ['--timing-report'],
+                      'kwargs': {'type': str,
+                                 'nargs': 1,
+                                 'dest': 'timing_report',
+                                 'metavar': '<path>',
+                                 'help': 'write the timings of each phase of the run to the specified JSON file',
+                                 'required': False}},
     'untrusted': {'args': ['-u', '--allow-untrusted'],
                   'kwargs': {'action': 'store_true',
                              'dest': 'unsecure',
@@ -146,6 +251,20 @@ CL_EXCL_GRP_ARGS_02 = {
                              'metavar': '<filename>',
                              'help': 'builds a DMG containing downloaded packages',
                              'required': False}},
+    'create_manifest': {'args': ['--create-manifest'],
+                        'kwargs': {'type': str,
+                                   'nargs': 1,
+                                   'dest': 'create_manifest',
+                                   'metavar': '<folder>',
+                                   'help': 'creates the --manifest file from the packages in a known good folder',
+                                   'required': False}},
+    'verify': {'args': ['--verify'],
+               'kwargs': {'type': str,
+                          'nargs': 1,
+                          'dest': 'verify',
+                          'metavar': '<folder>',
+                          'help': 'checks the packages in a folder against the --manifest file',
+                          'required': False}},
     'compare': {'args': ['--compare'],
                 'kwargs': {'type': str,
                            'nargs': 2,
@@ -7,12 +7,12 @@ import tempfile
 # pylint: disable=relative-import
 try:
     import config
-    import curl_requests
+    import http_client
     import misc
     import plist
 except ImportError:
     from . import config
-    from . import curl_requests
+    from . import http_client
     from . import misc
     from . import plist
 # pylint: enable=relative-import
@@ -59,7 +59,7 @@ def differences(file_a, file_b, detailed_info=False):
         _fa_url = misc.plist_url_path(base_a)
         file_a = os.path.join(_tmp_dir, base_a)
 
-        _req = curl_requests.CURL(url=_fa_url)
+        _req = http_client.new_request(url=_fa_url)
 
         if _req.status in config.HTTP_OK_STATUS:
             _req.get(url=_fa_url, output=file_a)
@@ -76,7 +76,7 @@ def differences(file_a, file_b, detailed_info=False):
         _fb_url = misc.plist_url_path(base_b)
         file_b = os.path.join(_tmp_dir, base_b)
 
-        _req = curl_requests.CURL(url=_fb_url)
+        _req = http_client.new_request(url=_fb_url)
 
         if _req.status in config.HTTP_OK_STATUS:
             _req.get(url=_fb_url, output=file_b)
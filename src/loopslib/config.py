@@ -1,8 +1,9 @@
 """Contains all the core configuration variables.
 These must not be modified or behaviour could break."""
 import logging
+import sys
+import tempfile
 
-from distutils.version import StrictVersion
 from os import path
 
 # pylint: disable=relative-import
@@ -46,6 +47,9 @@ AUDIOCONTENT_FAILOVER_URL = 'https://raw.githubusercontent.com/carlashley/applel
 # "Bundle ID"
 BUNDLE_ID = 'com.github.carlashley.appleloops'
 
+# Cache folder for data kept between runs.
+CACHE_PATH = path.join(tempfile.gettempdir(), BUNDLE_ID, 'cache')
+
 # When set via command line, should be in the form of 'https://example.org:12345'
 CACHING_SERVER = None
 
@@ -53,6 +57,12 @@ CACHING_SERVER = None
 # Do not override.
 CONTENTS_PATH = 'Contents'
 
+# HTTP backend to use for requests, 'native' (in process) or 'curl'.
+HTTP_BACKEND = 'native'
+
+# Seconds to wait on a stalled connection when using the 'native' HTTP backend.
+HTTP_TIMEOUT = 60
+
 # CURL args/opts
 CURL_HTTP1 = True
 CURL_HTTP_ARG = '--http1.1'
@@ -65,6 +75,32 @@ DEBUG = False
 DEPLOY_PKGS = False
 FORCED_DEPLOYMENT = False
 
+# Number of packages to download concurrently. Passed in from args.
+DOWNLOAD_JOBS = 1
+
+# Number of sources (apps or property lists) loaded concurrently when analysing.
+ANALYSIS_JOBS = 3
+
+# Parse feed files in worker processes, so several feeds are parsed at the same time.
+# Passed in from args.
+PARSE_PROCESSES = False
+
+# Number of concurrent range requests each large package is downloaded in, and the size
+# a package must be to be downloaded in segments. Default is 4 segments for packages of
+# 256MB or more. Passed in from args.
+DOWNLOAD_SEGMENTS = 4
+SEGMENT_THRESHOLD = 268435456
+
+# Maximum bytes of packages downloaded ahead of the installer when deploying.
+# Default is 2GB. Passed in from args.
+DOWNLOAD_LOOKAHEAD = 2147483648
+
+# Weight given to each new sample in the moving averages of how quick each download source
+# (mirror, caching server, Apple) is, and the number of packages after which an unused
+# source is probed again in case it has recovered.
+SOURCE_EWMA_ALPHA = 0.3
+SOURCE_PROBE_INTERVAL = 20
+
 # Destination path (a default value is provided)
 # NOTE: '/tmp' is used because in some circumstances, the
 # destination needs to be human friendly, and the
@@ -88,6 +124,13 @@ DRY_RUN_VOLUME_MOUNTPATH = '/Volumes/{}'.format(DMG_VOLUME_NAME)
 # Dry Run
 DRY_RUN = False
 
+# Seconds the headers for a URL are reused for before requesting them again.
+HEADER_CACHE_TTL = 300
+
+# Seconds a failed HEAD request (no headers, or a cURL error) is reused for, so a source
+# that was briefly unreachable is asked again soon.
+HEADER_FAILURE_TTL = 10
+
 # HTTP Status's that are OK
 HTTP_OK_STATUS = [200, 301, 302, 303, 307, 308]
 
@@ -95,18 +138,21 @@ HTTP_OK_STATUS = [200, 301, 302, 303, 307, 308]
 # Best practice is to use the relevant argument to mirror the folder paths from Apple.
 LOCAL_HTTP_SERVER = None
 
+# Run journal file, used to resume an interrupted run. Passed in from args.
+# 'JOURNAL_FILE' (in the working directory) is used if no file is given.
+JOURNAL = None
+JOURNAL_FILE = 'appleloops-journal.jsonl'
+
 # Log level
 LOGGER_NAME = 'appleloops'
 LOG_FILE = 'appleloops.log'
 LOG_LEVEL = 'INFO'
 
-# If the user is root, change the log path so not to blat on user log folder.
-if misc.is_root():
-    LOG_PATH = '/var/log'
-else:
-    LOG_PATH = path.expanduser(path.expandvars('~/Library/Logs'))
+# Log records waiting to be written before debug and info records are dropped.
+LOG_QUEUE_SIZE = 10000
 
-LOG_FILE_PATH = path.join(LOG_PATH, LOG_FILE)
+# 'LOG_PATH' and 'LOG_FILE_PATH' are worked out the first time they're used, see '__getattr__'.
+# If the user is root, the log path changes so not to blat on user log folder.
 
 # Default 'path' is '2016'. Use '.replace()' when '2013' is required.
 LP10_MS3_CONTENT = 'lp10_ms3_content_2016'
@@ -120,6 +166,21 @@ NAME = None
 # Used to determine if processing optional packages
 OPTIONAL = False
 
+# Cache parsed property lists between runs, for files of at least
+# 'PLIST_CACHE_MIN_SIZE' bytes (the feed files, not receipts or Info.plist files).
+PLIST_CACHE = True
+PLIST_CACHE_MIN_SIZE = 65536
+
+# Shared package store folder that downloaded packages are linked from. Passed in from args.
+PKG_STORE = None
+
+# Maximum bytes of packages kept in the package store, the least recently used packages
+# are removed past this. Default is 50GB. Passed in from args.
+PKG_STORE_SIZE = 53687091200
+
+# Manifest of known good package hashes that downloads are checked against. Passed in from args.
+MANIFEST = None
+
 # Property Lists to use for processing if provided.
 PLISTS_TO_PROCESS = None
 
@@ -132,6 +193,9 @@ PROXY = None
 # Minimal output.
 QUIET = False
 
+# Folder containing the installed package receipts.
+RECEIPTS_PATH = '/var/db/receipts'
+
 # Checks for the 'Content-Length' header for each package.
 # This adds time and doesn't achieve much. Leave this as 'False'.
 REAL_DOWNLOAD_SIZE = False
@@ -143,18 +207,39 @@ RESOURCES_PATH = path.join(CONTENTS_PATH, 'Resources')
 # No output.
 SILENT = False
 
-# Sleep for five seconds between installs.
+# Path to write the run report to, as JSON lines of each package processed. Passed in from args.
+REPORT = None
+
+# Path to write the timings of each phase of the run to as JSON. Passed in from args.
+TIMING_REPORT = None
+
+# Most seconds to wait after each install for the install log to go quiet before the next
+# install. Passed in from args. Installs are only waited on if this is set.
 INST_SLEEP = None
 
+# Seconds the install log must be quiet for before an install has settled.
+INST_SETTLE_QUIET = 1.0
+
+# Log written by 'installer', followed while installing to tell when an install has settled
+# or hung.
+INSTALL_LOG = '/var/log/install.log'
+
+# Seconds an 'installer' call can go without the install log changing (or run for, if the
+# install log can't be read) before it's killed and tried again once. Passed in from args.
+INSTALLER_TIMEOUT = 900
+
+# Installer binary, and the number of packages installed with each call of it when deploying.
+# Packages are installed one at a time by default. Passed in from args.
+INSTALLER_PATH = '/usr/sbin/installer'
+BATCH_INSTALL = 1
+
 # All supported plists
 SUPPORTED_PLISTS = supported.SUPPORTED.copy()
 
-# Capture OS Version
-OS_VER = StrictVersion(version.os_vers())
-OS_BUILD = version.os_vers(arg='buildVersion')
-
-# Post Catalina, the disk containers and volumes change a bit
-CATALINA = OS_VER > StrictVersion('10.14.9')
+# OS Version facts, only captured the first time they're used, see '__getattr__'.
+# 'OS_VER' and 'OS_BUILD' come from 'PLATFORM', post Catalina ('CATALINA'),
+# the disk containers and volumes change a bit.
+PLATFORM = version.PlatformFacts(cache_path=path.join(CACHE_PATH, 'platform.json'))
 
 # Target (this is for the 'installer' command.)
 # Using a different target for Catalina doesn't appear necessary.
@@ -179,3 +264,33 @@ ALL_LATEST_PLISTS = [path.basename(GB_LATEST_PLIST).replace('.plist', ''),
                      path.basename(MS_LATEST_PLIST).replace('.plist', '')]
 
 ALL_LATEST_APPS = [_key for _key, _val in APPS.items()]
+
+
+def __getattr__(name):
+    """Works out values that need a subprocess or system call the first time they're used,
+    instead of when this module is imported."""
+    # Imported here as 'distutils' is slow to import and most runs never need it.
+    from distutils.version import StrictVersion  # pylint: disable=import-outside-toplevel
+
+    result = None
+    _module = sys.modules[__name__]
+
+    if name == 'OS_VER':
+        result = StrictVersion(PLATFORM.os_version)
+    elif name == 'OS_BUILD':
+        result = PLATFORM.os_build
+    elif name == 'CATALINA':
+        result = _module.OS_VER > StrictVersion('10.14.9')
+    elif name == 'LOG_PATH':
+        if misc.is_root():
+            result = '/var/log'
+        else:
+            result = path.expanduser(path.expandvars('~/Library/Logs'))
+    elif name == 'LOG_FILE_PATH':
+        result = path.join(_module.LOG_PATH, LOG_FILE)
+    else:
+        raise AttributeError('module {} has no attribute {}'.format(__name__, name))
+
+    globals()[name] = result
+
+    return result
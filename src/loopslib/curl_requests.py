@@ -4,20 +4,217 @@ import os
 import subprocess
 import sys
 
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+from time import sleep, time
+
 
 # pylint: disable=relative-import
 try:
     import config
     import curl_errors
     import misc
+    import timing
 except ImportError:
     from . import config
     from . import curl_errors
     from . import misc
+    from . import timing
 # pylint: enable=relative-import
 
 LOG = logging.getLogger(__name__)
 
+# Size of each block tracked when a file is downloaded in segments.
+SEGMENT_BLOCK_SIZE = 8388608
+
+# Size of each read from a segment.
+SEGMENT_CHUNK_SIZE = 1048576
+
+# cURL errors for hosts that can't be resolved or connected to, which 'curl --retry' doesn't retry.
+NO_RETRY_ERRORS = [6, 7]
+
+
+class SegmentError(IOError):
+    """Exception raised when a server returns less or more of a range than was requested."""
+    pass
+
+
+class HeaderCache(object):
+    """Headers and any cURL error for each URL requested in this run, so each URL
+    only needs one HEAD request."""
+    def __init__(self):
+        self._entries = dict()
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    # pylint: disable=no-self-use
+    def _fresh(self, entry):
+        """Returns 'True' if the entry is younger than 'config.HEADER_CACHE_TTL', or for a
+        failed request, 'config.HEADER_FAILURE_TTL'."""
+        result = False
+
+        if entry:
+            _failed = entry[1] is None or bool(entry[2])
+            _ttl = config.HEADER_FAILURE_TTL if _failed else config.HEADER_CACHE_TTL
+            result = time() - entry[0] < _ttl
+
+        return result
+    # pylint: enable=no-self-use
+
+    def get(self, url):
+        """Returns a tuple of the cached headers and cURL error for the URL, or None if
+        the URL is not cached or the entry has expired."""
+        result = None
+
+        with self._lock:
+            _entry = self._entries.get(url)
+
+            if self._fresh(_entry):
+                result = _entry[1:]
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return result
+
+    def __contains__(self, url):
+        """Returns 'True' if the URL has an unexpired entry, without counting a hit or miss."""
+        result = None
+
+        with self._lock:
+            _entry = self._entries.get(url)
+
+        result = self._fresh(_entry)
+
+        return result
+
+    def put(self, url, headers, curl_error):
+        """Caches the headers and cURL error for the URL."""
+        with self._lock:
+            self._entries[url] = (time(), headers, curl_error)
+
+    def clear(self):
+        """Empties the cache."""
+        with self._lock:
+            self._entries = dict()
+
+    def log_stats(self):
+        """Logs the cache hit/miss counters."""
+        LOG.debug('Header cache: %s hits, %s misses', self.hits, self.misses)
+
+
+HEADER_CACHE = HeaderCache()
+
+
+class SegmentMap(object):
+    """Tracks which blocks of a file downloaded in segments are complete, in a sidecar file
+    next to it ('<file>.segments'). The sidecar is a fixed size header of the file and block
+    sizes, then a byte per block that is set as each block is written, so a restarted
+    download only fetches the blocks that are missing. The sidecar is removed when the
+    download completes, so while it exists the file is incomplete."""
+    SUFFIX = '.segments'
+    HEADER_SIZE = 64
+
+    def __init__(self, output, size, block_size=SEGMENT_BLOCK_SIZE):
+        self._output = output
+        self._size = size
+        self._block_size = block_size
+        self._blocks = (size + block_size - 1) // block_size
+        self._header = '{} {}\n'.format(size, block_size).encode('ascii').ljust(self.HEADER_SIZE)
+        self._fd = None
+
+        self.done = None
+
+    @classmethod
+    def sidecar(cls, output):
+        """Returns the sidecar path for a file."""
+        result = None
+
+        result = '{}{}'.format(output, cls.SUFFIX)
+
+        return result
+
+    def open(self):
+        """Opens the sidecar, creating it and preallocating the file if this is a new download.
+        Blocks of a partial file left by a single stream download are kept."""
+        _sidecar = self.sidecar(self._output)
+        _existing = None
+        _dir = os.path.dirname(self._output)
+
+        if _dir and not os.path.exists(_dir):
+            os.makedirs(_dir, exist_ok=True)
+
+        if os.path.exists(_sidecar):
+            with open(_sidecar, 'rb') as _f:
+                _existing = _f.read()
+
+        if _existing and _existing[:self.HEADER_SIZE] == self._header:
+            self.done = bytearray(_existing[self.HEADER_SIZE:].ljust(self._blocks, b'\x00'))
+        else:
+            _partial = os.path.getsize(self._output) if os.path.exists(self._output) and not _existing else 0
+            self.done = bytearray(1 if (_i + 1) * self._block_size <= _partial else 0 for _i in range(self._blocks))
+
+            with open(_sidecar, 'wb') as _f:
+                _f.write(self._header + bytes(self.done))
+
+        _fd = os.open(self._output, os.O_WRONLY | os.O_CREAT)
+
+        try:
+            os.ftruncate(_fd, self._size)
+        finally:
+            os.close(_fd)
+
+        self._fd = os.open(_sidecar, os.O_WRONLY)
+
+    def close(self, complete=False):
+        """Closes the sidecar, removing it if the download is complete."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+        if complete:
+            misc.clean_up(file_path=self.sidecar(self._output))
+
+    def block_range(self, block):
+        """Returns the first and last byte of a block."""
+        result = None
+
+        result = (block * self._block_size, min((block + 1) * self._block_size, self._size) - 1)
+
+        return result
+
+    def mark(self, block):
+        """Records a block as written."""
+        self.done[block] = 1
+        os.pwrite(self._fd, b'\x01', self.HEADER_SIZE + block)
+
+    def runs(self, count):
+        """Returns the missing blocks as a list of '(first, last)' block runs, with long runs
+        split so there are about 'count' runs to fetch at once."""
+        result = list()
+
+        _missing = [_i for _i, _done in enumerate(self.done) if not _done]
+        _per_run = max(1, (len(_missing) + count - 1) // count)
+
+        for _block in _missing:
+            if result and result[-1][1] == _block - 1 and result[-1][1] - result[-1][0] + 1 < _per_run:
+                result[-1][1] = _block
+            else:
+                result.append([_block, _block])
+
+        return result
+
+    @property
+    def done_bytes(self):
+        """Returns the number of bytes in completed blocks."""
+        result = None
+
+        result = sum(self.block_range(_i)[1] - self.block_range(_i)[0] + 1 for _i, _done in enumerate(self.done) if _done)
+
+        return result
+
 
 class CURL(object):
     """Class for using CURL."""
@@ -35,6 +232,27 @@ class CURL(object):
             self.status = self._get_status()
 
     def _get_headers(self, obj):
+        """Gets the headers of the provided URL from the header cache, only requesting
+        them if the URL has not been seen within 'config.HEADER_CACHE_TTL' seconds, or
+        'config.HEADER_FAILURE_TTL' seconds if the request failed."""
+        result = None
+
+        _cached = HEADER_CACHE.get(obj)
+
+        if _cached:
+            result, self.curl_error = _cached
+            timing.TIMINGS.count('header cache hits')
+        else:
+            self.curl_error = None
+
+            with timing.TIMINGS.span('head'):
+                result = self._head(obj)
+
+            HEADER_CACHE.put(obj, result, self.curl_error)
+
+        return result
+
+    def _head(self, obj):
         """Gets the headers of the provided URL, and returns the result as a dictionary.
         Does not follow redirects."""
         result = None
@@ -94,7 +312,7 @@ class CURL(object):
                                 value = int(value)
 
                             result[key] = value
-                LOG.debug('{}: {}'.format(' '.join(cmd), result))
+                LOG.debug('%s: %s', ' '.join(cmd), result)
         elif process.returncode in [_key for _key, _value in curl_errors.CURL_ERRORS.items()]:
             _err_msg = curl_errors.CURL_ERRORS.get(process.returncode, None)
 
@@ -102,11 +320,9 @@ class CURL(object):
             self.curl_error = {'cURL_Error': process.returncode,
                                'Error_Msg': _err_msg}
 
-            LOG.debug('{}: {} - {}'.format(' '.join(cmd),
-                                           self.curl_error.get('cURL_Error'),
-                                           self.curl_error.get('Error_Msg')))
+            LOG.debug('%s: %s - %s', ' '.join(cmd), self.curl_error.get('cURL_Error'), self.curl_error.get('Error_Msg'))
         else:
-            LOG.debug('{}: {}'.format(' '.join(cmd), p_error))
+            LOG.debug('%s: %s', ' '.join(cmd), p_error)
             # May need to not print the error out in certain circumstances
             if not config.SILENT:
                 print('Error:\n{}'.format(p_error))
@@ -133,15 +349,8 @@ class CURL(object):
 
         return result
 
-    def get(self, url, output=None, counter_msg=None, resume=True):
-        """Retrieves the specified URL. Saves it to path specified in 'output' if present."""
-        # NOTE: Must ignore 'dry run' state for any '.plist' file downloads.
-        _headers = self._get_headers(obj=url)
-
-        # Check if we're fetching a property list file
-        _fetching_plist = url.endswith('.plist')
-
-        # Now the command.
+    def _transfer(self, url, output, resume, gzipped, silent):
+        """Transfers the specified URL to the 'output' file using cURL."""
         cmd = [self._curl_path,
                '--retry', config.CURL_RETRIES,  # Retry failed downloads n times (default 5), will wait 1sec then on each retry double the wait time.
                '--retry-max-time', '10',  # Max of 10 seconds between each retry
@@ -156,31 +365,226 @@ class CURL(object):
 
         # If there is a content header indicating gzipped content, pass the compressed flag so
         # curl can auto deflate it.
-        _gzipped = _headers.get('Content-Encoding', False) == 'gzip'
-
-        if _gzipped:
+        if gzipped:
             cmd.extend(['--compressed'])
 
-        if config.FORCE_DOWNLOAD and os.path.exists(output):
-            if not config.DRY_RUN:
-                LOG.debug('Forced download - removing: {}'.format(output))
-                misc.clean_up(file_path=output)
-
         if config.PROXY:
             cmd.extend(['--proxy', config.PROXY])
 
         if config.ALLOW_INSECURE_CURL:
             cmd.extend(['--insecure'])
 
-        if not (config.QUIET or config.SILENT or self._silent_override or _fetching_plist):
+        if not silent:
             cmd.extend(['--progress-bar'])
-        elif (config.QUIET or config.SILENT or self._silent_override or _fetching_plist):
+        else:
             cmd.extend(['--silent'])
 
         if output:
             cmd.extend(['--create-dirs', '-o', output])
 
-        LOG.debug('CURL get: {}'.format(' '.join(cmd)))
+        LOG.debug('CURL get: %s', ' '.join(cmd))
+
+        try:
+            subprocess.check_call(cmd)
+        except subprocess.CalledProcessError as _e:
+            LOG.debug('%s: %s', ' '.join(cmd), _e)
+            raise _e
+
+    # pylint: disable=too-many-arguments
+    def _start_transfer(self, url, output, resume, headers, silent):
+        """Transfers the specified URL to the 'output' file, in 'config.DOWNLOAD_SEGMENTS'
+        concurrent segments if it is at least 'config.SEGMENT_THRESHOLD' bytes and the server
+        accepts ranges, otherwise as a single stream."""
+        _headers = {_key.lower(): _value for _key, _value in (headers or dict()).items()}
+        _size = _headers.get('content-length')
+
+        # If there is a content header indicating gzipped content, the transfer
+        # needs to deflate it.
+        _gzipped = _headers.get('content-encoding', False) == 'gzip'
+        _ranges = 'bytes' in _headers.get('accept-ranges', '')
+        _sidecar = SegmentMap.sidecar(output)
+        _segmented = (_size and _ranges and not _gzipped and config.DOWNLOAD_SEGMENTS > 1 and
+                      (_size >= config.SEGMENT_THRESHOLD or os.path.exists(_sidecar)))
+
+        with timing.TIMINGS.span('download') as _span:
+            if _segmented:
+                _span.bytes = self._transfer_segmented(url=url, output=output, size=_size, silent=silent)
+            else:
+                if os.path.exists(_sidecar):
+                    # Can't carry on a segmented download without ranges, so start again.
+                    misc.clean_up(file_path=output)
+                    misc.clean_up(file_path=_sidecar)
+
+                _existing = os.path.getsize(output) if os.path.exists(output) else 0
+                self._transfer(url=url, output=output, resume=resume, gzipped=_gzipped, silent=silent)
+                _span.bytes = (os.path.getsize(output) if os.path.exists(output) else 0) - _existing
+    # pylint: enable=too-many-arguments
+
+    def _transfer_segmented(self, url, output, size, silent):
+        """Transfers the specified URL to the 'output' file as concurrent range requests, each
+        written in place with 'pwrite' to the preallocated file. A failed segment is retried
+        from its first missing block, without affecting the other segments. Returns the number
+        of bytes downloaded."""
+        result = None
+
+        _map = SegmentMap(output, size)
+        _map.open()
+        _runs = _map.runs(config.DOWNLOAD_SEGMENTS)
+        _complete = False
+        result = size - _map.done_bytes
+
+        LOG.debug('GET %s -> %s in %s segments (%s of %s bytes already downloaded)',
+                  url, output, len(_runs), _map.done_bytes, size)
+
+        _fd = os.open(output, os.O_WRONLY)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(_runs))) as _pool:
+                _futures = [_pool.submit(self._fetch_segment, url, _fd, _map, _first, _last)
+                            for _first, _last in _runs]
+
+                while not silent and wait(_futures, timeout=0.5).not_done:
+                    self._progress(_map.done_bytes, size)
+
+                for _future in _futures:
+                    _future.result()
+
+            if not silent:
+                self._progress(size, size, end=True)
+
+            _complete = True
+        finally:
+            os.close(_fd)
+            _map.close(complete=_complete)
+
+        return result
+
+    # pylint: disable=broad-except
+    # pylint: disable=too-many-arguments
+    def _fetch_segment(self, url, fd, segment_map, first, last):
+        """Fetches blocks 'first' to 'last' of a segmented download, marking each block as
+        it's written. Transient failures (see '_retryable') are retried from the first block
+        not yet written."""
+        _attempt = 0
+        _backoff = 1
+
+        while not all(segment_map.done[first:last + 1]):
+            _block = next(_i for _i in range(first, last + 1) if not segment_map.done[_i])
+            _start = segment_map.block_range(_block)[0]
+            _end = segment_map.block_range(last)[1]
+            _offset = _start
+
+            try:
+                _chunks = self._get_range(url, _start, _end)
+
+                try:
+                    for _chunk in _chunks:
+                        if _offset + len(_chunk) > _end + 1:
+                            raise SegmentError('{}: more than range {}-{} returned'.format(url, _start, _end))
+
+                        os.pwrite(fd, _chunk, _offset)
+                        _offset += len(_chunk)
+
+                        # Mark every block that is now completely written.
+                        while _block <= last and _offset > segment_map.block_range(_block)[1]:
+                            segment_map.mark(_block)
+                            _block += 1
+                finally:
+                    # Stopping before the end of the range closes the connection rather than
+                    # leaving it half read.
+                    _chunks.close()
+
+                if _offset <= _end:
+                    raise SegmentError('{}: range {}-{} ended after {} bytes'.format(url, _start, _end, _offset - _start))
+            except Exception as _e:
+                if _attempt >= int(config.CURL_RETRIES) or not (isinstance(_e, SegmentError) or self._retryable(_e)):
+                    raise
+
+                LOG.debug('GET %s bytes %s-%s: %s (retrying)', url, _offset, _end, _e)
+
+                _attempt += 1
+                sleep(_backoff)
+                _backoff = min(_backoff * 2, 10)
+    # pylint: enable=too-many-arguments
+    # pylint: enable=broad-except
+
+    def _get_range(self, url, start, end):
+        """Yields the bytes 'start' to 'end' of the URL using cURL."""
+        cmd = [self._curl_path,
+               config.CURL_HTTP_ARG,
+               '--user-agent',
+               config.USERAGENT,
+               '--silent',
+               '--fail',
+               '-L',
+               '--range', '{}-{}'.format(start, end),
+               url]
+
+        if config.PROXY:
+            cmd.extend(['--proxy', config.PROXY])
+
+        if config.ALLOW_INSECURE_CURL:
+            cmd.extend(['--insecure'])
+
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        try:
+            for _chunk in iter(lambda: process.stdout.read(SEGMENT_CHUNK_SIZE), b''):
+                yield _chunk
+        finally:
+            process.stdout.close()
+            process.wait()
+
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd)
+
+    # pylint: disable=no-self-use
+    def _retryable(self, exc):
+        """Returns 'True' if a failed segment is worth retrying."""
+        return not (isinstance(exc, subprocess.CalledProcessError) and exc.returncode in NO_RETRY_ERRORS)
+    # pylint: enable=no-self-use
+
+    def sample(self, url, size):
+        """Reads the first 'size' bytes of the URL without keeping them, to measure how quick
+        the source is. Returns a tuple of the bytes read and the seconds taken."""
+        result = None
+
+        _start = time()
+        _chunks = self._get_range(url, 0, size - 1)
+
+        try:
+            _read = sum(len(_chunk) for _chunk in _chunks)
+        finally:
+            _chunks.close()
+
+        result = (_read, time() - _start)
+
+        return result
+
+    def _progress(self, done, total, end=False):
+        """Reports the progress of a segmented download. cURL only reports progress for
+        single transfers, so there's nothing to report here."""
+        pass
+
+    def get(self, url, output=None, counter_msg=None, resume=True):
+        """Retrieves the specified URL. Saves it to path specified in 'output' if present."""
+        # NOTE: Must ignore 'dry run' state for any '.plist' file downloads.
+        _headers = self._get_headers(obj=url)
+
+        # Check if we're fetching a property list file
+        _fetching_plist = url.endswith('.plist')
+
+        _silent = config.QUIET or config.SILENT or self._silent_override or _fetching_plist
+
+        # A file downloaded in segments is incomplete while it has a segment map.
+        _partial = output and os.path.exists(SegmentMap.sidecar(output))
+
+        if config.FORCE_DOWNLOAD and os.path.exists(output):
+            if not config.DRY_RUN:
+                LOG.debug('Forced download - removing: %s', output)
+                misc.clean_up(file_path=output)
+                misc.clean_up(file_path=SegmentMap.sidecar(output))
+                _partial = False
 
         if not config.DRY_RUN or _fetching_plist:
             if counter_msg:
@@ -191,44 +595,40 @@ class CURL(object):
             if config.FORCE_DOWNLOAD:
                 _msg = _msg.replace('Downloading', 'Re-downloading')
 
-            try:
-                if not os.path.exists(output):
+            if not os.path.exists(output):
+                LOG.info(_msg)
+
+                if not (config.SILENT or self._silent_override or _fetching_plist):
+                    print(_msg)
+
+                self._start_transfer(url=url, output=output, resume=resume, headers=_headers, silent=_silent)
+            elif os.path.exists(output):
+                _local_len = os.path.getsize(output)
+                _content_len = None
+
+                try:
+                    _content_len = _headers['Content-Length']
+                except KeyError:
+                    _content_len = _headers['content-length']
+
+                if _content_len and _local_len == _content_len and not _partial:
+                    _msg = _msg.replace('Re-downloading', 'Downloading')
+                    _msg = _msg.replace('Downloading', 'Skipping existing file')
                     LOG.info(_msg)
 
                     if not (config.SILENT or self._silent_override or _fetching_plist):
                         print(_msg)
+                else:
+                    _msg = _msg.replace('Re-downloading', 'Downloading')
+                    _msg = _msg.replace('Downloading', 'Resuming')
+                    LOG.info(_msg)
 
-                    subprocess.check_call(cmd)
-                elif os.path.exists(output):
-                    _local_len = os.path.getsize(output)
-                    _content_len = None
-
-                    try:
-                        _content_len = _headers['Content-Length']
-                    except KeyError:
-                        _content_len = _headers['content-length']
-
-                    if _content_len and _local_len == _content_len:
-                        _msg = _msg.replace('Re-downloading', 'Downloading')
-                        _msg = _msg.replace('Downloading', 'Skipping existing file')
-                        LOG.info(_msg)
-
-                        if not (config.SILENT or self._silent_override or _fetching_plist):
-                            print(_msg)
-                    elif not _content_len or (_content_len and _local_len != _content_len):
-                        _msg = _msg.replace('Re-downloading', 'Downloading')
-                        _msg = _msg.replace('Downloading', 'Resuming')
-                        LOG.info(_msg)
-
-                        if not (config.SILENT or self._silent_override or _fetching_plist):
-                            print(_msg)
-
-                        subprocess.check_call(cmd)
-            except subprocess.CalledProcessError as _e:
-                LOG.debug('{}: {}'.format(' '.join(cmd), _e))
-                raise _e
+                    if not (config.SILENT or self._silent_override or _fetching_plist):
+                        print(_msg)
+
+                    self._start_transfer(url=url, output=output, resume=resume, headers=_headers, silent=_silent)
         elif config.DRY_RUN:
-            if not config.SILENT:
+            if not (config.SILENT or self._silent_override):
                 _msg = 'Download {} - {}'.format(counter_msg, url)
 
                 print(_msg)
@@ -1,39 +1,106 @@
 """Deployement."""
 import logging
 import os
-import subprocess  # NOQA
 
-from distutils.version import StrictVersion
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Event, Lock, Thread
+from time import time
+
+try:
+    import Queue as queue  # Python 2 package
+except ImportError:
+    import queue  # Python 3 package
 
 # pylint: disable=relative-import
 try:
     import config
     import curl_requests
+    import http_client
+    import installer
+    import journal
     import misc
     import package
-    import version
+    import package_store
+    import report
+    import sources
+    import timing
+    import verify
 except ImportError:
     from . import config
     from . import curl_requests
+    from . import http_client
+    from . import installer
+    from . import journal
     from . import misc
     from . import package
-    from . import version
+    from . import package_store
+    from . import report
+    from . import sources
+    from . import timing
+    from . import verify
 # pylint: enable=relative-import
 
 LOG = logging.getLogger(__name__)
-OS_VER = version.os_vers()
+
+
+def progress_counter(index, total):
+    """Returns a zero padded 'n of total' progress string."""
+    result = None
+
+    _i = '{i:0{width}d}'.format(width=len(str(total)), i=index)
+    result = '{} of {}'.format(_i, total)
+
+    return result
+
+
+class StagingBudget(object):
+    """Limits the number of bytes of downloaded packages waiting on disk to be installed."""
+    def __init__(self, limit):
+        self._limit = limit
+        self._staged = 0
+        self._condition = Condition()
+
+    def acquire(self, size):
+        """Blocks until there is room to stage 'size' bytes. A package is always let through
+        when nothing is staged so packages larger than the limit can't stall the pipeline."""
+        with self._condition:
+            while self._staged and self._staged + size > self._limit:
+                self._condition.wait()
+
+            self._staged += size
+
+    def release(self, size):
+        """Frees 'size' bytes once a staged package has been installed and removed."""
+        with self._condition:
+            self._staged = max(self._staged - size, 0)
+            self._condition.notify_all()
 
 
 class LoopDeployment(object):
     """Contains attributes relating to deployment of packages locally."""
-    def __init__(self):
+    def __init__(self, jobs=None, lookahead=None, batch=None):
         # These are used for statistics. Initialise them with '0' (int).
         self._download_size = 0
         self._downloaded_size = 0
 
         self._install_size = 0
 
+        # Number of concurrent downloads.
+        self._jobs = jobs if jobs else config.DOWNLOAD_JOBS
+
+        # Bytes of packages that can be downloaded ahead of the installer when deploying.
+        self._lookahead = lookahead if lookahead else config.DOWNLOAD_LOOKAHEAD
+        self._stats_lock = Lock()
+
+        # Number of packages installed with each 'installer' call when deploying.
+        self._batch = batch if batch else config.BATCH_INSTALL
+
+        # Shared store that packages are linked from instead of downloaded, if one is used.
+        self._store = None
+
+        if config.PKG_STORE and not (config.DRY_RUN or config.HTTP_DMG):
+            self._store = package_store.PackageStore(store_path=config.PKG_STORE, max_size=config.PKG_STORE_SIZE)
+
     def _upd_download_size(self, size):
         """Updates the 'download_size' attribute by the specified size."""
         if isinstance(size, int):
@@ -42,99 +109,268 @@ class LoopDeployment(object):
     def _upd_downloaded_size(self, size):
         """Updates the 'downloaded_size' attribute by the specified size."""
         if isinstance(size, int):
-            self._downloaded_size += size
+            with self._stats_lock:
+                self._downloaded_size += size
 
     def _upd_install_size(self, size):
         """Updates the 'install_size' attribute by the specified size."""
         if isinstance(size, int):
             self._install_size += size
 
-    # pylint: disable=no-self-use
     # pylint: disable=inconsistent-return-statements
-    def _download(self, pkg, counter_msg):
-        """Downloads a package from the specified URL."""
+    def _download(self, pkg, counter_msg, silent_override=False):
+        """Downloads a package, or links it from the package store. Returns the URL (or package
+        store path) the package came from. Packages in the manifest are checked once in place,
+        and a package that doesn't match is downloaded again from Apple."""
         if isinstance(pkg, package.LoopPackage):
-            _url = pkg.DownloadURL
-            _cache_race = False  # Presume all caching server packages are completely downloaded
-            _debug_msg = 'Fell back {} to {}'.format(_url, pkg.DownloadURL)
+            result = None
+            _digest = verify.MANIFEST.expected(pkg.DownloadPath)
+            _finished = (journal.JOURNAL.downloaded(pkg) and not config.FORCE_DOWNLOAD and
+                         (journal.JOURNAL.get(pkg, journal.VERIFIED) or not _digest))
+
+            # Use the copy in the package store, unless downloading again is forced.
+            if self._store and config.FORCE_DOWNLOAD:
+                self._store.discard(pkg, digest=_digest)
+            elif self._store and not _finished:
+                result = self._store.link(pkg, digest=_digest)
+
+            if _finished:
+                # Skip packages an interrupted run finished downloading.
+                LOG.debug('Skipping %s, downloaded in an earlier run', pkg.DownloadName)
+                result = pkg.DownloadPath
+                report.REPORT.update(pkg, source='journal', url=result)
+            elif result:
+                LOG.debug('Linked %s from package store %s', pkg.DownloadName, result)
+                report.REPORT.update(pkg, source='package store', url=result)
+            else:
+                result = self._fetch(pkg=pkg, counter_msg=counter_msg, silent_override=silent_override)
 
-            curl = curl_requests.CURL()
+            if result and not _finished and self._verified(pkg) is False:
+                LOG.info('{} does not match the manifest, downloading again from {}'.format(pkg.DownloadName,
+                                                                                          pkg.DownloadURL))
+                misc.clean_up(file_path=pkg.DownloadPath)
 
-            if pkg.LocalDownloadURL:
-                _url = pkg.LocalDownloadURL
-            elif pkg.CacheDownloadURL:
-                _url = pkg.CacheDownloadURL
+                if self._store:
+                    self._store.discard(pkg, digest=_digest)
 
-            # Get the status of the URL to see if it exists
-            req = curl_requests.CURL(url=_url)
+                _start = time()
+                curl = http_client.new_request(silent_override=silent_override)
+                curl.get(url=pkg.DownloadURL, output=pkg.DownloadPath, counter_msg=counter_msg)
+                result = pkg.DownloadURL
+                report.REPORT.update(pkg, fallback='{} does not match the manifest'.format(pkg.DownloadName),
+                                     source=sources.APPLE, url=result, download_seconds=time() - _start,
+                                     bytes=os.path.getsize(pkg.DownloadPath) if os.path.exists(pkg.DownloadPath) else 0)
 
-            # Check if a caching server package is less than the expected size,
-            # if this is true, then it's likely the caching server hasn't completely
-            # downloaded the file yet, and will cause problems, so fall back.
-            if config.CACHING_SERVER:
-                try:
-                    if config.REAL_DOWNLOAD_SIZE:
-                        _cache_race = req.headers['Content-Length'] < pkg.RealDownloadSize
-                    else:
-                        _cache_race = req.headers['Content-Length'] < pkg.DownloadSize
-                except KeyError:
-                    if config.REAL_DOWNLOAD_SIZE:
-                        _cache_race = req.headers['content-length'] < pkg.RealDownloadSize
-                    else:
-                        _cache_race = req.headers['content-length'] < pkg.DownloadSize
-
-                if _cache_race:
-                    _debug_msg = '{} (Possible Caching Server race condition when downloading package)'.format(_debug_msg)
-
-            if req.status:
-                if req.status in config.HTTP_OK_STATUS:
-                    curl.get(url=_url, output=pkg.DownloadPath, counter_msg=counter_msg)
-                elif req.status not in config.HTTP_OK_STATUS:
-                    # Fallback only if the url is either a cache or pkg server
-                    if _url in [pkg.LocalDownloadURL, pkg.CacheDownloadURL] or _cache_race:
-                        LOG.debug(_debug_msg)
-
-                        _url = pkg.DownloadURL
+                if self._verified(pkg) is False:
+                    misc.clean_up(file_path=pkg.DownloadPath)
+                    raise verify.VerificationError('{} does not match the manifest'.format(pkg.DownloadName))
 
-                        curl.get(url=_url, output=pkg.DownloadPath, counter_msg=counter_msg)
-            elif not req.status or req.curl_error:
-                # Fallback only if the url is either a cache or pkg server
-                if _url in [pkg.LocalDownloadURL, pkg.CacheDownloadURL] or _cache_race:
-                    LOG.debug(_debug_msg)
+            if result and self._store:
+                self._store.add(pkg, digest=_digest)
 
-                    _url = pkg.DownloadURL
+            if result:
+                self._record_download(pkg)
+                report.REPORT.update(pkg, result=report.DRY_RUN if config.DRY_RUN else report.DOWNLOADED)
 
-                    curl.get(url=_url, output=pkg.DownloadPath, counter_msg=counter_msg)
+            return result
         else:
-            LOG.debug('{} is {}'.format(pkg, pkg.__class__))
+            LOG.debug('%s is %s', pkg, pkg.__class__)
             return NotImplemented
     # pylint: enable=inconsistent-return-statements
 
+    # pylint: disable=no-self-use
+    def _cache_race(self, pkg, req):
+        """Returns 'True' if the caching server has less of the package than expected. If this
+        is true, then it's likely the caching server hasn't completely downloaded the file yet,
+        and will cause problems, so fall back."""
+        result = False
+
+        _expected = pkg.RealDownloadSize if config.REAL_DOWNLOAD_SIZE else pkg.DownloadSize
+        _headers = req.headers or dict()
+        _length = _headers.get('Content-Length', _headers.get('content-length'))
+
+        if _expected and _length is not None:
+            result = _length < _expected
+
+        return result
+
+    # pylint: disable=broad-except
+    def _probe(self, pkg, name, url):
+        """Probes a source with a HEAD request, then reads the first 'sources.PROBE_BYTES' of
+        the package to measure its throughput (not in a dry run). How quick it was, or that it
+        failed, is recorded in 'sources.SELECTOR'. The headers are cached, so the HEAD request
+        is free if the package is then downloaded from the source."""
+        _start = time()
+        _cached = url in curl_requests.HEADER_CACHE
+        req = http_client.new_request(url=url, silent_override=True)
+        _latency = None if _cached else time() - _start
+        _error = bool(not req.status or req.curl_error or req.status not in config.HTTP_OK_STATUS)
+        _size = None
+        _seconds = None
+
+        if not (_error or config.DRY_RUN) and (pkg.DownloadSize or 0) >= sources.PROBE_BYTES:
+            try:
+                _size, _seconds = req.sample(url, sources.PROBE_BYTES)
+            except Exception as _e:
+                LOG.debug('Probe of %s failed: %s', url, _e)
+                _error = True
+
+        sources.SELECTOR.record(name, latency=_latency, size=_size, seconds=_seconds, error=_error)
+        timing.TIMINGS.count('source probes')
+        LOG.debug('Probed %s: %s %s, %s bytes in %ss', name, req.status, req.curl_error, _size, _seconds)
+    # pylint: enable=broad-except
+
+    # pylint: disable=broad-except
+    def _fetch(self, pkg, counter_msg, silent_override=False):
+        """Downloads a package from the source expected to be quickest, as picked by
+        'sources.SELECTOR', falling back to the next source if a source doesn't have the
+        package or the download fails. Apple is the last source tried. Sources due a probe
+        are probed first. Returns the URL the package was downloaded from."""
+        result = None
+
+        for _name, _url in sources.SELECTOR.probes(pkg):
+            self._probe(pkg, _name, _url)
+
+        _sources = sources.SELECTOR.candidates(pkg)
+
+        curl = http_client.new_request(silent_override=silent_override)
+
+        for _i, (_name, _url) in enumerate(_sources, start=1):
+            _last = _i == len(_sources)
+            _fallback_msg = ('Fell back {} to {}'.format(_url, _sources[_i][1]) if not _last else
+                             'No sources left for {}'.format(pkg.DownloadName))
+
+            # Get the status of the URL to see if it exists. Headers already requested
+            # this run are cached, so say nothing about how quick the source is.
+            _cached = _url in curl_requests.HEADER_CACHE
+            _start = time()
+            req = http_client.new_request(url=_url, silent_override=silent_override)
+            _latency = None if _cached else time() - _start
+
+            if not req.status or req.curl_error or req.status not in config.HTTP_OK_STATUS:
+                sources.SELECTOR.record(_name, latency=_latency, error=True)
+                LOG.debug('%s (%s %s)', _fallback_msg, req.status, req.curl_error)
+                report.REPORT.update(pkg, fallback='{}: {}'.format(_name, req.curl_error.get('Error_Msg') if req.curl_error
+                                                                  else 'HTTP status {}'.format(req.status)))
+                timing.TIMINGS.count('source fallbacks')
+                continue
+
+            if _name == sources.CACHING_SERVER and self._cache_race(pkg, req):
+                LOG.debug('%s (Possible Caching Server race condition when downloading package)', _fallback_msg)
+                report.REPORT.update(pkg, fallback='{}: possible race condition'.format(_name))
+                timing.TIMINGS.count('source fallbacks')
+                continue
+
+            _existing = os.path.getsize(pkg.DownloadPath) if os.path.exists(pkg.DownloadPath) else 0
+            _start = time()
+
+            try:
+                curl.get(url=_url, output=pkg.DownloadPath, counter_msg=counter_msg)
+            except Exception as _e:
+                sources.SELECTOR.record(_name, latency=_latency, error=True)
+
+                if _last:
+                    raise
+
+                LOG.debug('%s (%s)', _fallback_msg, _e)
+                report.REPORT.update(pkg, fallback='{}: {}'.format(_name, _e))
+                timing.TIMINGS.count('source fallbacks')
+                continue
+
+            _size = (os.path.getsize(pkg.DownloadPath) if os.path.exists(pkg.DownloadPath) else 0) - _existing
+            sources.SELECTOR.record(_name, latency=_latency, size=_size, seconds=time() - _start)
+            report.REPORT.update(pkg, source=_name, url=_url, bytes=_size, download_seconds=time() - _start)
+            result = _url
+            break
+
+        return result
+    # pylint: enable=broad-except
+
+    def _verified(self, pkg):
+        """Checks a downloaded package against the manifest, recording it as verified in the run
+        journal if it matches. Returns 'None' if the package isn't in the manifest or on disk."""
+        result = None
+
+        if not config.DRY_RUN and os.path.exists(pkg.DownloadPath):
+            result = verify.MANIFEST.check(pkg.DownloadPath)
+
+        if result:
+            journal.JOURNAL.record(pkg, journal.VERIFIED)
+
+        return result
+
+    def _record_download(self, pkg):
+        """Records a package as downloaded in the run journal, if the file is in place."""
+        if os.path.exists(pkg.DownloadPath):
+            journal.JOURNAL.record(pkg, journal.DOWNLOADED, size=os.path.getsize(pkg.DownloadPath))
+    # pylint: enable=no-self-use
+
+    # pylint: disable=broad-except
+    def _download_worker(self, pkg, counter_msg):
+        """Downloads a package from within the download pool. Returns a tuple of the package,
+        the URL it was downloaded from, and any exception raised while downloading. Download
+        progress is only shown when there's a single download worker, as progress from
+        several downloads at once would be interleaved."""
+        result = None
+        _url = None
+        _error = None
+
+        try:
+            _url = self._download(pkg=pkg, counter_msg=counter_msg, silent_override=self._jobs > 1)
+        except Exception as _e:
+            _error = _e
+
+        result = (pkg, _url, _error)
+
+        return result
+    # pylint: enable=broad-except
+
+    # pylint: disable=no-self-use
     def _installer(self, cmd):
         """'installer' command execution."""
         result = None
         msg = None
 
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        p_result, p_error = process.communicate()
+        # Hung installs are killed and tried again once.
+        for _attempt in range(2):
+            with timing.TIMINGS.span('install'):
+                _returncode, p_result, p_error, _killed = installer.WATCHER.run(cmd, timeout=config.INSTALLER_TIMEOUT)
+
+            if not _killed:
+                break
+
+            LOG.info('Killed {} after {}s without progress{}'.format(' '.join(cmd), config.INSTALLER_TIMEOUT,
+                                                                     ', trying again' if not _attempt else ''))
 
-        if process.returncode == 0:
+        if _returncode == 0:
             msg = '  Installed _PKG_'
             LOG.info('{}: {}'.format(' '.join(cmd), p_result))
 
-            # Debug log installer '-dumplog' value.
-            try:
-                _installer_dumplog_msg = p_error.decode('utf-8')
-            except Exception:
-                _installer_dumplog_msg = p_error
+            # Debug log installer '-dumplog' value. It's long, so only decode it if it's logged.
+            if LOG.isEnabledFor(logging.DEBUG):
+                try:
+                    _installer_dumplog_msg = p_error.decode('utf-8')
+                except Exception:
+                    _installer_dumplog_msg = p_error
 
-            LOG.debug(_installer_dumplog_msg)
+                LOG.debug('%s', _installer_dumplog_msg)
         else:
             msg = (' Error installing _PKG_. \'/var/log/install.log\' may include additional'
                    ' information.')
-            LOG.debug('{}: {}'.format(' '.join(cmd), p_error))
+            LOG.debug('%s: %s', ' '.join(cmd), p_error)
+
+        result = (_returncode, msg)
+
+        return result
 
-        result = (process.returncode, msg)
+    def _installer_cmd(self, filename):
+        """Returns the 'installer' command to install a package or distribution."""
+        result = None
+
+        result = [config.INSTALLER_PATH, '-dumplog', '-pkg', filename, '-target', config.TARGET]
+
+        if config.ALLOW_UNSECURE_PKGS:
+            result.insert(1, '-allowUntrusted')  # Insert at index 1, shifts right
 
         return result
 
@@ -143,58 +379,330 @@ class LoopDeployment(object):
         result = None
         filename = os.path.join(config.DESTINATION_PATH, pkg.DownloadPath)
 
-        cmd = ['/usr/sbin/installer', '-dumplog', '-pkg', filename, '-target', config.TARGET]
-
-        if config.ALLOW_UNSECURE_PKGS:
-            cmd.insert(1, '-allowUntrusted')  # Insert at index 1, shifts right
+        cmd = self._installer_cmd(filename)
 
         if config.DRY_RUN:
             _msg = ' '.join(cmd)
             print('  {}'.format(_msg))
             LOG.info(_msg)
+            report.REPORT.update(pkg, result=report.DRY_RUN)
         else:
             if os.path.exists(filename):
                 if not config.SILENT:
                     print('Installing {} - {}'.format(counter_msg, pkg.DownloadName))
 
+                _start = time()
                 install_result = self._installer(cmd=cmd)
                 msg = '{}'.format(install_result[1]).replace('_PKG_', pkg.DownloadName)
                 result = True if install_result[0] == 0 else False
 
+                if result:
+                    pkg.invalidate_install_state()
+                    journal.JOURNAL.record(pkg, journal.INSTALLED)
+                    report.REPORT.update(pkg, result=report.INSTALLED, install_seconds=time() - _start)
+                else:
+                    report.REPORT.update(pkg, result=report.FAILED, install_seconds=time() - _start,
+                                         error='installer exited with {}'.format(install_result[0]))
+
                 if not config.SILENT:
                     print(msg)
             else:
                 LOG.info('File not found: {}'.format(filename))
+                report.REPORT.update(pkg, result=report.FAILED, error='File not found: {}'.format(filename))
+
                 if not config.SILENT:
                     print('File not found: {}'.format(filename))
 
         return result
+
+    def _install_batch(self, batch):
+        """Installs a batch of '(package, counter_msg)' with one 'installer' call, using a
+        distribution of the packages. Each package's receipt is checked afterwards, and any
+        package without a new receipt (or the whole batch, if 'installer' fails) is then
+        installed on its own."""
+        _pkgs, _ = installer.batchable([_pkg for _pkg, _ in batch])
+        _batched = set(_pkg.DownloadName for _pkg in _pkgs) if len(_pkgs) > 1 else set()
+        _single = [(_pkg, _ctr_msg) for _pkg, _ctr_msg in batch if _pkg.DownloadName not in _batched]
+
+        if _batched:
+            _dist = installer.write_distribution(_pkgs)
+            cmd = self._installer_cmd(_dist)
+
+            if config.DRY_RUN:
+                _msg = ' '.join(cmd)
+                print('  {}'.format(_msg))
+                LOG.info('{} ({})'.format(_msg, ', '.join(_pkg.DownloadName for _pkg in _pkgs)))
+
+                for _pkg in _pkgs:
+                    report.REPORT.update(_pkg, result=report.DRY_RUN, batch=len(_pkgs))
+            else:
+                if not config.SILENT:
+                    print('Installing {} - {} packages'.format(' to '.join([batch[0][1], batch[-1][1]]), len(_pkgs)))
+
+                _start = time()
+                _returncode, _ = self._installer(cmd=cmd)
+                _seconds = (time() - _start) / len(_pkgs)  # Each package's share of the batch.
+                _retry = list()
+
+                for _pkg, _ctr_msg in batch:
+                    if _pkg.DownloadName not in _batched:
+                        continue
+
+                    if installer.installed_since(_pkg, since=_start):
+                        journal.JOURNAL.record(_pkg, journal.INSTALLED)
+                        report.REPORT.update(_pkg, result=report.INSTALLED, install_seconds=_seconds, batch=len(_pkgs))
+
+                        if not config.SILENT:
+                            print('  Installed {}'.format(_pkg.DownloadName))
+                    else:
+                        _retry.append((_pkg, _ctr_msg))
+                        report.REPORT.update(_pkg, fallback='batch install: installer exited with {}'.format(_returncode))
+
+                if _retry:
+                    LOG.info('Batch install of {} packages left {} not installed, installing them separately'.format(
+                        len(_pkgs), len(_retry)))
+                    _single.extend(_retry)
+
+            misc.clean_up(file_path=_dist)
+
+        for _pkg, _ctr_msg in _single:
+            self._install(pkg=_pkg, counter_msg=_ctr_msg)
     # pylint: enable=no-self-use
 
+    def _report_download(self, pkg, url, error, counter_msg):
+        """Reports the result of a pooled download. Returns True if the package downloaded.
+        With a single download worker the download has already shown its progress, so only
+        errors are printed."""
+        result = None
+        _print = not config.SILENT
+
+        if error or not url:
+            result = False
+            _msg = 'Error downloading file {} - {}'.format(counter_msg, pkg.DownloadName)
+
+            if error:
+                LOG.info('Exception downloading: {}'.format(error))
+
+            report.REPORT.update(pkg, result=report.FAILED, error=error if error else 'No source had the package')
+        else:
+            result = True
+            self._upd_downloaded_size(pkg.DownloadSize)
+            _msg = '{} file {} - {}'.format('Download' if config.DRY_RUN else 'Downloaded', counter_msg, url)
+            _print = _print and self._jobs > 1
+
+        LOG.info(_msg)
+
+        if _print:
+            print(_msg)
+
+        return result
+
+    def _deploy(self, pkg, counter_msg):
+        """Installs a downloaded package, then waits and cleans up after the install."""
+        _start = time()
+
+        try:
+            self._install(pkg=pkg, counter_msg=counter_msg)
+        except Exception as e:
+            LOG.info('Exception installing: {}'.format(str(e).strip()))
+
+        LOG.debug('Install of %s took %.2fs', pkg.DownloadName, time() - _start)
+
+        self._settle(pkgs=[pkg])
+
+    def _deploy_batch(self, batch):
+        """Installs a batch of downloaded '(package, counter_msg)', then waits and cleans up
+        after the install, and finishes the run report of each package."""
+        _start = time()
+
+        if len(batch) == 1:
+            self._deploy(pkg=batch[0][0], counter_msg=batch[0][1])
+        else:
+            try:
+                self._install_batch(batch)
+            except Exception as e:
+                LOG.info('Exception installing: {}'.format(str(e).strip()))
+
+            LOG.debug('Install of %s packages took %.2fs', len(batch), time() - _start)
+
+            self._settle(pkgs=[_pkg for _pkg, _ in batch])
+
+        for _pkg, _ in batch:
+            report.REPORT.finish(_pkg)
+
+    def _settle(self, pkgs):
+        """Removes the installed packages, then waits for things to settle after installing."""
+        if not config.DRY_RUN:
+            # Don't try and delete from DMG.
+            if not config.HTTP_DMG:
+                for _pkg in pkgs:
+                    misc.clean_up(file_path=_pkg.DownloadPath)
+
+        # Installer can hang on the 'Preparing for install'
+        # in macOS 11.0.1, so delay the next install until the
+        # install log goes quiet, for up to 'INST_SLEEP' seconds.
+        # if config.OS_VER > StrictVersion('10.15.99') or config.INST_SLEEP:
+        if not config.DRY_RUN and config.INST_SLEEP:
+            with timing.TIMINGS.span('install settle'):
+                installer.WATCHER.settle(timeout=float(config.INST_SLEEP))
+
+    def download_all(self, pkgs):
+        """Downloads all packages concurrently using a pool of 'config.DOWNLOAD_JOBS' workers.
+        Each package keeps the mirror, caching server, Apple fallback order. Progress is
+        reported in package order as each download completes."""
+        _l = len(pkgs)
+        _failed = 0
+
+        LOG.info('Downloading {} packages with {} workers'.format(_l, self._jobs))
+
+        executor = ThreadPoolExecutor(max_workers=self._jobs)
+        _futures = [executor.submit(self._download_worker, _pkg, progress_counter(_i, _l))
+                    for _i, _pkg in enumerate(pkgs, start=1)]
+
+        try:
+            for _i, _future in enumerate(_futures, start=1):
+                _pkg, _url, _error = _future.result()
+
+                if not self._report_download(_pkg, _url, _error, counter_msg=progress_counter(_i, _l)):
+                    _failed += 1
+
+                report.REPORT.finish(_pkg)
+        except KeyboardInterrupt:
+            for _future in _futures:
+                _future.cancel()
+
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+        _msg = 'Downloaded {} of {} packages ({})'.format(_l - _failed, _l, misc.bytes2hr(byte=self._downloaded_size))
+
+        if config.DRY_RUN:
+            _msg = _msg.replace('Downloaded', 'Dry run download of')
+
+        LOG.info(_msg)
+
+        if not (config.QUIET or config.SILENT):
+            print(_msg)
+
+    def deploy_all(self, pkgs):
+        """Downloads and installs all packages as a pipeline. Downloads run ahead of the
+        installer in the download pool, limited to 'config.DOWNLOAD_LOOKAHEAD' bytes of
+        packages staged on disk, while packages are installed in order, in batches of
+        'config.BATCH_INSTALL' packages. A batch is installed early if waiting for the next
+        package would go over the look-ahead, as that package can't be downloaded until
+        the batch is installed."""
+        _l = len(pkgs)
+        _batch = list()
+        _batch_start = 0  # Index of the first package in the batch.
+        _budget = StagingBudget(limit=self._lookahead)
+        _staged = queue.Queue()
+        _stop = Event()
+
+        LOG.info('Deploying {} packages with {} download workers and {} look-ahead'.format(
+            _l, self._jobs, misc.bytes2hr(byte=self._lookahead)))
+
+        executor = ThreadPoolExecutor(max_workers=self._jobs)
+
+        def _producer():
+            """Queues downloads in package order as staging space becomes available."""
+            for _i, _pkg in enumerate(pkgs, start=1):
+                _budget.acquire(_pkg.DownloadSize)
+
+                if _stop.is_set():
+                    break
+
+                _ctr_msg = progress_counter(_i, _l)
+                _staged.put((_ctr_msg, time(), executor.submit(self._download_worker, _pkg, _ctr_msg)))
+
+            _staged.put(None)  # Nothing left to download.
+
+        _thread = Thread(target=_producer, name='appleloops-staging')
+        _thread.daemon = True
+        _thread.start()
+
+        try:
+            while True:
+                _item = _staged.get()
+
+                if _item is None:
+                    break
+
+                _ctr_msg, _queued, _future = _item
+                _pkg, _url, _error = _future.result()
+
+                LOG.debug('Download of %s ready after %.2fs', _pkg.DownloadName, time() - _queued)
+
+                self._report_download(_pkg, _url, _error, counter_msg=_ctr_msg)
+                _batch.append((_pkg, _ctr_msg))
+
+                _next = pkgs[len(_batch) + _batch_start] if len(_batch) + _batch_start < _l else None
+                _staged_size = sum(_p.DownloadSize for _p, _ in _batch)
+
+                if len(_batch) >= self._batch or not _next or _staged_size + _next.DownloadSize > self._lookahead:
+                    self._deploy_batch(_batch)
+                    _budget.release(_staged_size)
+                    _batch_start += len(_batch)
+                    _batch = list()
+        except KeyboardInterrupt:
+            _stop.set()
+            _budget.release(self._lookahead)  # Unblock the producer so it can stop.
+
+            while not _staged.empty():
+                _item = _staged.get_nowait()
+
+                if _item:
+                    _item[2].cancel()
+
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+    def process_all(self, pkgs):
+        """Processes the download/install of all packages. Downloads are run concurrently
+        when more than one download job is specified, and overlap with installs when
+        packages are being deployed."""
+        _deploying = config.DEPLOY_PKGS or config.FORCED_DEPLOYMENT
+
+        if config.HTTP_DMG and _deploying and self._batch > 1:
+            # Packages are already in place on the DMG, so only the installs need batching.
+            _l = len(pkgs)
+            _counted = [(_pkg, progress_counter(_i, _l)) for _i, _pkg in enumerate(pkgs, start=1)]
+
+            for _i in range(0, _l, self._batch):
+                self._deploy_batch(_counted[_i:_i + self._batch])
+        elif config.HTTP_DMG:
+            _l = len(pkgs)
+
+            for _i, _pkg in enumerate(pkgs, start=1):
+                self.process(_pkg, counter_msg=progress_counter(_i, _l))
+        elif _deploying:
+            self.deploy_all(pkgs)
+        elif self._jobs > 1:
+            self.download_all(pkgs)
+        else:
+            _l = len(pkgs)
+
+            for _i, _pkg in enumerate(pkgs, start=1):
+                self.process(_pkg, counter_msg=progress_counter(_i, _l))
+
+        verify.DIGESTS.save()
+        sources.SELECTOR.log_stats()
+        installer.WATCHER.log_stats()
+
+        # Nothing to resume once every package is done.
+        journal.JOURNAL.finish(pkgs, state=journal.INSTALLED if _deploying else journal.DOWNLOADED)
+
     def process(self, pkg, counter_msg):
         """Processes the download/install of packages."""
         if not config.HTTP_DMG:
             try:
                 self._download(pkg=pkg, counter_msg=counter_msg)
             except Exception as e:
-                LOG.info('Exception downloading: {}'.format(e.strip()))
-                pass
+                LOG.info('Exception downloading: {}'.format(str(e).strip()))
+                report.REPORT.update(pkg, result=report.FAILED, error=str(e).strip())
 
         if config.DEPLOY_PKGS or config.FORCED_DEPLOYMENT:
-            try:
-                self._install(pkg=pkg, counter_msg=counter_msg)
-            except Exception as e:
-                LOG.info('Exception installing: {}'.format(e.strip()))
-                pass
-
-            # Installer can hang on the 'Preparing for install'
-            # in macOS 11.0.1, so delay the install for a few seconds
-            # to allow things to settle.
-            # if StrictVersion(OS_VER) > StrictVersion('10.15.99') or config.INST_SLEEP:
-            if not config.DRY_RUN and config.INST_SLEEP:
-                sleep(int(config.INST_SLEEP))
-
-            if not config.DRY_RUN:
-                # Don't try and delete from DMG.
-                if not config.HTTP_DMG:
-                    misc.clean_up(file_path=pkg.DownloadPath)
+            self._deploy(pkg=pkg, counter_msg=counter_msg)
+
+        report.REPORT.finish(pkg)
@@ -24,13 +24,19 @@ class DiskStats(object):
     # def __init__(self, disk=None, space_used=None):
     def __init__(self, disk=None):
         self._disk = disk if disk and path.exists(disk) else config.TARGET
+        self.space_used = None
+
+    @property
+    def _freespace_key(self):
+        """Returns the 'diskutil' key for free space, which changes post Catalina."""
+        result = None
 
         if config.CATALINA:
-            self._freespace_key = 'APFSContainerFree'
+            result = 'APFSContainerFree'
         else:
-            self._freespace_key = 'FreeSpace'
+            result = 'FreeSpace'
 
-        self.space_used = None
+        return result
 
     def _get_disk_stats(self):
         """Gets the amount of free space and returns a byte value."""
@@ -9,9 +9,11 @@ from os import path, remove
 try:
     import config
     import plist
+    import timing
 except ImportError:
     from . import config
     from . import plist
+    from . import timing
 # pylint: enable=relative-import
 
 LOG = logging.getLogger(__name__)
@@ -49,8 +51,9 @@ class BuildDMG(object):
 
             # Have to umount DMG if '--pkg-server' is a DMG
             if not config.DRY_RUN:
-                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                p_result, p_error = process.communicate()
+                with timing.TIMINGS.span('hdiutil {}'.format(cmd[1])):
+                    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                    p_result, p_error = process.communicate()
 
                 if process.returncode == 0:
                     LOG.info('Unmounted {}'.format(sparseimage))
@@ -179,8 +182,9 @@ class BuildDMG(object):
             if not (config.QUIET or config.SILENT):
                 print('Converting {}'.format(sparseimage))
 
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            p_result, p_error = process.communicate()
+            with timing.TIMINGS.span('hdiutil {}'.format(cmd[1])):
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                p_result, p_error = process.communicate()
 
             if process.returncode == 0:
                 LOG.info('Created {}'.format(self.filename))
@@ -236,8 +240,9 @@ class BuildDMG(object):
                 config.DMG_VOLUME_MOUNTPATH = _sparse_exists['mount-point']
                 config.DMG_DISK_DEV = _sparse_exists['dev-entry']
             else:
-                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                p_result, p_error = process.communicate()
+                with timing.TIMINGS.span('hdiutil {}'.format(cmd[1])):
+                    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                    p_result, p_error = process.communicate()
 
                 if process.returncode == 0:
                     LOG.info('Created temporary sparseimage {}'.format(self.sparse_image))
@@ -268,8 +273,9 @@ class BuildDMG(object):
 
         # Have to mount DMG if '--pkg-server' is a DMG
         if not config.DRY_RUN:
-            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            p_result, p_error = process.communicate()
+            with timing.TIMINGS.span('hdiutil {}'.format(cmd[1])):
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                p_result, p_error = process.communicate()
 
             if process.returncode == 0:
                 LOG.info('Mounted {}'.format(dmg))
@@ -0,0 +1,217 @@
+"""Contains the class for the packages and option packs in a property list 'feed' file."""
+import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+# pylint: disable=relative-import
+try:
+    import bad_wolf
+    import config
+    import option_packs
+    import package
+    import plist
+except ImportError:
+    from . import bad_wolf
+    from . import config
+    from . import option_packs
+    from . import package
+    from . import plist
+# pylint: enable=relative-import
+
+LOG = logging.getLogger(__name__)
+
+# Feeds parsed this run, keyed by file path, size, and modified time.
+FEEDS = dict()
+
+# '_FEEDS_LOCK' only guards handing out a lock per feed, so different feeds
+# are parsed at the same time while the same feed is only parsed once.
+_FEEDS_LOCK = Lock()
+_FEED_LOCKS = dict()
+
+# Feeds parsed in this process are parsed one at a time. Parsing holds the GIL, so
+# parsing several at once isn't any quicker, but each parse in flight adds to peak memory.
+# Sources are still downloaded and checked at the same time.
+_PARSE_LOCK = Lock()
+
+# Process pool for parsing when 'config.PARSE_PROCESSES' is set, see 'shutdown'.
+_POOL = None
+
+
+class FeedReader(object):
+    """Class for reading the packages in a feed file as plain dicts, ready to make
+    'LoopPackage' objects from, applying any 'Bad Wolf' patches that resolve known issues
+    with Apple's audiocontentdownload mirrored files. Iterating yields each package as the
+    file streams in. Once iterating finishes, 'option_packs' holds the option packs.
+    Nothing read depends on the settings apart from the parsed property list cache, so
+    this can run in a worker process."""
+    def __init__(self, plist_path):
+        self._plist_path = plist_path
+        self._basename = os.path.basename(plist_path)
+
+        self.option_packs = None
+
+    def __iter__(self):
+        """If the file is read through the parsed property list cache, the packages and
+        option packs content are collected for the cache while streaming, and read from the
+        cache entry next time."""
+        _bad_wolf_fixes = bad_wolf.BAD_WOLF_PKGS.get(self._basename, None)
+        _bwd = None
+        _reader = None
+        _cache = plist.PackagesCache(self._plist_path, capture=['Content'])
+        _root = _cache.get()
+
+        if _root:
+            _pkgs = _root['Packages'].items()
+        else:
+            _reader = plist.PackagesReader(self._plist_path, capture=['Content'])
+            _root = {'Packages': dict()}
+            _pkgs = _reader
+
+        # Apply 'Bad Wolf' pathches
+        for _pkg, _value in _pkgs:
+            _new_pkg = _value.copy()  # Work on copy
+
+            # Only what option packs need is kept from a streamed package, unless it's cached.
+            if _reader and _cache.enabled:
+                _root['Packages'][_pkg] = _value
+            elif _reader:
+                _root['Packages'][_pkg] = {'IsMandatory': _value.get('IsMandatory', False)}
+
+            # Create a new key called 'PackageName' that
+            # contains the value '_pkg' for use with content packs.
+            _new_pkg['PackageName'] = _pkg
+
+            if _bad_wolf_fixes:
+                _bwd = _bad_wolf_fixes.get(_pkg, None)  # A dictionary from '_bad_wolf_fixes'
+
+            # Merge new/existing keys from matching '_bwd'
+            if _bwd:
+                _new_pkg.update(_bwd)
+
+            yield _new_pkg
+
+        if _reader:
+            _root['Content'] = _reader.captured.get('Content', None)
+            _cache.put(_root, sha1=_reader.sha1)
+
+        # Now process option packs
+        if _root:
+            self.option_packs = option_packs.OptionPack(source=_root, release=self._basename).option_packs
+
+
+class Feed(object):
+    """Class for the packages in a feed file. The file is parsed once, with packages
+    partitioned into mandatory and optional in the same pass. 'packages' and 'option_packs'
+    are what a 'FeedReader' read in a worker process, otherwise the file is read here."""
+    def __init__(self, plist_path, packages=None, option_packs=None):
+        self._plist_path = plist_path
+
+        self.mandatory_pkgs = set()
+        self.optional_pkgs = set()
+        self.option_packs = option_packs
+
+        if packages is None:
+            _reader = FeedReader(plist_path)
+            self._add(_reader)
+            self.option_packs = _reader.option_packs
+        else:
+            self._add(packages)
+
+    def _add(self, pkgs):
+        """Makes a 'LoopPackage' from each package dict, using the settings of this process."""
+        for _pkg in pkgs:
+            _pkg_obj = package.LoopPackage(**_pkg)
+
+            # pylint: disable=no-member
+            # Only add/process packages that are _not_ 'BadWolfIgnore = True'
+            if not _pkg_obj.BadWolfIgnore:
+                if _pkg_obj.IsMandatory:
+                    self.mandatory_pkgs.add(_pkg_obj)
+                else:
+                    self.optional_pkgs.add(_pkg_obj)
+            # pylint: enable=no-member
+
+    @property
+    def packages(self):
+        """Returns all packages as objects in a set."""
+        result = None
+
+        result = self.mandatory_pkgs.union(self.optional_pkgs)
+
+        return result
+
+
+def _read_in_process(plist_path, plist_cache, cache_path):
+    """Reads a feed in a worker process, returning the package dicts and the option packs.
+    Only plain values are returned, the 'LoopPackage' objects are made in the parent process,
+    as they depend on settings from the command line the worker may not have (such as the
+    destination and the local and caching servers). Settings that affect reading are
+    passed in."""
+    result = None
+
+    config.PLIST_CACHE = plist_cache
+    config.CACHE_PATH = cache_path
+
+    _reader = FeedReader(plist_path)
+    result = (list(_reader), _reader.option_packs)
+
+    return result
+
+
+def _parse(plist_path):
+    """Returns a new 'Feed' for the file, read in a worker process if 'config.PARSE_PROCESSES'
+    is set (the packages are still made in this process), otherwise parsed in this process
+    one feed at a time."""
+    global _POOL  # pylint: disable=global-statement
+    result = None
+
+    if config.PARSE_PROCESSES:
+        with _FEEDS_LOCK:
+            if _POOL is None:
+                _POOL = ProcessPoolExecutor(max_workers=min(len(config.APPS), os.cpu_count() or 1))
+
+            _future = _POOL.submit(_read_in_process, plist_path, config.PLIST_CACHE, config.CACHE_PATH)
+
+        _pkgs, _option_packs = _future.result()
+        result = Feed(plist_path=plist_path, packages=_pkgs, option_packs=_option_packs)
+    else:
+        with _PARSE_LOCK:
+            result = Feed(plist_path=plist_path)
+
+    return result
+
+
+def load(plist_path):
+    """Returns the 'Feed' for the file, only parsing the file the first time it is
+    loaded in a run. Sources that point at the same file share the same 'Feed'.
+    Safe to call from several threads, different files are parsed at the same time."""
+    result = None
+
+    _stat = os.stat(plist_path)
+    _key = (os.path.realpath(plist_path), _stat.st_size, _stat.st_mtime)
+
+    with _FEEDS_LOCK:
+        _lock = _FEED_LOCKS.setdefault(_key, Lock())
+
+    with _lock:
+        result = FEEDS.get(_key, None)
+
+        if result:
+            LOG.debug('Using parsed feed for %s', plist_path)
+        else:
+            result = _parse(plist_path)
+            FEEDS[_key] = result
+
+    return result
+
+
+def shutdown():
+    """Stops the worker processes, if any were started."""
+    global _POOL  # pylint: disable=global-statement
+
+    with _FEEDS_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown()
+            _POOL = None
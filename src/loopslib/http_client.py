@@ -0,0 +1,503 @@
+"""Contains the class for making HTTP requests in process instead of using CURL."""
+import base64
+import logging
+import os
+import socket
+import ssl
+import sys
+import zlib
+
+from threading import Lock
+from time import sleep, time
+
+try:
+    import httplib  # Python 2 package
+except ImportError:
+    import http.client as httplib  # Python 3 package
+
+try:
+    from urlparse import urljoin, urlparse  # Python 2 package
+except ImportError:
+    from urllib.parse import urljoin, urlparse  # Python 3 package
+
+# pylint: disable=relative-import
+try:
+    import config
+    import curl_errors
+    import curl_requests
+    import verify
+except ImportError:
+    from . import config
+    from . import curl_errors
+    from . import curl_requests
+    from . import verify
+# pylint: enable=relative-import
+
+LOG = logging.getLogger(__name__)
+
+# Size of each read from a response when downloading.
+CHUNK_SIZE = 1048576
+
+# Same as the cURL default.
+MAX_REDIRECTS = 50
+
+# Status codes cURL considers transient when using '--retry'.
+RETRY_STATUS = [408, 429, 500, 502, 503, 504]
+
+
+class TransferError(Exception):
+    """Exception raised when a transfer fails after all retries, with the HTTP status
+    if the server responded."""
+    def __init__(self, message, status=None):
+        super(TransferError, self).__init__(message)
+        self.status = status
+
+
+class TooManyRedirects(Exception):
+    """Exception raised when a request is redirected more than 'MAX_REDIRECTS' times."""
+    pass
+
+
+class ConnectionPool(object):
+    """Keep-alive connections, pooled per scheme, host, and port."""
+    def __init__(self):
+        self._idle = dict()
+        self._lock = Lock()
+
+    def new_connection(self, scheme, netloc):
+        """Returns a new connection to 'netloc', or to the proxy when one is configured."""
+        result = None
+
+        _timeout = config.HTTP_TIMEOUT
+        _target = urlparse('{}://{}'.format(scheme, netloc))
+        _proxy = None
+
+        if config.PROXY:
+            _proxy = urlparse(config.PROXY if '://' in config.PROXY else 'http://{}'.format(config.PROXY))
+
+        if _proxy:
+            _headers = dict()
+
+            if _proxy.username:
+                _creds = '{}:{}'.format(_proxy.username, _proxy.password or '').encode('utf-8')
+                _headers['Proxy-Authorization'] = 'Basic {}'.format(base64.b64encode(_creds).decode('ascii'))
+
+            if scheme == 'https':
+                result = httplib.HTTPSConnection(_proxy.hostname, _proxy.port or 80, timeout=_timeout,
+                                                 context=ssl_context())
+                result.set_tunnel(_target.hostname, _target.port or 443, headers=_headers)
+            else:
+                result = httplib.HTTPConnection(_proxy.hostname, _proxy.port or 80, timeout=_timeout)
+                result.proxy_headers = _headers
+        elif scheme == 'https':
+            result = httplib.HTTPSConnection(_target.hostname, _target.port or 443, timeout=_timeout,
+                                             context=ssl_context())
+        else:
+            result = httplib.HTTPConnection(_target.hostname, _target.port or 80, timeout=_timeout)
+
+        return result
+
+    def acquire(self, scheme, netloc):
+        """Returns a tuple of an idle connection for the host if there is one, otherwise
+        a new connection, and whether the connection is being reused."""
+        result = None
+        _key = (scheme, netloc)
+
+        with self._lock:
+            _idle = self._idle.get(_key)
+
+            if _idle:
+                result = (_idle.pop(), True)
+
+        if not result:
+            result = (self.new_connection(scheme, netloc), False)
+
+        return result
+
+    def release(self, scheme, netloc, conn):
+        """Returns a connection to the pool so the next request to the host can reuse it."""
+        with self._lock:
+            self._idle.setdefault((scheme, netloc), list()).append(conn)
+
+    def close(self):
+        """Closes all idle connections."""
+        with self._lock:
+            for _conns in self._idle.values():
+                for _conn in _conns:
+                    _conn.close()
+
+            self._idle = dict()
+
+
+POOL = ConnectionPool()
+_SSL_CONTEXTS = dict()
+
+
+def ssl_context():
+    """Returns the SSL context to use, honouring 'config.ALLOW_INSECURE_CURL'."""
+    result = _SSL_CONTEXTS.get(config.ALLOW_INSECURE_CURL)
+
+    if not result:
+        result = ssl.create_default_context()
+
+        if config.ALLOW_INSECURE_CURL:
+            result.check_hostname = False
+            result.verify_mode = ssl.CERT_NONE
+
+        _SSL_CONTEXTS[config.ALLOW_INSECURE_CURL] = result
+
+    return result
+
+
+def curl_error(exc):
+    """Returns the closest cURL error code for an exception so errors are reported
+    the same way regardless of the backend used."""
+    result = None
+
+    if isinstance(exc, socket.gaierror):
+        result = 6
+    elif isinstance(exc, ssl.SSLError):
+        result = 60
+    elif isinstance(exc, httplib.RemoteDisconnected):
+        result = 52
+    elif isinstance(exc, TooManyRedirects):
+        result = 47
+    elif isinstance(exc, (socket.error, httplib.HTTPException)):
+        result = 7
+
+    return result
+
+
+def retryable(exc):
+    """Returns 'True' if a request that failed with the exception is worth retrying. As
+    with 'curl --retry', only timeouts, dropped connections, and the 'RETRY_STATUS' codes
+    are retried, so refused connections and unknown hosts fail straight away."""
+    result = None
+
+    if isinstance(exc, TransferError):
+        result = exc.status in RETRY_STATUS
+    else:
+        result = isinstance(exc, (socket.timeout, ConnectionResetError, ConnectionAbortedError, BrokenPipeError,
+                                  httplib.IncompleteRead, httplib.BadStatusLine))
+
+    return result
+
+
+def new_request(url=None, silent_override=False):
+    """Returns a request object for the configured backend. The native backend only
+    speaks HTTP/1.1, so cURL is used when HTTP/2 is forced."""
+    result = None
+
+    if config.HTTP_BACKEND == 'curl' or not config.CURL_HTTP1:
+        result = curl_requests.CURL(url=url, silent_override=silent_override)
+    else:
+        result = HTTPClient(url=url, silent_override=silent_override)
+
+    return result
+
+
+class HTTPClient(curl_requests.CURL):
+    """Class for making HTTP requests in process. Provides the same interface as the
+    'CURL' class, reusing connections to each host across requests."""
+    def _request(self, method, url, headers=None):
+        """Makes a request, following redirects and retrying transient failures (see
+        'retryable') with backoff. Returns a tuple of the response, the parsed URL, and
+        the connection."""
+        result = None
+        _retries = int(config.CURL_RETRIES)
+        _attempt = 0
+        _backoff = 1
+
+        while result is None:
+            try:
+                result = self._follow(method, url, headers)
+
+                if result[0].status in RETRY_STATUS and _attempt < _retries:
+                    LOG.debug('%s %s: %s (retrying)', method, url, result[0].status)
+                    result[2].close()
+                    result = None
+            except (socket.error, httplib.HTTPException) as _e:
+                if _attempt >= _retries or not retryable(_e):
+                    raise
+
+                LOG.debug('%s %s: %s (retrying)', method, url, _e)
+
+            if result is None:
+                _attempt += 1
+                sleep(_backoff)
+                _backoff = min(_backoff * 2, 10)  # Max of 10 seconds between each retry
+
+        return result
+
+    def _follow(self, method, url, headers):
+        """Makes a request, following any redirects."""
+        result = None
+        _redirects = 0
+
+        while result is None:
+            _url = urlparse(url)
+            _path = _url.path or '/'
+
+            if _url.query:
+                _path = '{}?{}'.format(_path, _url.query)
+
+            _headers = {'User-Agent': config.USERAGENT}
+            _headers.update(headers or dict())
+
+            response, conn = self._send(_url, method, url, _path, _headers)
+
+            if response.status in [301, 302, 303, 307, 308] and response.getheader('Location'):
+                _redirects += 1
+                response.read()
+                self._release(_url, conn, response)
+
+                if _redirects > MAX_REDIRECTS:
+                    raise TooManyRedirects('Too many redirects: {}'.format(url))
+
+                url = urljoin(url, response.getheader('Location'))
+            else:
+                result = (response, _url, conn)
+
+        return result
+
+    # pylint: disable=no-self-use
+    # pylint: disable=too-many-arguments
+    def _send(self, parsed_url, method, url, path, headers):
+        """Sends a request on a pooled connection. A kept alive connection the server
+        has since closed is replaced with a new connection."""
+        result = None
+
+        conn, reused = POOL.acquire(parsed_url.scheme, parsed_url.netloc)
+
+        # Plain HTTP through a proxy requests the absolute URL.
+        if getattr(conn, 'proxy_headers', None) is not None:
+            path = url
+            headers.update(conn.proxy_headers)
+
+        try:
+            conn.request(method, path, headers=headers)
+            result = (conn.getresponse(), conn)
+        except (httplib.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+
+            if not reused:
+                raise
+
+            conn = POOL.new_connection(parsed_url.scheme, parsed_url.netloc)
+            conn.request(method, path, headers=headers)
+            result = (conn.getresponse(), conn)
+        except Exception:
+            conn.close()
+            raise
+
+        return result
+    # pylint: enable=too-many-arguments
+
+    def _release(self, url, conn, response):
+        """Returns the connection to the pool if the server will keep it alive."""
+        if response.will_close:
+            conn.close()
+        else:
+            POOL.release(url.scheme, url.netloc, conn)
+    # pylint: enable=no-self-use
+
+    def _head(self, obj):
+        """Gets the headers of the provided URL, and returns the result as a dictionary
+        in the same form as the 'CURL' class. Follows redirects."""
+        result = None
+
+        try:
+            response, _url, conn = self._request('HEAD', obj)
+            response.read()
+            self._release(_url, conn, response)
+
+            result = dict()
+            result['Status'] = 'HTTP/{} {} {}'.format('1.1' if response.version == 11 else '1.0',
+                                                      response.status, response.reason)
+
+            for key, value in response.getheaders():
+                if 'content-length' in key.lower():
+                    value = int(value)
+
+                result[key] = value
+
+            LOG.debug('HEAD %s: %s', obj, result)
+        except (socket.error, httplib.HTTPException, TooManyRedirects) as _e:
+            _err = curl_error(_e)
+
+            self.curl_error = {'cURL_Error': _err,
+                               'Error_Msg': curl_errors.CURL_ERRORS.get(_err, '{}'.format(_e))}
+
+            LOG.debug('HEAD %s: %s - %s', obj, self.curl_error.get('cURL_Error'), self.curl_error.get('Error_Msg'))
+
+        return result
+
+    # pylint: disable=too-many-locals
+    def _transfer(self, url, output, resume, gzipped, silent):
+        """Transfers the specified URL to the 'output' file, retrying transient failures (see
+        'retryable') with backoff. Retries resume from the end of the partial file unless the
+        content is gzipped."""
+        _retries = int(config.CURL_RETRIES)
+        _attempt = 0
+        _backoff = 1
+        _done = False
+        _resume = resume and not gzipped
+
+        _dir = os.path.dirname(output)
+
+        # Sources and downloads can run on several threads, so the folder may appear at any time.
+        if _dir and not os.path.exists(_dir):
+            os.makedirs(_dir, exist_ok=True)
+
+        LOG.debug('GET %s -> %s', url, output)
+
+        while not _done:
+            _offset = os.path.getsize(output) if _resume and os.path.exists(output) else 0
+            _headers = dict()
+
+            if _offset:
+                _headers['Range'] = 'bytes={}-'.format(_offset)
+
+            if gzipped:
+                _headers['Accept-Encoding'] = 'gzip'
+
+            try:
+                response, _url, conn = self._follow('GET', url, _headers)
+
+                if response.status == 416:
+                    # The range starts at the end of the file, so it is already complete.
+                    response.read()
+                    self._release(_url, conn, response)
+                elif response.status >= 400:
+                    conn.close()
+                    raise TransferError('{}: {} {}'.format(url, response.status, response.reason),
+                                        status=response.status)
+                else:
+                    if response.status != 206:
+                        _offset = 0  # Server ignored the range, so start again.
+
+                    _digest = self._write(response, output, _offset, silent)
+                    self._release(_url, conn, response)
+
+                    # Hashed while downloading, so checking the file against a manifest is free.
+                    verify.DIGESTS.add(output, _digest)
+
+                _done = True
+            except TooManyRedirects as _e:
+                raise TransferError('{}'.format(_e))
+            except (TransferError, socket.error, httplib.HTTPException) as _e:
+                if _attempt >= _retries or not retryable(_e):
+                    LOG.debug('GET %s: %s', url, _e)
+
+                    if isinstance(_e, TransferError):
+                        raise
+
+                    raise TransferError('{}: {}'.format(url, _e))
+
+                LOG.debug('GET %s: %s (retrying)', url, _e)
+
+                _attempt += 1
+                _resume = not gzipped
+                sleep(_backoff)
+                _backoff = min(_backoff * 2, 10)
+    # pylint: enable=too-many-locals
+
+    def _get_range(self, url, start, end):
+        """Yields the bytes 'start' to 'end' of the URL, on a pooled connection. The connection
+        is only returned to the pool once the whole range has been read. If reading fails, or
+        the caller stops reading early (closing the generator), the connection is closed, as
+        the rest of the response would be read by the next request on it. Not retried here, as
+        the caller retries from the first byte it hasn't written."""
+        response, _url, conn = self._follow('GET', url, {'Range': 'bytes={}-{}'.format(start, end)})
+        _complete = False
+
+        if response.status != 206:
+            conn.close()
+            raise TransferError('{}: {} {} for range {}-{}'.format(url, response.status, response.reason, start, end),
+                                status=response.status)
+
+        try:
+            for _chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                yield _chunk
+
+            _complete = True
+        finally:
+            if _complete:
+                self._release(_url, conn, response)
+            else:
+                conn.close()
+
+    # pylint: disable=no-self-use
+    def _retryable(self, exc):
+        """Returns 'True' if a failed segment is worth retrying."""
+        return retryable(exc)
+
+    def _progress(self, done, total, end=False):
+        """Reports the progress of a segmented download."""
+        progress_bar(done, total, end=end)
+
+    def _write(self, response, output, offset, silent):
+        """Streams the response body to the 'output' file, starting at 'offset'. Returns the
+        hash of the whole file, worked out as it's written."""
+        result = None
+
+        _length = response.getheader('Content-Length')
+        _total = int(_length) + offset if _length else None
+        _received = offset
+        _last_progress = 0
+        _decompress = None
+
+        if (response.getheader('Content-Encoding') or '').lower() == 'gzip':
+            _decompress = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        # When resuming, the hash starts with the part of the file already downloaded.
+        _hash = verify.hasher(output, length=offset) if offset else verify.hasher()
+
+        with open(output, 'ab' if offset else 'wb') as _f:
+            while True:
+                _chunk = response.read(CHUNK_SIZE)
+
+                if not _chunk:
+                    break
+
+                _received += len(_chunk)
+
+                if _decompress:
+                    _chunk = _decompress.decompress(_chunk)
+
+                _f.write(_chunk)
+                _hash.update(_chunk)
+
+                if not silent and _total and time() - _last_progress > 0.5:
+                    _last_progress = time()
+                    progress_bar(_received, _total)
+
+            if _decompress:
+                _chunk = _decompress.flush()
+                _f.write(_chunk)
+                _hash.update(_chunk)
+
+        if not silent and _total:
+            progress_bar(_received, _total, end=True)
+
+        if _total and _received < _total:
+            raise httplib.IncompleteRead(b'', _total - _received)
+
+        result = _hash.hexdigest()
+
+        return result
+    # pylint: enable=no-self-use
+
+
+def progress_bar(done, total, end=False):
+    """Writes a progress bar in the same style as 'curl --progress-bar' to stderr."""
+    _width = 72
+    _pct = float(done) / total if total else 1.0
+    _bar = '#' * int(_width * _pct)
+
+    sys.stderr.write('\r{:<{width}} {:5.1f}%'.format(_bar, _pct * 100, width=_width))
+
+    if end:
+        sys.stderr.write('\n')
+
+    sys.stderr.flush()
@@ -0,0 +1,265 @@
+"""Contains functions for installing several packages with one 'installer' call, using a
+distribution that lists each package, as made by 'productbuild --synthesize', and the install
+watcher that tells when an install has settled or hung."""
+import logging
+import os
+import subprocess
+import tempfile
+
+from datetime import datetime
+from distutils.version import LooseVersion
+from time import sleep, time
+from xml.etree import ElementTree
+
+try:
+    from urllib import pathname2url  # Python 2 package
+except ImportError:
+    from urllib.request import pathname2url  # Python 3 package
+
+# pylint: disable=relative-import
+try:
+    import config
+    import package
+except ImportError:
+    from . import config
+    from . import package
+# pylint: enable=relative-import
+
+LOG = logging.getLogger(__name__)
+
+# Seconds between checks of the install log and the 'installer' process.
+POLL_INTERVAL = 0.25
+
+# Bytes read from the install log at a time.
+READ_SIZE = 65536
+
+
+def batchable(pkgs):
+    """Returns a tuple of the packages that can go in one distribution, and those that must
+    be installed on their own. Packages not on disk, without a package ID, or with the same
+    package ID as another package in the batch are installed on their own."""
+    result = None
+
+    _batch = list()
+    _single = list()
+    _ids = set()
+
+    for _pkg in pkgs:
+        if _pkg.PackageID and _pkg.PackageID not in _ids and os.path.exists(_pkg.DownloadPath):
+            _batch.append(_pkg)
+            _ids.add(_pkg.PackageID)
+        else:
+            _single.append(_pkg)
+
+    result = (_batch, _single)
+
+    return result
+
+
+def distribution(pkgs):
+    """Returns a distribution (as bytes) that installs each package, with each package as a
+    hidden choice, in the same form as 'productbuild --synthesize'."""
+    result = None
+
+    _root = ElementTree.Element('installer-gui-script', {'minSpecVersion': '2'})
+    ElementTree.SubElement(_root, 'title').text = 'appleloops'
+    ElementTree.SubElement(_root, 'options', {'customize': 'never', 'require-scripts': 'false'})
+
+    _outline = ElementTree.SubElement(_root, 'choices-outline')
+    _default = ElementTree.SubElement(_outline, 'line', {'choice': 'default'})
+    ElementTree.SubElement(_root, 'choice', {'id': 'default'})
+
+    for _pkg in pkgs:
+        ElementTree.SubElement(_default, 'line', {'choice': _pkg.PackageID})
+        _choice = ElementTree.SubElement(_root, 'choice', {'id': _pkg.PackageID, 'visible': 'false'})
+        ElementTree.SubElement(_choice, 'pkg-ref', {'id': _pkg.PackageID})
+
+    for _pkg in pkgs:
+        _attrs = {'id': _pkg.PackageID, 'version': str(_pkg.PackageVersion), 'onConclusion': 'none'}
+
+        if _pkg.InstalledSize:
+            _attrs['installKBytes'] = str(_pkg.InstalledSize // 1024)
+
+        _ref = ElementTree.SubElement(_root, 'pkg-ref', _attrs)
+        _ref.text = 'file://{}'.format(pathname2url(os.path.abspath(_pkg.DownloadPath)))
+
+    result = ElementTree.tostring(_root, encoding='utf-8')
+
+    return result
+
+
+def write_distribution(pkgs):
+    """Writes a distribution for the packages to a temporary file. Returns the file path,
+    which the caller removes once the packages are installed."""
+    result = None
+
+    _fd, result = tempfile.mkstemp(prefix='appleloops-', suffix='.dist')
+
+    with os.fdopen(_fd, 'wb') as _f:
+        _f.write(distribution(pkgs))
+
+    LOG.debug('Wrote distribution of %s packages to %s', len(pkgs), result)
+
+    return result
+
+
+def installed_since(pkg, since):
+    """Returns 'True' if the package has a receipt for its version (or later) written at or
+    after 'since' (seconds since the epoch)."""
+    result = False
+
+    pkg.invalidate_install_state()
+    _pkginfo = package.InstalledPackageInfo(obj=pkg.PackageID)
+
+    if _pkginfo.pkgid == pkg.PackageID and _pkginfo.install_time:
+        # Receipt install times are only to the second.
+        _since = datetime.fromtimestamp(int(since)).strftime('%Y-%m-%d %H:%M:%S')
+        _version = LooseVersion(str(pkg.PackageVersion))
+        result = _pkginfo.install_time >= _since and _pkginfo.pkg_version >= _version
+
+    return result
+
+
+class InstallWatcher(object):
+    """Follows the install log ('config.INSTALL_LOG') while installing, to tell when an install
+    has settled and to kill 'installer' calls that have hung. The log is followed like 'tail -F',
+    only new lines are read, and it's reopened if it's rotated. Keeps totals of the time spent
+    waiting for installs to settle, for the end of run summary."""
+    def __init__(self, log_path=None):
+        self._log_path = log_path
+        self._file = None
+        self._inode = None
+        self._readable = None
+
+        self.last_activity = None
+        self.installs = 0
+        self.killed = 0
+        self.settles = 0
+        self.settle_seconds = 0.0
+        self.longest_settle = 0.0
+
+    @property
+    def log_path(self):
+        """The install log. Defaults to 'config.INSTALL_LOG'."""
+        result = None
+
+        result = self._log_path if self._log_path else config.INSTALL_LOG
+
+        return result
+
+    def _close(self):
+        """Closes the install log."""
+        if self._file:
+            self._file.close()
+
+        self._file = None
+        self._inode = None
+
+    def poll(self):
+        """Reads any new lines in the install log. Returns 'True' if there were any, 'False' if
+        there weren't, or 'None' if the log can't be read. The log is read from the end the first
+        time, and from the start when it has been rotated."""
+        result = None
+
+        try:
+            _stat = os.stat(self.log_path)
+
+            if self._file is None or _stat.st_ino != self._inode or _stat.st_size < self._file.tell():
+                _rotated = self._file is not None
+                self._close()
+                self._file = open(self.log_path, 'rb')
+                self._inode = _stat.st_ino
+
+                if not _rotated:
+                    self._file.seek(0, os.SEEK_END)
+
+            result = False
+
+            while self._file.read(READ_SIZE):
+                result = True
+
+            self._readable = True
+        except (IOError, OSError) as _e:
+            self._close()
+
+            # Only log the first time, this is polled several times a second.
+            if self._readable is not False:
+                LOG.debug('Install log %s can\'t be read: %s', self.log_path, _e)
+
+            self._readable = False
+
+        if result:
+            self.last_activity = time()
+
+        return result
+
+    def run(self, cmd, timeout):
+        """Runs an 'installer' command, killing it if it goes 'timeout' seconds without the
+        install log changing (or runs for 'timeout' seconds, if the log can't be read). Returns
+        a tuple of the return code, output, errors, and 'True' if it was killed."""
+        result = None
+        _killed = False
+
+        self.poll()
+        self.last_activity = time()
+
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        while True:
+            try:
+                p_result, p_error = process.communicate(timeout=POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                self.poll()
+
+                if time() - self.last_activity > timeout:
+                    process.kill()
+                    p_result, p_error = process.communicate()
+                    _killed = True
+                    self.killed += 1
+                    break
+
+        self.installs += 1
+        self.poll()
+
+        result = (process.returncode, p_result, p_error, _killed)
+
+        return result
+
+    def settle(self, timeout, quiet=None):
+        """Waits until the install log has been quiet for 'quiet' seconds (default is
+        'config.INST_SETTLE_QUIET'), for no more than 'timeout' seconds. If the log can't be
+        read there's no telling when an install has settled, so this waits for 'timeout'
+        seconds. Returns the seconds waited."""
+        result = None
+
+        _quiet = quiet if quiet is not None else config.INST_SETTLE_QUIET
+        _start = time()
+
+        while True:
+            _readable = self.poll() is not None
+            _waited = time() - _start
+
+            if _waited >= timeout or (_readable and time() - (self.last_activity or 0) >= _quiet):
+                break
+
+            sleep(min(POLL_INTERVAL, timeout - _waited))
+
+        result = time() - _start
+        self.settles += 1
+        self.settle_seconds += result
+        self.longest_settle = max(self.longest_settle, result)
+
+        LOG.debug('Waited %.2fs for install to settle', result)
+
+        return result
+
+    def log_stats(self):
+        """Logs a summary of the installs watched."""
+        if self.installs:
+            LOG.info('Ran installer {} times, killed {} hung installs, waited {:.1f}s for {} installs to settle '
+                     '(longest {:.1f}s)'.format(self.installs, self.killed, self.settle_seconds, self.settles,
+                                                self.longest_settle))
+
+
+WATCHER = InstallWatcher()
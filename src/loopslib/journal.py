@@ -0,0 +1,168 @@
+"""Contains the run journal, used to resume an interrupted run where it stopped."""
+import json
+import logging
+import os
+
+from threading import Lock
+from time import time
+
+# pylint: disable=relative-import
+try:
+    import config
+    import misc
+except ImportError:
+    from . import config
+    from . import misc
+# pylint: enable=relative-import
+
+LOG = logging.getLogger(__name__)
+
+# States recorded for a package, in the order they happen.
+DOWNLOADED = 'downloaded'
+VERIFIED = 'verified'
+INSTALLED = 'installed'
+STATES = [DOWNLOADED, VERIFIED, INSTALLED]
+
+
+class Journal(object):
+    """Append only record of the packages downloaded, verified, and installed in a run. Each
+    state is written as a line of JSON and synced to disk before the run moves on, so the
+    journal survives the run being killed. Packages are keyed by 'DownloadName' and
+    'PackageVersion'. A journal is removed once a run finishes all its packages."""
+    def __init__(self, journal_path=None):
+        self._journal_path = journal_path
+        self._lock = Lock()
+        self._states = None  # {key: {state: record}}, read the first time it's needed
+
+    @property
+    def journal_path(self):
+        """The journal file. Defaults to 'config.JOURNAL'."""
+        result = None
+
+        result = self._journal_path if self._journal_path else config.JOURNAL
+
+        return result
+
+    @property
+    def enabled(self):
+        """Returns 'True' if states are being recorded. Dry runs are never recorded."""
+        result = None
+
+        result = bool(self.journal_path) and not config.DRY_RUN
+
+        return result
+
+    # pylint: disable=no-self-use
+    def _key(self, pkg):
+        """Returns the journal key for a package."""
+        result = None
+
+        result = '{}|{}'.format(pkg.DownloadName, pkg.PackageVersion)
+
+        return result
+    # pylint: enable=no-self-use
+
+    def _read(self):
+        """Reads the states recorded by an earlier run. A line that was only partly written
+        when the run was killed is ignored, and cut off so new states start on a line of their own."""
+        result = dict()
+
+        if os.path.exists(self.journal_path):
+            _end = 0  # End of the last complete line.
+
+            with open(self.journal_path, 'rb') as _f:
+                for _line in _f:
+                    try:
+                        _record = json.loads(_line.decode('utf-8'))
+                    except ValueError:
+                        LOG.debug('Ignoring incomplete journal line: %s', _line.strip())
+                        continue
+
+                    if _line.endswith(b'\n'):
+                        _end = _f.tell()
+
+                    result.setdefault(_record['key'], dict())[_record['state']] = _record
+
+            if os.path.getsize(self.journal_path) != _end:
+                with open(self.journal_path, 'r+b') as _f:
+                    _f.truncate(_end)
+
+            LOG.info('Resuming from journal {} ({} packages recorded)'.format(self.journal_path, len(result)))
+
+        return result
+
+    @property
+    def states(self):
+        """Returns the states recorded for each package."""
+        result = None
+
+        with self._lock:
+            if self._states is None:
+                self._states = self._read() if self.enabled else dict()
+
+            result = self._states
+
+        return result
+
+    def get(self, pkg, state):
+        """Returns the record of a package reaching 'state', or 'None' if it hasn't."""
+        result = None
+
+        if self.enabled:
+            result = self.states.get(self._key(pkg), dict()).get(state)
+
+        return result
+
+    def downloaded(self, pkg):
+        """Returns 'True' if a package was completely downloaded, and the file is still in place."""
+        result = False
+
+        _record = self.get(pkg, DOWNLOADED)
+
+        if _record and os.path.exists(pkg.DownloadPath):
+            result = os.path.getsize(pkg.DownloadPath) == _record.get('size')
+
+        return result
+
+    def installed(self, pkg):
+        """Returns 'True' if a package was installed."""
+        result = None
+
+        result = self.get(pkg, INSTALLED) is not None
+
+        return result
+
+    def record(self, pkg, state, **kwargs):
+        """Records a package reaching 'state', along with any extra details in 'kwargs'."""
+        if self.enabled and state in STATES:
+            _record = dict(kwargs, key=self._key(pkg), state=state, time=time())
+            _states = self.states
+
+            with self._lock:
+                _dir = os.path.dirname(self.journal_path)
+
+                if _dir and not os.path.exists(_dir):
+                    os.makedirs(_dir, exist_ok=True)
+
+                with open(self.journal_path, 'a') as _f:
+                    _f.write('{}\n'.format(json.dumps(_record, sort_keys=True)))
+                    _f.flush()
+                    os.fsync(_f.fileno())
+
+                _states.setdefault(_record['key'], dict())[state] = _record
+
+    def finish(self, pkgs, state):
+        """Removes the journal if every package reached 'state', as there's nothing to resume."""
+        if self.enabled and os.path.exists(self.journal_path):
+            _unfinished = [_pkg for _pkg in pkgs if not self.get(_pkg, state)]
+
+            if _unfinished:
+                LOG.info('Keeping journal {}, {} packages not {}'.format(self.journal_path, len(_unfinished), state))
+            else:
+                misc.clean_up(file_path=self.journal_path)
+
+                with self._lock:
+                    self._states = dict()
+
+
+JOURNAL = Journal()
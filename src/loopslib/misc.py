@@ -1,12 +1,18 @@
 """Miscellaneous functions."""
 import logging
+import logging.handlers
 import os
 import shutil
+import stat
 import sys
 
-from distutils.version import StrictVersion
 from time import sleep
 
+try:
+    import Queue as queue  # Python 2 package
+except ImportError:
+    import queue  # Python 3 package
+
 # pylint: disable=relative-import
 try:
     import arguments
@@ -21,6 +27,30 @@ except ImportError:
 LOG = logging.getLogger(__name__)
 
 
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Puts log records on a bounded queue for a 'QueueListener' to format and write, so
+    logging doesn't wait on file I/O. When the queue is full, records below 'WARNING' are
+    dropped and counted by level name in 'dropped', warnings and errors wait for room."""
+    def __init__(self, log_queue):
+        logging.handlers.QueueHandler.__init__(self, log_queue)
+        self.dropped = dict()
+
+    def prepare(self, record):
+        """Returns the record as is. The queue is only read in this process, so the message
+        is left for the listener to format."""
+        return record
+
+    def enqueue(self, record):
+        """Queues a record, dropping it if the queue is full and it's below 'WARNING'."""
+        if record.levelno >= logging.WARNING:
+            self.queue.put(record)
+        else:
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+
+
 def bytes2hr(byte):
     """Converts the supplied file size into a human readable number, and adds a suffix."""
     result = None
@@ -88,6 +118,66 @@ def is_root():
     return result
 
 
+def is_trusted(path):
+    """Returns 'True' if only the current user (or root) can change what is in 'path'. The
+    folder, and each folder above it, must be owned by the current user or root and not be
+    writable by group or others, apart from sticky folders owned by root (such as '/tmp').
+    Symbolic links on the way must be owned by the current user or root, and the folders
+    they resolve to are checked as well."""
+    result = True
+
+    _euid = os.geteuid()
+    _paths = set()
+
+    for _path in [os.path.abspath(path), os.path.realpath(path)]:
+        while _path not in _paths:
+            _paths.add(_path)
+            _path = os.path.dirname(_path)
+
+    for _path in sorted(_paths):
+        _stat = os.lstat(_path)
+        _writable = _stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+        _sticky = _stat.st_mode & stat.S_ISVTX and _stat.st_uid == 0
+
+        if _stat.st_uid not in [_euid, 0] or (stat.S_ISDIR(_stat.st_mode) and _writable and not _sticky):
+            LOG.debug('Not trusting %s, owned by %s with mode %o', _path, _stat.st_uid, _stat.st_mode)
+            result = False
+            break
+
+    return result
+
+
+def cache_dir(path):
+    """Returns the cache folder 'path', creating any missing folders so only the current
+    user can write to them. Returns None if anyone else could change the cached files (see
+    'is_trusted'), as the caches are read back without checking where they came from."""
+    result = None
+
+    _missing = list()
+    _path = path
+
+    try:
+        while not os.path.exists(_path):
+            _missing.append(_path)
+            _path = os.path.dirname(_path)
+
+        for _path in reversed(_missing):
+            try:
+                os.mkdir(_path, 0o700)
+            except OSError:
+                if not os.path.isdir(_path):
+                    raise
+
+        if is_trusted(path):
+            result = path
+        else:
+            LOG.debug('Not using cache %s, it can be changed by other users', path)
+    except OSError as _e:
+        LOG.debug('Not using cache %s: %s', path, _e)
+
+    return result
+
+
 def plist_url_path(plist):
     """Returns a constructed URL."""
     result = None
@@ -104,14 +194,14 @@ def clean_up(file_path):
     if os.path.exists(file_path):
         try:
             os.remove(file_path)
-            LOG.debug('Removed: {}'.format(file_path))
+            LOG.debug('Removed: %s', file_path)
         except OSError as _e:
             # Sometimes might need a few seconds to finish IO
             sleep(2)
             try:
                 os.remove(file_path)
             except Exception as _e:
-                LOG.debug('Error removing: {} - {}'.format(file_path, _e))
+                LOG.debug('Error removing: %s - %s', file_path, _e)
                 pass  # Keep calm and carry on.
     else:
         pass
@@ -125,9 +215,9 @@ def tidy_up():
             if os.path.exists(config.DESTINATION_PATH):
                 try:
                     shutil.rmtree(config.DESTINATION_PATH)
-                    LOG.debug('Removed: {}'.format(config.DESTINATION_PATH))
+                    LOG.debug('Removed: %s', config.DESTINATION_PATH)
                 except OSError as _e:
-                    LOG.debug('Error removing: {} - {}'.format(config.DESTINATION_PATH, _e))
+                    LOG.debug('Error removing: %s - %s', config.DESTINATION_PATH, _e)
                     raise
             else:
                 pass
@@ -138,7 +228,9 @@ def debug_log_stats():
     # This is the very first point anything is logged.
     LOG.debug('Arguments: {}'.format(sys.argv))
 
-    LOG.debug('Python {} on macOS {} ({})'.format(version.PYTHON_VER, config.OS_VER, config.OS_BUILD))
+    # Only look up the OS version when it will actually be logged.
+    if LOG.isEnabledFor(logging.DEBUG):
+        LOG.debug('Python {} on macOS {} ({})'.format(version.PYTHON_VER, config.OS_VER, config.OS_BUILD))
     LOG.debug('{}'.format(version.VERSION_STR))
 
     if config.APPS_TO_PROCESS:
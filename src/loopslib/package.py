@@ -1,10 +1,15 @@
 """Contains the class for creating package objects."""
+import calendar
 import logging
 import subprocess
 
+from array import array
 from datetime import datetime
 from distutils.version import LooseVersion
+from glob import glob
+from itertools import compress
 from os import path
+from threading import Lock
 
 try:
     from urlparse import urlparse  # Python 2 package
@@ -14,14 +19,16 @@ except ImportError:
 # pylint: disable=relative-import
 try:
     import config
-    import curl_requests
+    import http_client
     import misc
     import plist
+    import timing
 except ImportError:
     from . import config
-    from . import curl_requests
+    from . import http_client
     from . import misc
     from . import plist
+    from . import timing
 # pylint: enable=relative-import
 
 LOG = logging.getLogger(__name__)
@@ -53,21 +60,22 @@ class LoopPackage(object):
                     'InstalledVersion': None,
                     'InstalledDate': None,
                     'RealDownloadSize': None,
-                    'HumanInstalledSize': None,
-                    'HumanDownloadSize': None,
-                    'HumanRealDownloadSize': None,
                     'DownloadPath': None,
                     'BadWolfIgnore': None}
 
+    # Fixed attributes rather than a per instance '__dict__', as there are
+    # thousands of packages across the feed files.
+    __slots__ = tuple(VALID_KWARGS) + ('_is_installed',)
+
     # pylint: disable=too-many-branches
     # pylint: disable=too-many-statements
     def __init__(self, **kwargs):
+        # Install state is determined once, then cached until invalidated.
+        self._is_installed = None
+
         # Set attributes based on 'VALID_KWARGS'
         for kwarg, value in self.VALID_KWARGS.items():
-            if kwarg in [_key for _key, _value in kwargs.items()]:
-                setattr(self, kwarg, kwargs.get(kwarg, None))
-            else:
-                setattr(self, kwarg, value)
+            setattr(self, kwarg, kwargs.get(kwarg, value))
 
         # pylint: disable=access-member-before-definition
         # Fix any instances where the 'PackageID' contains spaces.
@@ -85,12 +93,10 @@ class LoopPackage(object):
         if hasattr(self, 'DownloadSize'):
             # if self.DownloadSize:
             self.DownloadSize = int(self.DownloadSize)
-            self.HumanDownloadSize = misc.bytes2hr(byte=self.DownloadSize)
 
         if hasattr(self, 'InstalledSize'):
             # if self.InstalledSize:
             self.InstalledSize = int(self.InstalledSize)
-            self.HumanInstalledSize = misc.bytes2hr(byte=self.InstalledSize)
 
         # Now handle some of the appleloops specific attributes.
         if hasattr(self, 'DownloadName'):
@@ -134,9 +140,9 @@ class LoopPackage(object):
         # So querying the real download size is practically pointless.
         if config.REAL_DOWNLOAD_SIZE:
             if self.LocalDownloadURL:
-                req = curl_requests.CURL(url=self.LocalDownloadURL)
+                req = http_client.new_request(url=self.LocalDownloadURL)
             elif not self.LocalDownloadURL:
-                req = curl_requests.CURL(url=self.DownloadURL)
+                req = http_client.new_request(url=self.DownloadURL)
 
             if req.status == 200:
                 try:
@@ -146,12 +152,40 @@ class LoopPackage(object):
                         self.RealDownloadSize = req.headers['content-length']
                     except KeyError:
                         pass
-
-            if self.RealDownloadSize:
-                self.HumanRealDownloadSize = misc.bytes2hr(byte=self.RealDownloadSize)
     # pylint: enable=too-many-statements
     # pylint: enable=too-many-branches
 
+    # Human readable sizes are only formatted when used.
+    @property
+    def HumanDownloadSize(self):
+        """Attribute returning the download size in human readable format."""
+        result = None
+
+        if self.DownloadSize is not None:
+            result = misc.bytes2hr(byte=self.DownloadSize)
+
+        return result
+
+    @property
+    def HumanInstalledSize(self):
+        """Attribute returning the installed size in human readable format."""
+        result = None
+
+        if self.InstalledSize is not None:
+            result = misc.bytes2hr(byte=self.InstalledSize)
+
+        return result
+
+    @property
+    def HumanRealDownloadSize(self):
+        """Attribute returning the real download size in human readable format."""
+        result = None
+
+        if self.RealDownloadSize:
+            result = misc.bytes2hr(byte=self.RealDownloadSize)
+
+        return result
+
     # pylint: disable=no-else-return
     def __hash__(self):
         """Hash a tuple (immutable) containing the package 'DownloadName' attribute."""
@@ -235,17 +269,188 @@ class LoopPackage(object):
 
     @property
     def IsInstalled(self):
-        """Attribute returning True/False if the package is installed."""
+        """Attribute returning True/False if the package is installed. The install state
+        is cached after the first check, use 'invalidate_install_state()' to re-check."""
         result = None
 
         if not config.FORCED_DEPLOYMENT:
-            result = self._is_pkg_installed()
+            if self._is_installed is None:
+                self._is_installed = self._is_pkg_installed()
+
+            result = self._is_installed
         elif config.FORCED_DEPLOYMENT:
             # When forcing a deployment, ignore all install states.
             result = False
 
         return result
 
+    def invalidate_install_state(self):
+        """Discards the cached install state, for example after the package is installed."""
+        self._is_installed = None
+
+        if self.PackageID:
+            RECEIPTS.update(self.PackageID)
+
+
+class PackageTable(object):
+    """Column based table of packages. Sizes are held in arrays and flags in bytes (one byte
+    of 1 or 0 per package) so totals and partitions are computed over the columns rather
+    than per package attribute lookups."""
+    # Swaps the 1 and 0 bytes of a flag column.
+    _INVERT = bytes.maketrans(b'\x00\x01', b'\x01\x00')
+
+    def __init__(self, pkgs):
+        self.packages = list(pkgs)
+
+        self.download_sizes = array('q', [_pkg.DownloadSize or 0 for _pkg in self.packages])
+        self.installed_sizes = array('q', [_pkg.InstalledSize or 0 for _pkg in self.packages])
+        self.mandatory = bytes(bytearray(bool(_pkg.IsMandatory) for _pkg in self.packages))
+        self.installed = bytes(bytearray(bool(_pkg.IsInstalled) for _pkg in self.packages))
+
+    def __len__(self):
+        return len(self.packages)
+
+    def mask(self, mandatory=None, installed=None):
+        """Returns bytes of 1 or 0 for each package matching the mandatory and installed
+        flags. A flag of None matches any package. The columns are combined as whole
+        integers, so there is no per package work."""
+        result = None
+
+        _count = len(self.packages)
+        _bits = int.from_bytes(b'\x01' * _count, 'big')
+
+        for _col, _flag in [(self.mandatory, mandatory), (self.installed, installed)]:
+            if _flag is not None:
+                _bits &= int.from_bytes(_col if _flag else _col.translate(self._INVERT), 'big')
+
+        result = _bits.to_bytes(_count, 'big')
+
+        return result
+
+    def total(self, column, mask=None):
+        """Returns the sum of the 'download_sizes' or 'installed_sizes' column for the
+        packages in the mask."""
+        result = None
+
+        _column = getattr(self, column)
+        result = sum(compress(_column, mask) if mask is not None else _column)
+
+        return result
+
+    def select(self, mask):
+        """Returns the packages in the mask."""
+        result = None
+
+        result = list(compress(self.packages, mask))
+
+        return result
+
+
+class ReceiptIndex(object):
+    """Installed package receipts keyed by package ID. Built from one scan of the receipts
+    folder instead of running 'pkgutil' for each package."""
+    def __init__(self, receipts_path=None):
+        self._receipts_path = receipts_path
+        self._receipts = None
+        self._lock = Lock()
+
+    @property
+    def receipts_path(self):
+        """The folder receipts are read from. Defaults to 'config.RECEIPTS_PATH'."""
+        result = None
+
+        result = self._receipts_path if self._receipts_path else config.RECEIPTS_PATH
+
+        return result
+
+    @property
+    def available(self):
+        """Returns True/False if the receipts folder exists and can be indexed."""
+        result = None
+
+        result = path.isdir(self.receipts_path)
+
+        return result
+
+    # pylint: disable=no-self-use
+    def _pkginfo(self, receipt):
+        """Returns the receipt as a dictionary in the same form as the 'pkgutil --pkg-info-plist' output."""
+        result = None
+
+        _install_date = receipt.get('InstallDate', None)
+
+        # Receipts store the install date in UTC, 'pkgutil' reports local time.
+        if _install_date:
+            _install_date = datetime.fromtimestamp(calendar.timegm(_install_date.timetuple()))
+            _install_date = _install_date.strftime('%Y-%m-%d %H:%M:%S')
+
+        result = {'install_location': receipt.get('InstallPrefixPath', None),
+                  'install_time': _install_date,
+                  'pkg_version': LooseVersion(receipt.get('PackageVersion', '0')),
+                  'pkgid': receipt.get('PackageIdentifier', None),
+                  'receipt_plist_version': receipt.get('ReceiptVersion', None),
+                  'volume': '/'}
+
+        return result
+    # pylint: enable=no-self-use
+
+    # pylint: disable=broad-except
+    def _scan(self):
+        """Reads every receipt in the receipts folder."""
+        result = dict()
+
+        for _file in glob(path.join(self.receipts_path, '*.plist')):
+            try:
+                _receipt = plist.readPlist(_file)
+            except Exception as _e:
+                LOG.debug('Error reading receipt %s: %s', _file, _e)
+                continue
+
+            if _receipt and _receipt.get('PackageIdentifier', None):
+                _pkginfo = self._pkginfo(receipt=_receipt)
+                result[_pkginfo['pkgid']] = _pkginfo
+
+        LOG.debug('Indexed %s receipts in %s', len(result), self.receipts_path)
+
+        return result
+    # pylint: enable=broad-except
+
+    def get(self, package_id):
+        """Returns the receipt information for the package ID, or None if there is no receipt."""
+        result = None
+
+        # Looked up while holding the lock, as 'refresh' may discard the index at any time.
+        with self._lock:
+            if self._receipts is None:
+                self._receipts = self._scan()
+
+            result = self._receipts.get(package_id, None)
+
+        return result
+
+    def update(self, package_id):
+        """Re-reads the receipt for a single package ID if the index has been built."""
+        _file = path.join(self.receipts_path, '{}.plist'.format(package_id))
+        _receipt = None
+
+        if path.exists(_file):
+            _receipt = plist.readPlist(_file)
+
+        with self._lock:
+            if self._receipts is not None:
+                if _receipt and _receipt.get('PackageIdentifier', None):
+                    self._receipts[package_id] = self._pkginfo(receipt=_receipt)
+                else:
+                    self._receipts.pop(package_id, None)
+
+    def refresh(self):
+        """Discards the index so it is rebuilt on the next lookup, for example after installing packages."""
+        with self._lock:
+            self._receipts = None
+
+
+RECEIPTS = ReceiptIndex()
+
 
 class InstalledPackageInfo(object):
     """Attributes of packages installed."""
@@ -261,8 +466,12 @@ class InstalledPackageInfo(object):
         for key, value in self.VALID_PKG_INFO_KEYS.items():
             setattr(self, key, value)
 
-        # Now query with the macOS 'pkgutil' binary.
-        pkginfo = self._pkginfo(package_id=obj)
+        # Look the receipt up in the receipt index, only falling back to the
+        # macOS 'pkgutil' binary if the receipts folder can't be read.
+        if RECEIPTS.available:
+            pkginfo = RECEIPTS.get(obj)
+        else:
+            pkginfo = self._pkginfo(package_id=obj)
 
         if pkginfo:
             for key, value in pkginfo.items():
@@ -299,8 +508,9 @@ class InstalledPackageInfo(object):
 
         cmd = ['/usr/sbin/pkgutil', '--pkg-info-plist', package_id]
 
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        p_result, p_error = process.communicate()
+        with timing.TIMINGS.span('pkgutil'):
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            p_result, p_error = process.communicate()
 
         if process.returncode == 0:
             _result = plist.readPlistFromString(p_result)
@@ -315,7 +525,7 @@ class InstalledPackageInfo(object):
 
                     result[key.replace('-', '_')] = value
 
-                LOG.debug('{}: {}'.format(' '.join(cmd), result))
+                LOG.debug('%s: %s', ' '.join(cmd), result)
             else:
                 result = False
         else:
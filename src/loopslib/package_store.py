@@ -0,0 +1,284 @@
+"""Contains the shared package store, so packages are only downloaded once across destinations,
+DMG builds, and feed files."""
+import errno
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+
+from threading import Lock
+from time import time
+
+# pylint: disable=relative-import
+try:
+    import misc
+except ImportError:
+    from . import misc
+# pylint: enable=relative-import
+
+LOG = logging.getLogger(__name__)
+
+
+class PackageStore(object):
+    """A folder of downloaded packages keyed by the package ID, version, download size, and
+    hash if known. Packages are put in place at their 'DownloadPath' as hard links into the
+    store, or clones ('cp -c') or copies when the destination is on another volume.
+
+    The least recently used packages are removed when the store grows past 'max_size' bytes.
+    When each package was last used is kept in an index file in the store, not in the modified
+    time of the package, as a hard linked package shares its modified time with the copy at
+    its 'DownloadPath'. Packages are linked, cloned, or copied without holding the store lock,
+    so one slow copy doesn't hold up other downloads, the lock only guards the index."""
+    # Temporary files are hidden so they're never mistaken for stored packages.
+    TMP_PREFIX = '.tmp-'
+
+    # Index of when each package was last used, '{key: last used}'.
+    INDEX_NAME = '.index.json'
+
+    def __init__(self, store_path, max_size):
+        self._store_path = store_path
+        self._max_size = max_size
+        self._lock = Lock()
+        self._entries = None  # {key: [size, last used]}, scanned the first time it's needed
+        self._busy = dict()  # {key: packages being linked from or added}, not evicted until done
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def entries(self):
+        """Returns the packages in the store, scanning the store folder the first time."""
+        result = None
+
+        if self._entries is None:
+            self._entries = dict()
+
+            if not os.path.exists(self._store_path):
+                os.makedirs(self._store_path, exist_ok=True)
+
+            _index = self._read_index()
+
+            for _entry in os.scandir(self._store_path):
+                if _entry.name.startswith(self.TMP_PREFIX):
+                    misc.clean_up(file_path=_entry.path)  # Left over from an interrupted run.
+                elif _entry.is_file() and not _entry.name.startswith('.'):
+                    # Packages missing from the index, such as from before it was kept, fall
+                    # back to their modified time.
+                    _stat = _entry.stat()
+                    self._entries[_entry.name] = [_stat.st_size, _index.get(_entry.name, _stat.st_mtime)]
+
+            LOG.debug('Package store %s has %s packages (%s)', self._store_path, len(self._entries),
+                      misc.bytes2hr(byte=self.total_size))
+
+        result = self._entries
+
+        return result
+
+    @property
+    def total_size(self):
+        """Returns the total bytes of packages in the store."""
+        result = None
+
+        result = sum(_size for _size, _ in self._entries.values()) if self._entries else 0
+
+        return result
+
+    # pylint: disable=no-self-use
+    def key(self, pkg, digest=None):
+        """Returns the store file name for a package."""
+        result = None
+
+        _ext = os.path.splitext(pkg.DownloadName)[1]
+        _parts = [pkg.PackageID, str(pkg.PackageVersion), str(pkg.DownloadSize)]
+
+        if digest:
+            _parts.append(digest)
+
+        result = '{}{}'.format(re.sub(r'[^\w.-]', '_', '-'.join(_parts)), _ext)
+
+        return result
+    # pylint: enable=no-self-use
+
+    def _path(self, key):
+        """Returns the path of a package in the store."""
+        result = None
+
+        result = os.path.join(self._store_path, key)
+
+        return result
+
+    # pylint: disable=broad-except
+    def _read_index(self):
+        """Returns the last used time of each package from the index file."""
+        result = dict()
+
+        try:
+            with open(self._path(self.INDEX_NAME), 'r') as _f:
+                _index = json.load(_f)
+
+            if isinstance(_index, dict):
+                result = _index
+        except (IOError, OSError, ValueError) as _e:
+            LOG.debug('Not using package store index: %s', _e)
+
+        return result
+
+    def _write_index(self):
+        """Writes the last used time of each package to the index file. The index is written
+        to a temporary file and moved into place, so a partial index is never read."""
+        _tmp = self._path('{}{}'.format(self.TMP_PREFIX, self.INDEX_NAME.lstrip('.')))
+
+        try:
+            with open(_tmp, 'w') as _f:
+                json.dump({_key: _used for _key, (_, _used) in self.entries.items()}, _f)
+
+            os.rename(_tmp, self._path(self.INDEX_NAME))
+        except Exception as _e:
+            misc.clean_up(file_path=_tmp)
+            LOG.debug('Error writing package store index: %s', _e)
+    # pylint: enable=broad-except
+
+    def _touch(self, key):
+        """Marks a package as the most recently used."""
+        if key in self.entries:
+            self.entries[key][1] = time()
+
+    def _hold(self, key):
+        """Marks a package as in use so it isn't evicted while it's being placed. Call with
+        the store lock held."""
+        self._busy[key] = self._busy.get(key, 0) + 1
+
+    def _release(self, key):
+        """Marks a package as no longer in use. Call with the store lock held."""
+        self._busy[key] -= 1
+
+        if not self._busy[key]:
+            del self._busy[key]
+
+    def _place(self, source, dest):
+        """Places a file at 'dest' as a hard link, clone, or copy of 'source'. Clones and copies
+        are made alongside 'dest' and moved into place, so a partial file is never left at 'dest'."""
+        _dir = os.path.dirname(dest)
+
+        if _dir and not os.path.exists(_dir):
+            os.makedirs(_dir, exist_ok=True)
+
+        try:
+            os.link(source, dest)
+            LOG.debug('Linked %s -> %s', source, dest)
+        except OSError as _e:
+            if _e.errno not in [errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP]:
+                raise
+
+            _tmp = os.path.join(_dir, '{}{}'.format(self.TMP_PREFIX, os.path.basename(dest)))
+
+            # 'cp -c' clones the file (APFS), which costs no space or time if the volume is the same.
+            _cp = subprocess.Popen(['/bin/cp', '-c', source, _tmp], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            _, _cp_error = _cp.communicate()
+
+            if _cp.returncode == 0:
+                LOG.debug('Cloned %s -> %s', source, dest)
+            else:
+                LOG.debug('Clone of %s failed, copying: %s', source, _cp_error)
+                shutil.copyfile(source, _tmp)
+                LOG.debug('Copied %s -> %s', source, dest)
+
+            os.rename(_tmp, dest)
+
+    def _evict(self):
+        """Removes the least recently used packages until the store fits in 'max_size' bytes.
+        Packages being linked from are left until they're done."""
+        _total = self.total_size
+
+        for _key, (_size, _) in sorted(self.entries.items(), key=lambda _item: _item[1][1]):
+            if _total <= self._max_size:
+                break
+
+            if _key in self._busy:
+                continue
+
+            misc.clean_up(file_path=self._path(_key))
+            del self.entries[_key]
+            _total -= _size
+
+            LOG.debug('Evicted %s from package store (%s)', _key, misc.bytes2hr(byte=_size))
+
+    # pylint: disable=broad-except
+    def link(self, pkg, digest=None):
+        """Puts a stored package in place at its 'DownloadPath'. Returns the path of the stored
+        package, or 'None' if the package isn't in the store or already exists at the destination."""
+        result = None
+
+        _key = self.key(pkg, digest=digest)
+        _linking = False
+
+        with self._lock:
+            if _key in self.entries and not os.path.exists(pkg.DownloadPath):
+                self._hold(_key)
+                _linking = True
+
+        if _linking:
+            try:
+                self._place(self._path(_key), pkg.DownloadPath)
+                result = self._path(_key)
+            except Exception as _e:
+                LOG.debug('Error linking %s from package store: %s', _key, _e)
+
+            with self._lock:
+                self._release(_key)
+
+                if result:
+                    self._touch(_key)
+                    self._write_index()
+
+        return result
+
+    def add(self, pkg, digest=None):
+        """Adds a downloaded package at its 'DownloadPath' to the store, then removes the least
+        recently used packages if the store is too big."""
+        _key = self.key(pkg, digest=digest)
+        _adding = False
+
+        with self._lock:
+            if _key in self.entries:
+                self._touch(_key)
+                self._write_index()
+            elif _key not in self._busy and os.path.exists(pkg.DownloadPath) and os.path.getsize(pkg.DownloadPath):
+                # Held so another worker with the same package doesn't add it as well.
+                self._hold(_key)
+                _adding = True
+
+        if _adding:
+            _tmp = self._path('{}{}'.format(self.TMP_PREFIX, _key))
+            _size = None
+
+            try:
+                misc.clean_up(file_path=_tmp)
+                self._place(pkg.DownloadPath, _tmp)
+                os.rename(_tmp, self._path(_key))
+                _size = os.path.getsize(self._path(_key))
+                LOG.debug('Added %s to package store', _key)
+            except Exception as _e:
+                misc.clean_up(file_path=_tmp)
+                LOG.debug('Error adding %s to package store: %s', _key, _e)
+
+            with self._lock:
+                self._release(_key)
+
+                if _size is not None:
+                    self.entries[_key] = [_size, time()]
+                    self._evict()
+                    self._write_index()
+
+    def discard(self, pkg, digest=None):
+        """Removes a package from the store, such as when it's being forcibly downloaded again."""
+        _key = self.key(pkg, digest=digest)
+
+        with self._lock:
+            if _key in self.entries:
+                misc.clean_up(file_path=self._path(_key))
+                del self.entries[_key]
+                self._write_index()
+    # pylint: enable=broad-except
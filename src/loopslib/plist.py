@@ -1,40 +1,71 @@
 """Contains basic functions for reading/converting property lists."""
+import base64
+import hashlib
 import logging
+import marshal
+import os
 import plistlib
 import subprocess
+import tempfile
 import xml
 
+from datetime import datetime
 from distutils.version import LooseVersion
+from xml.etree import ElementTree
 
 # pylint: disable=relative-import
 try:
+    import config
+    import misc
     import version
 except ImportError:
+    from . import config
+    from . import misc
     from . import version
 # pylint: enable=relative-import
 
 LOG = logging.getLogger(__name__)
 
+# Magic number at the start of a binary property list.
+BINARY_HEADER = b'bplist00'
+
+# What an XML property list starts with, after any byte order mark and whitespace.
+XML_PROLOGS = (b'<?xml', b'<plist')
+
 
 class ConversionException(Exception):
     """Exception handler for converting binary property list to stdout string."""
     pass
 
 
+def plist_format(data):
+    """Returns the 'plistlib' format of property list data, from the binary magic number
+    or XML prolog at the start of it, or 'None' if it is neither."""
+    result = None
+
+    if not isinstance(data, bytes):
+        result = None
+    elif data[:len(BINARY_HEADER)] == BINARY_HEADER:
+        result = plistlib.FMT_BINARY
+    elif data[:256].lstrip(b'\xef\xbb\xbf \t\r\n').startswith(XML_PROLOGS):
+        result = plistlib.FMT_XML
+
+    return result
+
+
 def is_binary(plist_path):
-    """Checks if a plist is a binary or not."""
+    """Checks if a plist is a binary or not. Only the magic number is read."""
     result = False
+
     with open(plist_path, 'rb') as _f:
-        for _block in _f:
-            if b'\0' in _block:
-                result = True
-                break
+        result = _f.read(len(BINARY_HEADER)) == BINARY_HEADER
 
     return result
 
 
 def convert(obj):
-    """Converts a binary property list file and returns it as a string."""
+    """Converts a binary property list file and returns it as a string. Only needed on
+    Python versions without a binary property list reader in 'plistlib'."""
     result = None
 
     _err_chars = {
@@ -64,17 +95,348 @@ def convert(obj):
     return result
 
 
+def _scalar_value(tag, text):
+    """Returns the value of a property list XML scalar element, the same as 'plistlib' would."""
+    result = None
+
+    if tag == 'string':
+        result = text
+    elif tag == 'integer':
+        result = int(text, 16) if text.lower().startswith('0x') else int(text)
+    elif tag == 'real':
+        result = float(text)
+    elif tag in ['true', 'false']:
+        result = tag == 'true'
+    elif tag == 'date':
+        result = datetime.strptime(text, '%Y-%m-%dT%H:%M:%SZ')
+    elif tag == 'data':
+        result = base64.b64decode(''.join(text.split()))
+    else:
+        raise ValueError('Unsupported property list element {}'.format(tag))
+
+    return result
+
+
+class _PackagesTarget(object):
+    """'ElementTree.XMLParser' target that builds the values in the 'Packages' dict, and any
+    top level keys in 'capture', straight from the parser events. Everything else, such as
+    the 'PackageContentsUpdateData' blob, is skipped without being kept."""
+    # Depth 1 is '<plist>', 2 the root '<dict>', 3 its keys and values, and
+    # 4 the keys and values in those, such as each package in 'Packages'.
+    def __init__(self, capture):
+        self._capture = capture
+        self._depth = 0
+        self._top_key = None
+        self._pkg = None
+        self._stack = list()  # '[container, pending dict key]' for each dict/array being built
+        self._data = list()
+        self._collect = False
+
+        self.captured = dict()
+        self.packages = list()  # Packages parsed since the caller last took them
+
+    def _building(self):
+        """Returns 'True' if the current element is part of a value being kept."""
+        result = None
+
+        result = ((self._top_key == 'Packages' and self._depth >= 4) or
+                  (self._top_key in self._capture and self._depth >= 3))
+
+        return result
+
+    def _add(self, value):
+        """Adds a finished value to the container it belongs to."""
+        if self._stack:
+            _container, _key = self._stack[-1]
+
+            if isinstance(_container, dict):
+                _container[_key] = value
+            else:
+                _container.append(value)
+        elif self._depth == 3:
+            self.captured[self._top_key] = value
+            self._top_key = None
+        else:
+            self.packages.append((self._pkg, value))
+
+    def start(self, tag, attrib):  # pylint: disable=unused-argument
+        """Handles an element opening."""
+        self._depth += 1
+        self._data = list()
+        self._collect = tag == 'key' or self._building()
+
+        if self._building() and tag == 'dict':
+            self._stack.append([dict(), None])
+        elif self._building() and tag == 'array':
+            self._stack.append([list(), None])
+
+    def data(self, data):
+        """Handles text, only keeping it if it's needed."""
+        if self._collect:
+            self._data.append(data)
+
+    def end(self, tag):
+        """Handles an element closing."""
+        _text = ''.join(self._data)
+
+        if self._building():
+            if tag == 'key' and self._stack:
+                self._stack[-1][1] = _text
+            elif tag == 'key':
+                self._pkg = _text
+            elif tag in ['dict', 'array']:
+                self._add(self._stack.pop()[0])
+            else:
+                self._add(_scalar_value(tag, _text))
+        elif self._depth == 3 and tag == 'key':
+            self._top_key = _text
+        elif self._depth == 3:
+            self._top_key = None
+
+        self._data = list()
+        self._collect = False
+        self._depth -= 1
+
+    def close(self):
+        """Handles the end of the document."""
+        return None
+
+
+class PackagesReader(object):
+    """Class for streaming the packages in a feed file. Iterating yields
+    '(package name, package dict)' from the 'Packages' dict as they are parsed, without
+    keeping the whole document in memory. Other top level keys named in 'capture' (such
+    as 'Content') are parsed into 'captured' as they stream past, anything else is
+    discarded. Binary property lists can't be streamed, so are read in full. The file is
+    hashed as it is read, so once iterating finishes 'sha1' is the digest of its contents."""
+    # Bytes fed to the parser at a time.
+    CHUNK_SIZE = 65536
+
+    def __init__(self, plist_path, capture=None):
+        self._plist_path = plist_path
+        self._capture = set(capture or list())
+
+        self.captured = dict()
+        self.sha1 = None
+
+    def __iter__(self):
+        with open(self._plist_path, 'rb') as _f:
+            # Peek at the buffered start of the file, so it's still only read once.
+            if plist_format(_f.peek(len(BINARY_HEADER))) == plistlib.FMT_BINARY:
+                _pairs = self._read_binary(_f)
+            else:
+                _pairs = self._stream(_f)
+
+            for _pair in _pairs:
+                yield _pair
+
+    def _read_binary(self, fileobj):
+        """Reads a binary property list in full, yielding the packages."""
+        _data = fileobj.read()
+        self.sha1 = hashlib.sha1(_data).hexdigest()
+
+        # pylint: disable=no-member
+        _root = plistlib.loads(_data, fmt=plistlib.FMT_BINARY)
+        # pylint: enable=no-member
+
+        for _key in self._capture:
+            if _key in _root:
+                self.captured[_key] = _root[_key]
+
+        for _pkg, _value in _root.get('Packages', dict()).items():
+            yield _pkg, _value
+
+    def _stream(self, fileobj):
+        """Feeds an XML property list to the parser a chunk at a time, yielding the packages
+        parsed from each chunk."""
+        _target = _PackagesTarget(capture=self._capture)
+        _parser = ElementTree.XMLParser(target=_target)
+        _hash = hashlib.sha1()
+        self.captured = _target.captured
+
+        for _chunk in iter(lambda: fileobj.read(self.CHUNK_SIZE), b''):
+            _hash.update(_chunk)
+            _parser.feed(_chunk)
+
+            for _pair in _target.packages:
+                yield _pair
+
+            del _target.packages[:]
+
+        _parser.close()
+        self.sha1 = _hash.hexdigest()
+
+
+def _cache_dir():
+    """Returns the parsed property list cache folder, or None if it can't be trusted (see
+    'misc.cache_dir')."""
+    result = None
+
+    result = misc.cache_dir(os.path.join(config.CACHE_PATH, 'plists'))
+
+    return result
+
+
+def _cache_file(plist_path, cache_dir, kind):
+    """Returns the cache file for the property list, keyed by the file path and 'kind' (what
+    is cached from it)."""
+    result = None
+
+    _name = hashlib.sha1('{}:{}'.format(kind, os.path.realpath(plist_path)).encode('utf-8')).hexdigest()
+    result = os.path.join(cache_dir, '{}.marshal'.format(_name))
+
+    return result
+
+
+# pylint: disable=broad-except
+def _read_entry(cache_file):
+    """Returns the cache entry, a dict of the 'size', 'mtime', and 'sha1' of the file it was
+    cached from and the cached 'value', or 'None' if there isn't one."""
+    result = None
+
+    try:
+        # 'marshal.load' reads a file a value at a time, reading it in one go is much quicker.
+        with open(cache_file, 'rb') as _f:
+            result = marshal.loads(_f.read())
+    except Exception:
+        result = None
+
+    if not isinstance(result, dict):
+        result = None
+
+    return result
+
+
+def _write_entry(cache_file, entry):
+    """Writes the cache entry to a temporary file then moves it into place, so a partial
+    entry is never read. Entries are stored with 'marshal', which only writes plain values,
+    so property lists with dates aren't cached."""
+    try:
+        _fd, _tmp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+
+        try:
+            with os.fdopen(_fd, 'wb') as _f:
+                marshal.dump(entry, _f)
+
+            os.rename(_tmp_file, cache_file)
+        except Exception:
+            os.remove(_tmp_file)
+            raise
+    except Exception as _e:
+        LOG.debug('Error writing plist cache %s: %s', cache_file, _e)
+# pylint: enable=broad-except
+
+
+def _read_cached(plist_path, cache_dir):
+    """Returns the property list through the parsed property list cache. The entry is reused
+    when the size and modified time of the file match. If they don't match, the entry is
+    still reused if the file contents hash the same, otherwise the contents already read for
+    the hash are parsed."""
+    result = None
+
+    _stat = os.stat(plist_path)
+    _file = _cache_file(plist_path, cache_dir, kind='plist')
+    _entry = _read_entry(_file)
+
+    if _entry and (_entry['size'], _entry['mtime']) == (_stat.st_size, _stat.st_mtime):
+        LOG.debug('Plist cache hit: %s', plist_path)
+        result = _entry['value']
+    else:
+        with open(plist_path, 'rb') as _f:
+            _data = _f.read()
+
+        _digest = hashlib.sha1(_data).hexdigest()
+
+        if _entry and _entry['sha1'] == _digest:
+            LOG.debug('Plist cache hit (contents unchanged): %s', plist_path)
+            result = _entry['value']
+        else:
+            LOG.debug('Plist cache miss: %s', plist_path)
+            result = _load(plist_path, data=_data)
+
+        _write_entry(_file, {'size': _stat.st_size,
+                             'mtime': _stat.st_mtime,
+                             'sha1': _digest,
+                             'value': result})
+
+    return result
+
+
+def is_cached(plist_path):
+    """Returns 'True' if the property list is read through the parsed property list cache."""
+    result = None
+
+    result = bool(config.PLIST_CACHE and os.path.getsize(plist_path) >= config.PLIST_CACHE_MIN_SIZE)
+
+    return result
+
+
+class PackagesCache(object):
+    """The parsed property list cache entry for the packages of a feed file: a dict of the
+    'Packages' dict, and the top level keys in 'capture' (such as 'Content'). Only that is
+    kept, not the whole document. The entry is reused while the size and modified time of
+    the file match. Otherwise the file is streamed with 'PackagesReader', and what it yields
+    is collected and passed to 'put', so the file is only read once."""
+    def __init__(self, plist_path, capture=None):
+        self._plist_path = plist_path
+        self._capture = sorted(set(capture or list()))
+        self._stat = os.stat(plist_path)  # Before the file is read, so a later change is noticed.
+        self._cache_file = None
+
+        _cache = _cache_dir() if is_cached(plist_path) else None
+
+        if _cache:
+            self._cache_file = _cache_file(plist_path, _cache, kind='packages:{}'.format(','.join(self._capture)))
+
+    @property
+    def enabled(self):
+        """Returns 'True' if the packages are read through the cache."""
+        result = None
+
+        result = self._cache_file is not None
+
+        return result
+
+    def get(self):
+        """Returns the cached dict, or 'None' if there isn't an entry for the file as it is now."""
+        result = None
+
+        _entry = _read_entry(self._cache_file) if self.enabled else None
+
+        if _entry and (_entry['size'], _entry['mtime']) == (self._stat.st_size, self._stat.st_mtime):
+            LOG.debug('Plist cache hit: %s', self._plist_path)
+            result = _entry['value']
+        elif self.enabled:
+            LOG.debug('Plist cache miss: %s', self._plist_path)
+
+        return result
+
+    def put(self, value, sha1):
+        """Caches the dict collected while streaming the file, with the hash of the contents."""
+        if self.enabled:
+            _write_entry(self._cache_file, {'size': self._stat.st_size,
+                                            'mtime': self._stat.st_mtime,
+                                            'sha1': sha1,
+                                            'value': value})
+
+
 # pylint: disable=invalid-name
-def readPlist(plist_path):
-    """A wrapper function to read property list files with either Python 2 or Python 3 versions.
-    If the file is a binary file, and the Python version is 2.7+, the file is converted using 'plutil'."""
+def _load(plist_path, data=None):
+    """Reads a property list file with either Python 2 or Python 3 versions, without the
+    parsed property list cache. 'data' is the contents of the file if it has already been
+    read."""
     result = None
 
     # Python 3.4.0+ deprecates the old '.readPlist*' methods.
-    if LooseVersion(version.PYTHON_VER) > LooseVersion('3.4.0'):
+    if LooseVersion(version.PYTHON_VER) > LooseVersion('3.4.0') and data is not None:
+        # pylint: disable=no-member
+        result = plistlib.loads(data, fmt=plist_format(data))
+        # pylint: enable=no-member
+    elif LooseVersion(version.PYTHON_VER) > LooseVersion('3.4.0'):
+        # The format is worked out from the buffered start of the file, so it's only read once.
         with open(plist_path, 'rb') as plistfile:
             # pylint: disable=no-member
-            result = plistlib.load(plistfile)
+            result = plistlib.load(plistfile, fmt=plist_format(plistfile.peek(len(BINARY_HEADER))))
             # pylint: enable=no-member
     elif version.in_version_range('2.7.0', version.PYTHON_VER, '3.3.99'):
         if is_binary(plist_path):
@@ -86,6 +448,23 @@ def readPlist(plist_path):
     return result
 
 
+def readPlist(plist_path):
+    """A wrapper function to read property list files with either Python 2 or Python 3 versions.
+    If the file is a binary file, and the Python version is 2.7+, the file is converted with 'convert'.
+    Files of at least 'config.PLIST_CACHE_MIN_SIZE' bytes are read through the parsed property
+    list cache."""
+    result = None
+
+    _cache = _cache_dir() if is_cached(plist_path) else None
+
+    if _cache:
+        result = _read_cached(plist_path, cache_dir=_cache)
+    else:
+        result = _load(plist_path)
+
+    return result
+
+
 def readPlistFromString(obj):
     """A wrapper function to read property lists from string with either Python 2 or Python 3 versions."""
     result = None
@@ -93,7 +472,7 @@ def readPlistFromString(obj):
     # Python 3.4.0+ deprecates the old '.readPlist*' methods.
     if LooseVersion(version.PYTHON_VER) > LooseVersion('3.4.0'):
         # pylint: disable=no-member
-        result = plistlib.loads(obj)
+        result = plistlib.loads(obj, fmt=plist_format(obj))
         # pylint: enable=no-member
     elif version.in_version_range('2.7.0', version.PYTHON_VER, '3.3.99'):
         try:
@@ -2,19 +2,28 @@
 import logging
 import sys
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # pylint: disable=relative-import
 try:
     import applications
     import config
+    import feed
+    import journal
     import misc
+    import package
     import remote_plist
+    import timing
 except ImportError:
     from . import applications
     from . import config
+    from . import feed
+    from . import journal
     from . import misc
+    from . import package
     from . import remote_plist
+    from . import timing
 # pylint: enable=relative-import
 
 LOG = logging.getLogger(__name__)
@@ -44,20 +53,21 @@ class ProcessedSource(object):
                     print(_apps_discovered_msg)
 
                 LOG.info(_apps_discovered_msg)
+
+                # Parse each app's feed file at the same time.
+                self._load_all(lambda _app: _app.feed, self._apps)
             else:
                 self._apps = None
 
         if plists:
             if isinstance(plists, list):
-                self._plists = list()
-
-                for _plist in plists:
-                    _pl = remote_plist.RemotePlist(obj=_plist)
-
-                    self._plists.append(_pl)
+                # Download and parse each property list at the same time.
+                self._plists = self._load_all(lambda _plist: remote_plist.RemotePlist(obj=_plist), plists)
             else:
                 self._plists = None
 
+        feed.shutdown()
+
         self._valid_pkg_types = ['mandatory', 'optional']
         self._valid_sze_types = ['DownloadSize', 'InstalledSize']
 
@@ -117,27 +127,27 @@ class ProcessedSource(object):
             for _pkg in self.all:
                 _mand_or_opt = 'Mandatory' if _pkg.IsMandatory else 'Optional'
 
-                LOG.debug('Package to process: {} ({})'.format(_pkg.PackageName, _mand_or_opt))
+                LOG.debug('Package to process: %s (%s)', _pkg.PackageName, _mand_or_opt)
 
         # Quantities of each
         self.all_qty = len(self.all)
         self.mandatory_qty = len(self.mandatory)
         self.optional_qty = len(self.optional)
 
-        self.mandatory_download_size = self._mandatory_download_size()
-        self.optional_download_size = self._optional_download_size()
+        # Sizes of packages not installed, totalled in one pass over each set.
+        _sizes = self._sizes()
+
+        self.mandatory_download_size, self.mandatory_install_size = _sizes['mandatory']
+        self.optional_download_size, self.optional_install_size = _sizes['optional']
 
         self.mandatory_download_size_hr = self._mandatory_download_size_hr()
         self.optional_download_size_hr = self._optional_download_size_hr()
 
-        self.mandatory_install_size = self._mandatory_install_size()
-        self.optional_install_size = self._optional_install_size()
-
         self.mandatory_install_size_hr = self._mandatory_install_size_hr()
         self.optional_install_size_hr = self._optional_install_size_hr()
 
-        self.all_download_size = self._all_download_size()
-        self.all_install_size = self._all_install_size()
+        self.all_download_size = self.mandatory_download_size + self.optional_download_size
+        self.all_install_size = self.mandatory_install_size + self.optional_install_size
 
         if config.DMG_DEPLOY_FILE:
             self.total_size_req = self.all_install_size
@@ -209,14 +219,32 @@ class ProcessedSource(object):
             self.stats_message = '{}\n{}'.format(self.mandatory_dld_ins_msg,
                                                  self.stats_message)
 
+    def _load_all(self, func, sources):
+        """Calls 'func' with each source on a thread pool of up to 'config.ANALYSIS_JOBS'
+        threads. Results are returned in the same order as 'sources', so the packages
+        found (and which source a duplicate package comes from) are the same every run."""
+        result = None
+
+        _jobs = max(1, min(len(sources), config.ANALYSIS_JOBS))
+        _start = datetime.now()
+
+        with timing.TIMINGS.span('load sources'), ThreadPoolExecutor(max_workers=_jobs) as _pool:
+            result = list(_pool.map(func, sources))
+
+        LOG.debug('Loaded %s sources on %s threads in %s', len(sources), _jobs, datetime.now() - _start)
+
+        return result
+
     def _get_pkgs(self, pkg_type):
         """Returns a set of all mandatory or optional packages not installed.
         When 'config.DEPLOY_PKGS' is 'False', packages are considered not installed
-        by default."""
+        by default. Packages the run journal has as installed are skipped without
+        checking receipts."""
         result = None
 
         _source = None
         _result = set()
+        _deploying = config.DEPLOY_PKGS or config.FORCED_DEPLOYMENT
 
         if pkg_type in self._valid_pkg_types:
             if self._apps:
@@ -226,12 +254,16 @@ class ProcessedSource(object):
                 _source = self._plists
 
             if _source:
-                for _src in _source:
-                    _packages = getattr(_src, '{}_pkgs'.format(pkg_type))
+                with timing.TIMINGS.span('{} package states'.format(pkg_type)):
+                    for _src in _source:
+                        _packages = getattr(_src, '{}_pkgs'.format(pkg_type))
 
-                    for _pkg in _packages:
-                        if not _pkg.IsInstalled:
-                            _result.add(_pkg)
+                        for _pkg in _packages:
+                            if _deploying and journal.JOURNAL.installed(_pkg):
+                                LOG.debug('Skipping %s, installed in an earlier run', _pkg.DownloadName)
+                                timing.TIMINGS.count('packages skipped by journal')
+                            elif not _pkg.IsInstalled:
+                                _result.add(_pkg)
 
         if _result:
             result = _result
@@ -247,16 +279,16 @@ class ProcessedSource(object):
                 if _pkg in self.mandatory:
                     self.optional.remove(_pkg)
 
-    def _all_download_size(self):
-        """Returns the download size in bytes for all packages not installed."""
-        result = 0
-        _mandatory = 0
-        _optional = 0
+    def _sizes(self):
+        """Returns the download and install sizes in bytes of the mandatory and optional
+        packages not installed, totalled over the columns of a package table."""
+        result = dict()
 
-        _mandatory = sum([_pkg.DownloadSize for _pkg in self.mandatory])
-        _optional = sum([_pkg.DownloadSize for _pkg in self.optional])
+        _table = package.PackageTable(list(self.mandatory) + list(self.optional))
 
-        result = _mandatory + _optional
+        for _pkg_type, _mandatory in [('mandatory', True), ('optional', False)]:
+            _mask = _table.mask(mandatory=_mandatory, installed=False)
+            result[_pkg_type] = [_table.total('download_sizes', _mask), _table.total('installed_sizes', _mask)]
 
         return result
 
@@ -264,15 +296,7 @@ class ProcessedSource(object):
         """Returns the download size in human readable format for all packages not installed."""
         result = None
 
-        result = misc.bytes2hr(byte=self._all_download_size())
-
-        return result
-
-    def _all_install_size(self):
-        """Returns the install size in bytes for all packages not installed."""
-        result = None
-
-        result = sum([_pkg.InstalledSize for _pkg in self.all if not _pkg.IsInstalled])
+        result = misc.bytes2hr(byte=self.all_download_size)
 
         return result
 
@@ -284,22 +308,6 @@ class ProcessedSource(object):
 
         return result
 
-    def _mandatory_download_size(self):
-        """Returns the downlod size in bytes for all mandatory packages not installed."""
-        result = 0
-
-        result = sum([_pkg.DownloadSize for _pkg in self.mandatory if not _pkg.IsInstalled])
-
-        return result
-
-    def _optional_download_size(self):
-        """Returns the downlod size in bytes for all optional packages not installed."""
-        result = None
-
-        result = sum([_pkg.DownloadSize for _pkg in self.optional if not _pkg.IsInstalled])
-
-        return result
-
     def _mandatory_download_size_hr(self):
         """Returns the downlod size in human readable format for all mandatory packages not installed."""
         result = None
@@ -316,22 +324,6 @@ class ProcessedSource(object):
 
         return result
 
-    def _mandatory_install_size(self):
-        """Returns the downlod size in bytes for all mandatorypackages not installed."""
-        result = None
-
-        result = sum([_pkg.InstalledSize for _pkg in self.mandatory if not _pkg.IsInstalled])
-
-        return result
-
-    def _optional_install_size(self):
-        """Returns the downlod size in bytes for all optional packages not installed."""
-        result = None
-
-        result = sum([_pkg.InstalledSize for _pkg in self.optional if not _pkg.IsInstalled])
-
-        return result
-
     def _mandatory_install_size_hr(self):
         """Returns the downlod size in human readable format for all mandatorypackages not installed."""
         result = None
@@ -5,21 +5,15 @@ import tempfile
 
 # pylint: disable=relative-import
 try:
-    import bad_wolf
     import config
-    import curl_requests
+    import feed
+    import http_client
     import misc
-    import option_packs
-    import package
-    import plist
 except ImportError:
-    from . import bad_wolf
     from . import config
-    from . import curl_requests
+    from . import feed
+    from . import http_client
     from . import misc
-    from . import option_packs
-    from . import package
-    from . import plist
 # pylint: enable=relative-import
 
 LOG = logging.getLogger(__name__)
@@ -33,6 +27,7 @@ class RemotePlist(object):
         self._plist_url_path = misc.plist_url_path(self._plist)
         self._plist_failover_url_path = os.path.join(config.AUDIOCONTENT_FAILOVER_URL, 'lp10_ms3_content_2016', self._plist)
 
+        self._feed = None
         self._all_packages = self._read_remote_plist()
 
         # Empty attr for option packs.
@@ -45,10 +40,7 @@ class RemotePlist(object):
         _basename = os.path.basename(self._plist_url_path)
         _tmp_file = os.path.join(self._tmp_dir, _basename)
 
-        _bad_wolf_fixes = bad_wolf.BAD_WOLF_PKGS.get(_basename, None)
-        _bwd = None
-
-        _req = curl_requests.CURL(url=self._plist_url_path)
+        _req = http_client.new_request(url=self._plist_url_path)
 
         # NOTE 2019-11-04: Seems that using the 'resume' capability in cURL does not
         # work here now for some reason, so don't resume.
@@ -57,37 +49,13 @@ class RemotePlist(object):
         else:
             _req.get(url=self._plist_failover_url_path, output=_tmp_file, resume=False)
 
-        _root = plist.readPlist(_tmp_file)
-
-        if _root:
-            result = set()
-
-            # Apply 'Bad Wolf' pathches
-            for _pkg in _root['Packages']:
-                _new_pkg = _root['Packages'][_pkg].copy()  # Work on copy
-
-                # Create a new key called 'PackageName' that
-                # contains the value '_pkg' for use with content packs.
-                _new_pkg['PackageName'] = _pkg
-
-                if _bad_wolf_fixes:
-                    _bwd = _bad_wolf_fixes.get(_pkg, None)  # A dictionary from '_bad_wolf_fixes'
-
-                # Merge new/existing keys from matching '_bwd'
-                if _bwd:
-                    _new_pkg.update(_bwd)
-
-                _pkg_obj = package.LoopPackage(**_new_pkg)
+        self._feed = feed.load(_tmp_file)
 
-                # pylint: disable=no-member
-                # Only add/process packages that are _not_ 'BadWolfIgnore = True'
-                if not _pkg_obj.BadWolfIgnore:
-                    result.add(_pkg_obj)
-                # pylint: enable=no-member
+        if self._feed:
+            result = self._feed.packages
 
             # Now process option packs
-            _opt_packs = option_packs.OptionPack(source=_root, release=_basename)
-            self.option_packs = _opt_packs.option_packs
+            self.option_packs = self._feed.option_packs
 
         misc.clean_up(file_path=_tmp_file)
 
@@ -98,7 +66,7 @@ class RemotePlist(object):
         """Returns the mandatory packages as objects in a set."""
         result = None
 
-        result = set([_pkg for _pkg in self._all_packages if _pkg.IsMandatory])
+        result = set(self._feed.mandatory_pkgs)
 
         return result
 
@@ -107,6 +75,6 @@ class RemotePlist(object):
         """Returns the optional packages as objects in a set."""
         result = None
 
-        result = set([_pkg for _pkg in self._all_packages if not _pkg.IsMandatory])
+        result = set(self._feed.optional_pkgs)
 
         return result
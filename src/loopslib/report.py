@@ -0,0 +1,159 @@
+"""Contains the run report, a JSON lines record of each package processed for collecting from
+many Macs without parsing the log."""
+import json
+import logging
+import os
+import sys
+
+from threading import Lock
+from time import time
+
+# pylint: disable=relative-import
+try:
+    import config
+    import version
+except ImportError:
+    from . import config
+    from . import version
+# pylint: enable=relative-import
+
+LOG = logging.getLogger(__name__)
+
+# Package results.
+DOWNLOADED = 'downloaded'
+INSTALLED = 'installed'
+FAILED = 'failed'
+DRY_RUN = 'dry run'
+
+
+class RunReport(object):
+    """Streams a run as JSON lines to 'config.REPORT', written as the run goes so a partial
+    run still has a report. The first line is a 'run' record of the packages found, then a
+    'package' record as each package is finished, and a 'totals' record at the end. Details
+    of a package are gathered with 'update()' as it's downloaded and installed, and written
+    by 'finish()'."""
+    def __init__(self, report_path=None):
+        self._report_path = report_path
+        self._lock = Lock()
+        self._pending = dict()  # {DownloadName: record}, packages not finished yet
+        self._start = None
+
+        self.totals = {'packages': 0, DOWNLOADED: 0, INSTALLED: 0, FAILED: 0, DRY_RUN: 0,
+                       'bytes': 0, 'download_seconds': 0.0, 'install_seconds': 0.0}
+
+    @property
+    def report_path(self):
+        """The report file. Defaults to 'config.REPORT'."""
+        result = None
+
+        result = self._report_path if self._report_path else config.REPORT
+
+        return result
+
+    @property
+    def enabled(self):
+        """Returns 'True' if a report is being written."""
+        result = None
+
+        result = bool(self.report_path)
+
+        return result
+
+    def _write(self, record_type, record):
+        """Appends a record to the report, flushed so it's there if the run is killed."""
+        _record = dict(record, type=record_type, time=round(time(), 3))
+
+        with open(self.report_path, 'a') as _f:
+            _f.write('{}\n'.format(json.dumps(_record, sort_keys=True)))
+            _f.flush()
+
+    def start(self, packages):
+        """Starts a new report with a 'run' record of the packages found in the 'ProcessedSource'."""
+        if self.enabled:
+            self._start = time()
+            _dir = os.path.dirname(self.report_path)
+
+            if _dir and not os.path.exists(_dir):
+                os.makedirs(_dir, exist_ok=True)
+
+            with self._lock:
+                open(self.report_path, 'w').close()
+                self._write('run', {'version': version.VERSION,
+                                    'arguments': sys.argv[1:],
+                                    'dry_run': bool(config.DRY_RUN),
+                                    'deploying': bool(config.DEPLOY_PKGS or config.FORCED_DEPLOYMENT),
+                                    'packages': packages.all_qty,
+                                    'mandatory_packages': packages.mandatory_qty,
+                                    'optional_packages': packages.optional_qty,
+                                    'download_size': packages.all_download_size,
+                                    'install_size': packages.all_install_size,
+                                    'mandatory_download_size': packages.mandatory_download_size,
+                                    'optional_download_size': packages.optional_download_size})
+
+    def update(self, pkg, **kwargs):
+        """Adds details to the record of a package. A 'fallback' is added to the package's
+        list of fallback reasons, and only the first 'error' is kept as it's the cause."""
+        if self.enabled:
+            with self._lock:
+                _record = self._pending.setdefault(pkg.DownloadName, {'name': pkg.DownloadName,
+                                                                      'package_id': pkg.PackageID,
+                                                                      'version': str(pkg.PackageVersion),
+                                                                      'size': pkg.DownloadSize,
+                                                                      'mandatory': pkg.IsMandatory,
+                                                                      'source': None,
+                                                                      'url': None,
+                                                                      'bytes': 0,
+                                                                      'download_seconds': None,
+                                                                      'install_seconds': None,
+                                                                      'fallbacks': list()})
+
+                if 'fallback' in kwargs:
+                    _record['fallbacks'].append(kwargs.pop('fallback'))
+
+                if kwargs.get('error') is not None:
+                    kwargs['error'] = _record.get('error') or str(kwargs['error'])
+
+                _record.update(kwargs)
+
+    def finish(self, pkg):
+        """Writes the record of a package. The result is 'downloaded', 'installed', or 'dry run'
+        as set by 'update()', or 'failed' if no result was set."""
+        if self.enabled:
+            self.update(pkg)
+
+            with self._lock:
+                _record = self._pending.pop(pkg.DownloadName)
+                _record.setdefault('error', None)
+                _result = _record.setdefault('result', FAILED)
+
+                for _key in ['download_seconds', 'install_seconds']:
+                    if _record[_key] is not None:
+                        _record[_key] = round(_record[_key], 6)
+
+                self._write('package', _record)
+
+                self.totals['packages'] += 1
+                self.totals[_result] = self.totals.get(_result, 0) + 1
+                self.totals['bytes'] += _record['bytes'] or 0
+                self.totals['download_seconds'] += _record['download_seconds'] or 0
+                self.totals['install_seconds'] += _record['install_seconds'] or 0
+
+    def close(self):
+        """Writes the 'totals' record, with the packages not finished (such as when a run is
+        interrupted) counted as failed."""
+        if self.enabled and self._start is not None:
+            with self._lock:
+                _totals = dict(self.totals)
+                _totals[FAILED] += len(self._pending)
+                _totals['unfinished'] = sorted(self._pending)
+                _totals['wall_seconds'] = round(time() - self._start, 3)
+                _totals['download_seconds'] = round(_totals['download_seconds'], 3)
+                _totals['install_seconds'] = round(_totals['install_seconds'], 3)
+                _totals['bytes_per_second'] = (int(_totals['bytes'] / _totals['download_seconds'])
+                                               if _totals['download_seconds'] else None)
+                self._write('totals', _totals)
+
+            LOG.info('Wrote run report to {}'.format(self.report_path))
+
+
+REPORT = RunReport()
@@ -0,0 +1,207 @@
+"""Contains the source selector, which picks the mirror, caching server, or Apple for each package."""
+import logging
+
+from threading import Lock
+
+# pylint: disable=relative-import
+try:
+    import config
+    import misc
+except ImportError:
+    from . import config
+    from . import misc
+# pylint: enable=relative-import
+
+LOG = logging.getLogger(__name__)
+
+# Source names, in the order they're tried before anything is known about them.
+MIRROR = 'mirror'
+CACHING_SERVER = 'caching server'
+APPLE = 'apple'
+
+# Downloads smaller than this say more about latency than throughput, so aren't counted.
+MIN_THROUGHPUT_BYTES = 1048576
+
+# Bytes read from the start of a package when probing a source, just enough to count
+# towards its throughput.
+PROBE_BYTES = MIN_THROUGHPUT_BYTES
+
+
+class SourceStats(object):
+    """Exponentially weighted moving averages of the latency, throughput, and error rate of
+    a source, along with totals for the end of run summary."""
+    def __init__(self, name, alpha):
+        self.name = name
+        self._alpha = alpha
+
+        self.latency = None  # Seconds
+        self.throughput = None  # Bytes per second
+        self.error_rate = 0.0
+
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.last_used = 0
+
+    def _ewma(self, average, value):
+        """Returns the new moving average with 'value' added."""
+        result = None
+
+        result = value if average is None else self._alpha * value + (1 - self._alpha) * average
+
+        return result
+
+    def add(self, latency=None, size=None, seconds=None, error=False):
+        """Adds the result of a request to the averages."""
+        self.requests += 1
+        self.errors += 1 if error else 0
+        self.error_rate = self._ewma(self.error_rate, 1.0 if error else 0.0)
+
+        if latency is not None:
+            self.latency = self._ewma(self.latency, latency)
+
+        if size and seconds and size >= MIN_THROUGHPUT_BYTES:
+            self.bytes += size
+            self.seconds += seconds
+            self.throughput = self._ewma(self.throughput, size / seconds)
+
+    def expected_time(self, size):
+        """Returns the expected seconds to download 'size' bytes, allowing for retries on
+        errors. Returns 'None' until the source has been used."""
+        result = None
+
+        if self.latency is not None:
+            _transfer = size / self.throughput if self.throughput else 0
+            result = (self.latency + _transfer) / max(1 - self.error_rate, 0.05)
+
+        return result
+
+
+class SourceSelector(object):
+    """Tracks how each source performs during a run, and orders the sources for each package
+    so the one expected to be quickest is tried first. Sources are first tried in the usual
+    mirror, caching server, Apple order. A source that hasn't been used for
+    'config.SOURCE_PROBE_INTERVAL' packages is due a probe, a HEAD request and a read of the
+    first 'PROBE_BYTES' of the package, which are added to its averages. A source that has
+    recovered wins packages back without a whole package being downloaded from it to find
+    out, and a slow source isn't given whole packages just to check it. For packages big enough
+    for throughput to count, a source without a measured throughput is ordered after those
+    with one. Apple is always tried last if it isn't the best source, as it's the
+    authoritative source."""
+    def __init__(self, alpha=None, probe_interval=None):
+        self._alpha = alpha if alpha else config.SOURCE_EWMA_ALPHA
+        self._probe_interval = probe_interval if probe_interval else config.SOURCE_PROBE_INTERVAL
+        self._lock = Lock()
+        self._selections = 0
+
+        self.stats = dict()
+
+    def _stats(self, name):
+        """Returns the stats for a source, creating them the first time."""
+        result = self.stats.get(name)
+
+        if not result:
+            result = SourceStats(name, alpha=self._alpha)
+            self.stats[name] = result
+
+        return result
+
+    # pylint: disable=no-self-use
+    def sources(self, pkg):
+        """Returns a list of '(name, url)' for the sources a package can be downloaded from,
+        in the usual order."""
+        result = list()
+
+        if pkg.LocalDownloadURL:
+            result.append((MIRROR, pkg.LocalDownloadURL))
+
+        if pkg.CacheDownloadURL:
+            result.append((CACHING_SERVER, pkg.CacheDownloadURL))
+
+        result.append((APPLE, pkg.DownloadURL))
+
+        return result
+    # pylint: enable=no-self-use
+
+    def probes(self, pkg):
+        """Returns the sources for a package that are due a probe, as a list of '(name, url)'.
+        Each source is only returned once every 'config.SOURCE_PROBE_INTERVAL' packages, the
+        caller sends the probe and records the result with 'record()'."""
+        result = list()
+
+        if len(self.sources(pkg)) > 1:
+            with self._lock:
+                for _name, _url in self.sources(pkg):
+                    _stats = self._stats(_name)
+
+                    if self._selections - _stats.last_used > self._probe_interval:
+                        _stats.last_used = self._selections
+                        result.append((_name, _url))
+
+        return result
+
+    def candidates(self, pkg):
+        """Returns the sources for a package as a list of '(name, url)', best first, with
+        Apple last unless it's the best."""
+        result = None
+
+        _sources = self.sources(pkg)
+        _size = pkg.DownloadSize or 0
+
+        with self._lock:
+            self._selections += 1
+
+            def _key(item):
+                """Sorts sources not used yet first, in the usual order, then by expected time,
+                with sources that have no measured throughput after those that do. Apple isn't
+                tried until it's been measured, so it isn't used while a mirror or caching
+                server is working well."""
+                _index, (_name, _) = item
+                _stats = self._stats(_name)
+                _expected = _stats.expected_time(_size)
+                _no_rate = _size >= MIN_THROUGHPUT_BYTES and _stats.throughput is None
+
+                if _expected is None and _name != APPLE:
+                    _order = (0, _index, 0)
+                elif _expected is None:
+                    _order = (2, _index, 0)
+                else:
+                    _order = (1, int(_no_rate), _expected)
+
+                return _order
+
+            result = [_source for _, _source in sorted(enumerate(_sources), key=_key)]
+
+            if result[0][0] != APPLE:
+                result = [_source for _source in result if _source[0] != APPLE] + [_sources[-1]]
+
+            self._stats(result[0][0]).last_used = self._selections
+
+        if len(_sources) > 1:
+            LOG.debug('Sources for %s: %s', pkg.DownloadName, ', '.join(_name for _name, _ in result))
+
+        return result
+
+    def record(self, name, latency=None, size=None, seconds=None, error=False):
+        """Records the result of a request to a source."""
+        with self._lock:
+            _stats = self._stats(name)
+            _stats.add(latency=latency, size=size, seconds=seconds, error=error)
+            _stats.last_used = self._selections
+
+    def log_stats(self):
+        """Logs a summary of each source used."""
+        with self._lock:
+            for _stats in sorted(self.stats.values(), key=lambda _s: _s.name):
+                if not _stats.requests:
+                    continue
+
+                _rate = misc.bytes2hr(byte=int(_stats.bytes / _stats.seconds)) if _stats.seconds else 'n/a'
+                _latency = '{:.0f}ms'.format(_stats.latency * 1000) if _stats.latency is not None else 'n/a'
+
+                LOG.info('Source {}: {} requests, {} errors, {} downloaded at {}/s, latency {}'.format(
+                    _stats.name, _stats.requests, _stats.errors, misc.bytes2hr(byte=_stats.bytes), _rate, _latency))
+
+
+SELECTOR = SourceSelector()
@@ -0,0 +1,138 @@
+"""Contains the run timings, spans and counters for each phase of a run, such as parsing feed
+files, HEAD requests, downloads, and installs."""
+import json
+import logging
+
+from threading import Lock
+from time import time
+
+# pylint: disable=relative-import
+try:
+    import config
+    import misc
+except ImportError:
+    from . import config
+    from . import misc
+# pylint: enable=relative-import
+
+LOG = logging.getLogger(__name__)
+
+
+def percentile(values, percent):
+    """Returns the nearest rank 'percent' percentile of the sorted list 'values'."""
+    result = None
+
+    if values:
+        result = values[min(len(values) - 1, max(0, int(round(percent / 100.0 * len(values))) - 1))]
+
+    return result
+
+
+class Span(object):
+    """Times a block of code as a context manager, and adds it to the timings on exit. Set
+    'bytes' inside the block to record the bytes transferred. Spans that raise an exception
+    are counted as '<name> errors' as well."""
+    def __init__(self, timings, name):
+        self._timings = timings
+        self._start = None
+
+        self.name = name
+        self.bytes = None
+
+    def __enter__(self):
+        self._start = time()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._timings.add(self.name, seconds=time() - self._start, size=self.bytes)
+
+        if exc_type:
+            self._timings.count('{} errors'.format(self.name))
+
+
+class Timings(object):
+    """Seconds and bytes of each span, and counters, recorded during a run. Spans are cheap,
+    a time stamp on entry and exit and an append, so they're always recorded."""
+    def __init__(self):
+        self._lock = Lock()
+
+        self.spans = dict()  # {name: [[seconds, ...], bytes]}
+        self.counters = dict()
+
+    def span(self, name):
+        """Returns a 'Span' that times a block of code as 'name'."""
+        result = None
+
+        result = Span(self, name)
+
+        return result
+
+    def add(self, name, seconds, size=None):
+        """Adds a span that took 'seconds' and transferred 'size' bytes."""
+        with self._lock:
+            _span = self.spans.setdefault(name, [list(), 0])
+            _span[0].append(seconds)
+            _span[1] += size if size and size > 0 else 0
+
+    def count(self, name, value=1):
+        """Adds 'value' to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """Returns the count, total, median and 95th percentile seconds, and the bytes and
+        bytes a second of each span, keyed by span name."""
+        result = dict()
+
+        with self._lock:
+            for _name, (_seconds, _bytes) in self.spans.items():
+                _sorted = sorted(_seconds)
+                _total = sum(_sorted)
+
+                result[_name] = {'count': len(_sorted),
+                                 'total_s': round(_total, 6),
+                                 'p50_s': round(percentile(_sorted, 50), 6),
+                                 'p95_s': round(percentile(_sorted, 95), 6),
+                                 'bytes': _bytes,
+                                 'bytes_per_s': int(_bytes / _total) if _bytes and _total else None}
+
+        return result
+
+    def log_summary(self):
+        """Logs a table of the spans and counters recorded."""
+        _summary = self.summary()
+
+        if _summary:
+            _width = max(len(_name) for _name in _summary)
+            _lines = ['{:<{w}}  {:>6}  {:>10}  {:>9}  {:>9}  {:>10}  {:>10}'.format(
+                'Span', 'Count', 'Total', 'p50', 'p95', 'Bytes', 'Per second', w=_width)]
+
+            for _name, _span in sorted(_summary.items()):
+                _lines.append('{:<{w}}  {:>6}  {:>9.2f}s  {:>8.3f}s  {:>8.3f}s  {:>10}  {:>10}'.format(
+                    _name, _span['count'], _span['total_s'], _span['p50_s'], _span['p95_s'],
+                    misc.bytes2hr(byte=_span['bytes']) if _span['bytes'] else '-',
+                    misc.bytes2hr(byte=_span['bytes_per_s']) if _span['bytes_per_s'] else '-', w=_width))
+
+            LOG.info('Timings:\n{}'.format('\n'.join(_lines)))
+
+        if self.counters:
+            LOG.info('Counters: {}'.format(', '.join('{}: {}'.format(_name, _value)
+                                                     for _name, _value in sorted(self.counters.items()))))
+
+    def write_report(self, report_path=None):
+        """Writes the spans and counters as JSON to 'report_path' (default is
+        'config.TIMING_REPORT')."""
+        _report_path = report_path if report_path else config.TIMING_REPORT
+
+        if _report_path:
+            with self._lock:
+                _counters = dict(self.counters)
+
+            with open(_report_path, 'w') as _f:
+                json.dump({'spans': self.summary(), 'counters': _counters}, _f, indent=2, sort_keys=True)
+
+            LOG.info('Wrote timing report to {}'.format(_report_path))
+
+
+TIMINGS = Timings()
@@ -0,0 +1,337 @@
+"""Contains functions for checking downloaded packages against a manifest of known good hashes."""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sys
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+# pylint: disable=relative-import
+try:
+    import config
+    import misc
+except ImportError:
+    from . import config
+    from . import misc
+# pylint: enable=relative-import
+
+LOG = logging.getLogger(__name__)
+
+# Hash algorithm used for manifests and the hash cache.
+ALGORITHM = 'sha256'
+
+
+class VerificationError(Exception):
+    """Exception raised when a package doesn't match the manifest."""
+    pass
+
+
+def manifest_key(file_path):
+    """Returns the manifest key for a package, the package folder and file name, such as
+    'lp10_ms3_content_2016/<DownloadName>', so any destination can be checked."""
+    result = None
+
+    result = '/'.join(os.path.abspath(file_path).split(os.sep)[-2:])
+
+    return result
+
+
+def hasher(file_path=None, length=None):
+    """Returns a new hash object, updated with the first 'length' bytes (or all) of 'file_path'
+    if given. The file is memory mapped, so it is hashed straight from the page cache without
+    being copied into Python."""
+    result = None
+
+    result = hashlib.new(ALGORITHM)
+
+    if file_path:
+        with open(file_path, 'rb') as _f:
+            if os.fstat(_f.fileno()).st_size:
+                with mmap.mmap(_f.fileno(), 0, access=mmap.ACCESS_READ) as _map:
+                    result.update(memoryview(_map)[:length])
+
+    return result
+
+
+def hash_file(file_path):
+    """Returns the hash of a file."""
+    result = None
+
+    result = hasher(file_path).hexdigest()
+
+    return result
+
+
+class DigestCache(object):
+    """Cache of file hashes, keyed by the real path of a file, and reused while the size and
+    modified time of the file match. Saved to 'config.CACHE_PATH' with 'save()'. A cached hash
+    stands in for hashing the file when checking it against a manifest, so the cache is only
+    read or saved if its folder can't be changed by other users (see 'misc.cache_dir')."""
+    def __init__(self, cache_file=None):
+        self._cache_file = cache_file
+        self._lock = Lock()
+        self._entries = None  # {path: [size, mtime, hash]}, read the first time it's needed
+        self._changed = False
+
+    @property
+    def cache_file(self):
+        """The cache file. Defaults to 'digests.json' in 'config.CACHE_PATH'."""
+        result = None
+
+        result = self._cache_file if self._cache_file else os.path.join(config.CACHE_PATH, 'digests.json')
+
+        return result
+
+    # pylint: disable=broad-except
+    @property
+    def entries(self):
+        """Returns the cached hashes, reading the cache file the first time."""
+        result = None
+
+        if self._entries is None:
+            try:
+                if misc.cache_dir(os.path.dirname(self.cache_file)):
+                    with open(self.cache_file, 'r') as _f:
+                        self._entries = json.load(_f)
+            except Exception:
+                pass
+
+            if not isinstance(self._entries, dict):
+                self._entries = dict()
+
+        result = self._entries
+
+        return result
+    # pylint: enable=broad-except
+
+    # pylint: disable=no-self-use
+    def _stamp(self, file_path):
+        """Returns the cache key and the size and modified time of a file."""
+        result = None
+
+        _stat = os.stat(file_path)
+        result = (os.path.realpath(file_path), _stat.st_size, _stat.st_mtime_ns)
+
+        return result
+    # pylint: enable=no-self-use
+
+    def get(self, file_path):
+        """Returns the cached hash of a file, or 'None' if it isn't cached or the file changed."""
+        result = None
+
+        _key, _size, _mtime = self._stamp(file_path)
+
+        with self._lock:
+            _entry = self.entries.get(_key)
+
+        if _entry and _entry[:2] == [_size, _mtime]:
+            result = _entry[2]
+
+        return result
+
+    def add(self, file_path, digest):
+        """Caches the hash of a file, as it is now."""
+        _key, _size, _mtime = self._stamp(file_path)
+
+        with self._lock:
+            self.entries[_key] = [_size, _mtime, digest]
+            self._changed = True
+
+    # pylint: disable=broad-except
+    def save(self):
+        """Writes the cache, if it changed, to a temporary file then moves it into place."""
+        with self._lock:
+            _dir = misc.cache_dir(os.path.dirname(self.cache_file)) if self._changed else None
+
+            if _dir:
+                try:
+                    # Drop files that no longer exist so the cache doesn't grow forever.
+                    _entries = {_k: _v for _k, _v in self.entries.items() if os.path.exists(_k)}
+                    _fd, _tmp_file = tempfile.mkstemp(dir=_dir)
+
+                    with os.fdopen(_fd, 'w') as _f:
+                        json.dump(_entries, _f)
+
+                    os.rename(_tmp_file, self.cache_file)
+                    self._changed = False
+                except Exception as _e:
+                    LOG.debug('Error writing hash cache {}: {}'.format(self.cache_file, _e))
+    # pylint: enable=broad-except
+
+
+DIGESTS = DigestCache()
+
+
+def digest(file_path):
+    """Returns the hash of a file, from the hash cache if the file hasn't changed."""
+    result = None
+
+    result = DIGESTS.get(file_path)
+
+    if not result:
+        result = hash_file(file_path)
+        DIGESTS.add(file_path, result)
+
+    return result
+
+
+class Manifest(object):
+    """Known good hashes and sizes of packages, keyed by 'manifest_key()'. Stored as JSON:
+    {"algorithm": "sha256", "packages": {"<folder>/<DownloadName>": {"sha256": ..., "size": ...}}}"""
+    def __init__(self, manifest_path=None):
+        self._manifest_path = manifest_path
+        self._packages = None
+
+    @property
+    def manifest_path(self):
+        """The manifest file. Defaults to 'config.MANIFEST'."""
+        result = None
+
+        result = self._manifest_path if self._manifest_path else config.MANIFEST
+
+        return result
+
+    @property
+    def packages(self):
+        """Returns the packages in the manifest, reading the manifest the first time."""
+        result = None
+
+        if self._packages is None:
+            self._packages = dict()
+
+            if self.manifest_path and os.path.exists(self.manifest_path):
+                with open(self.manifest_path, 'r') as _f:
+                    _manifest = json.load(_f)
+
+                if _manifest.get('algorithm', ALGORITHM) != ALGORITHM:
+                    raise VerificationError('Unsupported manifest algorithm {}'.format(_manifest.get('algorithm')))
+
+                self._packages = _manifest.get('packages', dict())
+                LOG.debug('Read {} packages from manifest {}'.format(len(self._packages), self.manifest_path))
+
+        result = self._packages
+
+        return result
+
+    def expected(self, file_path):
+        """Returns the known good hash of a package, or 'None' if it isn't in the manifest."""
+        result = None
+
+        result = self.packages.get(manifest_key(file_path), dict()).get(ALGORITHM)
+
+        return result
+
+    def check(self, file_path):
+        """Returns 'True' if a package matches the manifest, 'False' if it doesn't, or 'None'
+        if the package isn't in the manifest."""
+        result = None
+
+        _expected = self.packages.get(manifest_key(file_path))
+
+        if _expected:
+            result = (os.path.getsize(file_path) == _expected.get('size') and
+                      digest(file_path) == _expected.get(ALGORITHM))
+
+        return result
+
+    def save(self, packages):
+        """Writes 'packages' as the manifest."""
+        self._packages = packages
+
+        with open(self.manifest_path, 'w') as _f:
+            json.dump({'algorithm': ALGORITHM, 'packages': packages}, _f, indent=2, sort_keys=True)
+
+
+MANIFEST = Manifest()
+
+
+def find_packages(folder):
+    """Returns the paths of all the packages in a folder, and its sub folders."""
+    result = list()
+
+    for _root, _dirs, _files in os.walk(folder):
+        _dirs.sort()
+
+        for _file in sorted(_files):
+            if _file.endswith('.pkg'):
+                result.append(os.path.join(_root, _file))
+
+    return result
+
+
+def digest_all(paths):
+    """Returns the hashes of 'paths' as a dict. Files not in the hash cache are hashed in
+    parallel, one process per core."""
+    result = dict()
+
+    _uncached = list()
+
+    for _path in paths:
+        _digest = DIGESTS.get(_path)
+
+        if _digest:
+            result[_path] = _digest
+        else:
+            _uncached.append(_path)
+
+    LOG.debug('Hashing {} of {} files ({} cached)'.format(len(_uncached), len(paths), len(paths) - len(_uncached)))
+
+    if _uncached:
+        with ProcessPoolExecutor(max_workers=os.cpu_count() or 1) as _pool:
+            for _path, _digest in zip(_uncached, _pool.map(hash_file, _uncached)):
+                DIGESTS.add(_path, _digest)
+                result[_path] = _digest
+
+    DIGESTS.save()
+
+    return result
+
+
+def _print(msg):
+    """Logs and prints a message, unless there should be no output."""
+    LOG.info(msg)
+
+    if not config.SILENT:
+        print(msg)
+
+
+def verify_folder(folder, manifest):
+    """Checks every package in a folder against the manifest, then exits. Exits with 1 if any
+    package doesn't match."""
+    _paths = find_packages(folder)
+    _digests = digest_all(_paths)
+    _bad = 0
+    _unknown = 0
+
+    for _path in _paths:
+        _expected = manifest.packages.get(manifest_key(_path))
+
+        if not _expected:
+            _unknown += 1
+            LOG.info('Not in manifest: {}'.format(_path))
+        elif (_digests[_path], os.path.getsize(_path)) != (_expected.get(ALGORITHM), _expected.get('size')):
+            _bad += 1
+            _print('Failed verification: {}'.format(_path))
+
+    _print('Verified {} packages in {}: {} OK, {} failed, {} not in manifest'.format(
+        len(_paths), folder, len(_paths) - _bad - _unknown, _bad, _unknown))
+
+    sys.exit(1 if _bad else 0)
+
+
+def create_manifest(folder, manifest):
+    """Writes a manifest of every package in a folder, such as a known good mirror, then exits."""
+    _paths = find_packages(folder)
+    _digests = digest_all(_paths)
+
+    manifest.save({manifest_key(_path): {ALGORITHM: _digests[_path], 'size': os.path.getsize(_path)}
+                   for _path in _paths})
+
+    _print('Created manifest {} of {} packages in {} ({})'.format(
+        manifest.manifest_path, len(_paths), folder, misc.bytes2hr(byte=sum(os.path.getsize(_p) for _p in _paths))))
+
+    sys.exit(0)
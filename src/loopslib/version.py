@@ -1,10 +1,13 @@
 """Contains basic information about the appleloops package and functions relating to
 version checking."""
+import json
 import logging
+import os
 import subprocess
+import tempfile
 
-from distutils.version import LooseVersion
 from sys import version_info
+from threading import Lock
 
 LOG = logging.getLogger(__name__)
 
@@ -17,9 +20,15 @@ VERSION_STR = 'appleloops v{} built {}, {}'.format(VERSION, VER_DATE, LICENSE)
 USERAGENT = 'appleloops/{}'.format(VERSION)
 PYTHON_VER = '{}.{}.{}'.format(version_info.major, version_info.minor, version_info.micro)
 
+# The file 'sw_vers' reads, used to tell when cached platform facts are stale.
+SYSTEM_VERSION_PLIST = '/System/Library/CoreServices/SystemVersion.plist'
+
 
 def in_version_range(min_version, compare_version, max_version):
     """Checks if a provided version string is in the ranges provided."""
+    # Imported here as 'distutils' is slow to import and most runs never need it.
+    from distutils.version import LooseVersion  # pylint: disable=import-outside-toplevel
+
     result = None
 
     if all([isinstance(ver, (str, unicode)) for ver in [min_version, compare_version, max_version]]):
@@ -51,3 +60,138 @@ def os_vers(arg='productVersion'):
         LOG.debug('Error returning \'sw_ver\': {}'.format(e.strip()))
 
     return result
+
+
+class PlatformFacts(object):
+    """Class for facts about the running OS. 'sw_vers' runs at most once per process, the
+    first time a fact is used, and the result is cached in 'cache_path' until the OS is
+    updated."""
+    def __init__(self, cache_path=None):
+        self._cache_path = cache_path
+        self._facts = None
+        self._lock = Lock()
+
+    def _stamp(self):
+        """Returns the modified time of the system version file, or 'None' if it can't be read."""
+        result = None
+
+        try:
+            result = os.stat(SYSTEM_VERSION_PLIST).st_mtime
+        except OSError:
+            pass
+
+        return result
+
+    def _cache_dir(self):
+        """Returns the folder of the cache file, creating it if needed, or None if it can't be
+        trusted (see 'misc.cache_dir')."""
+        result = None
+
+        # Imported here as 'misc' imports 'config', which imports this module.
+        # pylint: disable=import-outside-toplevel
+        # pylint: disable=relative-import
+        try:
+            import misc
+        except ImportError:
+            from . import misc
+        # pylint: enable=relative-import
+        # pylint: enable=import-outside-toplevel
+
+        result = misc.cache_dir(os.path.dirname(self._cache_path))
+
+        return result
+
+    def _read_cache(self, stamp):
+        """Returns the cached facts if they were cached for this version of the OS, and
+        only the current user (or root) can change the cache file."""
+        result = None
+
+        if self._cache_path and stamp and self._cache_dir():
+            try:
+                with open(self._cache_path, 'r') as _f:
+                    _cached = json.load(_f)
+
+                if _cached.get('stamp') == stamp:
+                    result = _cached.get('facts')
+                    LOG.debug('Using cached platform facts from {}'.format(self._cache_path))
+            except (OSError, IOError, ValueError) as e:
+                LOG.debug('Platform facts cache miss: {}'.format(e))
+
+        return result
+
+    def _write_cache(self, stamp, facts):
+        """Writes the facts to the cache file, replacing it in one step."""
+        _dir = self._cache_dir() if self._cache_path and stamp and all(facts.values()) else None
+
+        if _dir:
+            try:
+                _fd, _tmp_file = tempfile.mkstemp(dir=_dir)
+
+                with os.fdopen(_fd, 'w') as _f:
+                    json.dump({'stamp': stamp, 'facts': facts}, _f)
+
+                os.rename(_tmp_file, self._cache_path)
+            except (OSError, IOError) as e:
+                LOG.debug('Error caching platform facts: {}'.format(e))
+
+    def _sw_vers(self):
+        """Returns the product version and build from a single 'sw_vers' call."""
+        result = {'productVersion': None, 'buildVersion': None}
+
+        cmd = ['/usr/bin/sw_vers']
+
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        r, e = p.communicate()
+
+        if r and isinstance(r, bytes):
+            r = r.decode('utf-8')
+
+        if p.returncode == 0 and r:
+            # Output is 'Key:<tab>Value' lines, such as 'ProductVersion:\t10.15.7'
+            for _line in r.splitlines():
+                _key, _, _value = _line.partition(':')
+                _key = _key.strip()
+                _key = '{}{}'.format(_key[:1].lower(), _key[1:])
+
+                if _key in result:
+                    result[_key] = _value.strip()
+        elif p.returncode != 0 and e:
+            LOG.debug('Error returning \'sw_ver\': {}'.format(e.strip()))
+
+        return result
+
+    @property
+    def facts(self):
+        """Returns the platform facts as a dictionary."""
+        result = None
+
+        with self._lock:
+            if self._facts is None:
+                _stamp = self._stamp()
+                self._facts = self._read_cache(_stamp)
+
+                if self._facts is None:
+                    self._facts = self._sw_vers()
+                    self._write_cache(_stamp, self._facts)
+
+            result = self._facts
+
+        return result
+
+    @property
+    def os_version(self):
+        """Returns the OS version, such as '10.15.7'."""
+        result = None
+
+        result = self.facts['productVersion']
+
+        return result
+
+    @property
+    def os_build(self):
+        """Returns the OS build, such as '19H2'."""
+        result = None
+
+        result = self.facts['buildVersion']
+
+        return result
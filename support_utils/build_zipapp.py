@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Builds the appleloops zipapp with pre-compiled modules, for faster startup.
+
+Each module is compiled to an unchecked hash based '.pyc' file next to its source, which
+'zipimport' loads as is, and everything is stored uncompressed so nothing is inflated or
+compiled when the zipapp runs. The '.py' files are kept for tracebacks, and so a different
+version of Python (which rejects the '.pyc' files) falls back to compiling the source.
+
+Takes the same arguments as 'python3 -m zipapp', for example:
+    python3 support_utils/build_zipapp.py src --output appleloops --python="/usr/local/bin/python3"
+"""
+import argparse
+import os
+import py_compile
+import shutil
+import sys
+import tempfile
+import zipapp
+
+# Where 'build.sh' installs the zipapp, used for file paths in tracebacks.
+INSTALL_PATH = '/usr/local/bin/appleloops'
+
+
+def precompile(source, prefix):
+    """Compiles each '.py' file in 'source' to a '.pyc' file alongside it."""
+    result = list()
+
+    for _root, _dirs, _files in os.walk(source):
+        _dirs[:] = [_d for _d in _dirs if _d != '__pycache__']
+
+        for _file in sorted(_files):
+            if not _file.endswith('.py'):
+                continue
+
+            _path = os.path.join(_root, _file)
+            _rel_path = os.path.relpath(_path, source)
+
+            py_compile.compile(_path,
+                               cfile='{}c'.format(_path),
+                               dfile=os.path.join(prefix, _rel_path),
+                               doraise=True,
+                               invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+            result.append(_rel_path)
+
+    return result
+
+
+def build(source, output, interpreter=None, prefix=INSTALL_PATH):
+    """Copies 'source' to a temporary folder, pre-compiles it, and creates the zipapp."""
+    _tmp_dir = tempfile.mkdtemp(prefix='appleloops-build-')
+    _staging = os.path.join(_tmp_dir, 'src')
+
+    try:
+        shutil.copytree(source, _staging, ignore=shutil.ignore_patterns('__pycache__', '*.pyc', '*.pyo'))
+        _compiled = precompile(_staging, prefix=prefix)
+        zipapp.create_archive(_staging, target=output, interpreter=interpreter, compressed=False)
+    finally:
+        shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+    print('Built {} with {} modules compiled for Python {}.{}'.format(output, len(_compiled),
+                                                                     sys.version_info.major,
+                                                                     sys.version_info.minor))
+
+
+def main():
+    """Parses the zipapp style arguments and builds."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='source folder, normally \'src\'')
+    parser.add_argument('--output', '-o', required=True, help='zipapp file to create')
+    parser.add_argument('--python', '-p', default=None, help='interpreter for the zipapp shebang')
+    parser.add_argument('--prefix', default=INSTALL_PATH,
+                        help='installed zipapp path, for tracebacks (default {})'.format(INSTALL_PATH))
+    args = parser.parse_args()
+
+    build(args.source, args.output, interpreter=args.python, prefix=args.prefix)
+
+
+if __name__ == '__main__':
+    main()